@@ -0,0 +1,112 @@
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Optional
+
+import pandas as pd
+
+from ontelligence.core.config import settings
+from ontelligence.providers.snowflake.snowflake import Snowflake, sql_literal
+
+
+class BaseCheckpointStore(ABC):
+    """Abstract base class to persist which stages of a pipeline run have completed"""
+
+    @abstractmethod
+    def get_completed_stages(self, run_id: str) -> Dict[str, datetime]:
+        """Return completed stages for run_id with their completion time"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_stage_rows(self, run_id: str) -> Dict[str, Optional[int]]:
+        """Return the row count recorded for each completed stage of run_id"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def mark_completed(self, run_id: str, stage: str, rows: Optional[int] = None) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self, run_id: str, stage: Optional[str] = None) -> None:
+        """Forget one stage, or every stage, of run_id"""
+        raise NotImplementedError
+
+    def is_completed(self, run_id: str, stage: str) -> bool:
+        return stage in self.get_completed_stages(run_id=run_id)
+
+
+class SQLiteCheckpointStore(BaseCheckpointStore):
+    """Stores checkpoints in a local SQLite database"""
+
+    table = 'pipeline_checkpoints'
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.path.join(settings.HOME_PATH, 'checkpoints.db')
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(f'''CREATE TABLE IF NOT EXISTS {self.table} (
+                                run_id TEXT NOT NULL,
+                                stage TEXT NOT NULL,
+                                completed_at TEXT NOT NULL,
+                                row_count INTEGER,
+                                PRIMARY KEY (run_id, stage));''')
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    def get_completed_stages(self, run_id: str) -> Dict[str, datetime]:
+        with self._connect() as conn:
+            rows = conn.execute(f'SELECT stage, completed_at FROM {self.table} WHERE run_id = ?;', (run_id,)).fetchall()
+        return {x[0]: datetime.fromisoformat(x[1]) for x in rows}
+
+    def get_stage_rows(self, run_id: str) -> Dict[str, Optional[int]]:
+        with self._connect() as conn:
+            rows = conn.execute(f'SELECT stage, row_count FROM {self.table} WHERE run_id = ?;', (run_id,)).fetchall()
+        return {x[0]: x[1] for x in rows}
+
+    def mark_completed(self, run_id: str, stage: str, rows: Optional[int] = None) -> None:
+        with self._connect() as conn:
+            conn.execute(f'INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?);', (run_id, stage, datetime.utcnow().isoformat(), rows))
+
+    def clear(self, run_id: str, stage: Optional[str] = None) -> None:
+        with self._connect() as conn:
+            if stage:
+                conn.execute(f'DELETE FROM {self.table} WHERE run_id = ? AND stage = ?;', (run_id, stage))
+            else:
+                conn.execute(f'DELETE FROM {self.table} WHERE run_id = ?;', (run_id,))
+
+
+class SnowflakeCheckpointStore(BaseCheckpointStore):
+    """Stores checkpoints in a Snowflake control table"""
+
+    def __init__(self, sf: Snowflake, table: str = 'PIPELINE_CHECKPOINTS', database: Optional[str] = None, schema: Optional[str] = None):
+        self.sf = sf
+        self.table = f'{database or sf.database}.{schema or sf.schema}.{table}'
+        self.sf.execute(f'''CREATE TABLE IF NOT EXISTS {self.table} (
+                                RUN_ID VARCHAR NOT NULL,
+                                STAGE VARCHAR NOT NULL,
+                                COMPLETED_AT TIMESTAMP_NTZ NOT NULL,
+                                ROW_COUNT NUMBER,
+                                PRIMARY KEY (RUN_ID, STAGE));''')
+
+    def get_completed_stages(self, run_id: str) -> Dict[str, datetime]:
+        df = self.sf.query(f'SELECT STAGE, COMPLETED_AT FROM {self.table} WHERE RUN_ID = {sql_literal(run_id)};')
+        return {x['STAGE']: x['COMPLETED_AT'] for x in df.to_dict(orient='records')}
+
+    def get_stage_rows(self, run_id: str) -> Dict[str, Optional[int]]:
+        df = self.sf.query(f'SELECT STAGE, ROW_COUNT FROM {self.table} WHERE RUN_ID = {sql_literal(run_id)};')
+        return {x['STAGE']: None if pd.isna(x['ROW_COUNT']) else int(x['ROW_COUNT']) for x in df.to_dict(orient='records')}
+
+    def mark_completed(self, run_id: str, stage: str, rows: Optional[int] = None) -> None:
+        row_count = 'NULL' if rows is None else int(rows)
+        self.sf.execute(f'''MERGE INTO {self.table} t
+                            USING (SELECT {sql_literal(run_id)} AS RUN_ID, {sql_literal(stage)} AS STAGE, {row_count}::NUMBER AS ROW_COUNT) s
+                            ON t.RUN_ID = s.RUN_ID AND t.STAGE = s.STAGE
+                            WHEN MATCHED THEN UPDATE SET COMPLETED_AT = CURRENT_TIMESTAMP()::TIMESTAMP_NTZ, ROW_COUNT = s.ROW_COUNT
+                            WHEN NOT MATCHED THEN INSERT (RUN_ID, STAGE, COMPLETED_AT, ROW_COUNT)
+                                                  VALUES (s.RUN_ID, s.STAGE, CURRENT_TIMESTAMP()::TIMESTAMP_NTZ, s.ROW_COUNT);''')
+
+    def clear(self, run_id: str, stage: Optional[str] = None) -> None:
+        stage = f' AND STAGE = {sql_literal(stage)}' if stage else ''
+        self.sf.execute(f'DELETE FROM {self.table} WHERE RUN_ID = {sql_literal(run_id)}{stage};')
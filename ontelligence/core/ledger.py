@@ -0,0 +1,147 @@
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from ontelligence.core.config import settings
+from ontelligence.core.schemas.aws import S3Object
+from ontelligence.core.schemas.ledger import LedgerEntry
+from ontelligence.providers.snowflake.snowflake import Snowflake, sql_literal
+
+
+LEDGER_SUBMITTED = 'SUBMITTED'
+LEDGER_LOADED = 'LOADED'
+LEDGER_FAILED = 'FAILED'
+
+
+class BaseIngestionLedger(ABC):
+    """Abstract base class to persist which S3 objects have already been loaded into a target"""
+
+    @abstractmethod
+    def get_entries(self, source: str) -> Dict[str, LedgerEntry]:
+        """Return processed entries for source, keyed by S3 key"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def record(self, entries: List[LedgerEntry]) -> None:
+        """Insert or update processed entries"""
+        raise NotImplementedError
+
+    def get_new_objects(self, source: str, objects: List[S3Object], entries: Optional[Dict[str, LedgerEntry]] = None) -> List[S3Object]:
+        """Return the objects that are new, whose ETag changed since they were last loaded or whose load failed"""
+        processed = entries if entries is not None else self.get_entries(source=source)
+        return [x for x in objects if x.key not in processed or processed[x.key].etag != x.etag or processed[x.key].state == LEDGER_FAILED]
+
+    def get_latest_entry(self, source: str, entries: Optional[Dict[str, LedgerEntry]] = None) -> Optional[LedgerEntry]:
+        entries = entries if entries is not None else self.get_entries(source=source)
+        entries = [x for x in entries.values() if x.last_modified and x.state == LEDGER_LOADED]
+        return max(entries, key=lambda x: x.last_modified) if entries else None
+
+    def get_watermark(self, source: str) -> Optional[datetime]:
+        """Return the max event timestamp loaded so far for source"""
+        timestamps = [x.max_event_timestamp for x in self.get_entries(source=source).values() if x.max_event_timestamp and x.state == LEDGER_LOADED]
+        return max(timestamps) if timestamps else None
+
+
+class SQLiteIngestionLedger(BaseIngestionLedger):
+    """Stores the ledger in a local SQLite database"""
+
+    table = 'ingestion_ledger'
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.path.join(settings.HOME_PATH, 'ledger.db')
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(f'''CREATE TABLE IF NOT EXISTS {self.table} (
+                                source TEXT NOT NULL,
+                                key TEXT NOT NULL,
+                                etag TEXT,
+                                size INTEGER,
+                                last_modified TEXT,
+                                max_event_timestamp TEXT,
+                                loaded_at TEXT,
+                                state TEXT NOT NULL,
+                                PRIMARY KEY (source, key));''')
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    @staticmethod
+    def _to_datetime(value: Optional[str]) -> Optional[datetime]:
+        return datetime.fromisoformat(value) if value else None
+
+    def get_entries(self, source: str) -> Dict[str, LedgerEntry]:
+        with self._connect() as conn:
+            rows = conn.execute(f'''SELECT key, etag, size, last_modified, max_event_timestamp, loaded_at, state
+                                    FROM {self.table} WHERE source = ?;''', (source,)).fetchall()
+        return {x[0]: LedgerEntry(source=source, key=x[0], etag=x[1], size=x[2],
+                                  last_modified=self._to_datetime(x[3]),
+                                  max_event_timestamp=self._to_datetime(x[4]),
+                                  loaded_at=self._to_datetime(x[5]),
+                                  state=x[6]) for x in rows}
+
+    def record(self, entries: List[LedgerEntry]) -> None:
+        rows = [(x.source, x.key, x.etag, x.size,
+                 x.last_modified.isoformat() if x.last_modified else None,
+                 x.max_event_timestamp.isoformat() if x.max_event_timestamp else None,
+                 (x.loaded_at or datetime.utcnow()).isoformat(), x.state) for x in entries]
+        with self._connect() as conn:
+            conn.executemany(f'''INSERT OR REPLACE INTO {self.table} (source, key, etag, size, last_modified, max_event_timestamp, loaded_at, state)
+                                 VALUES (?, ?, ?, ?, ?, ?, ?, ?);''', rows)
+
+
+class SnowflakeIngestionLedger(BaseIngestionLedger):
+    """Stores the ledger in a Snowflake control table"""
+
+    def __init__(self, sf: Snowflake, table: str = 'INGESTION_LEDGER', database: Optional[str] = None, schema: Optional[str] = None):
+        self.sf = sf
+        self.table = f'{database or sf.database}.{schema or sf.schema}.{table}'
+        self.sf.execute(f'''CREATE TABLE IF NOT EXISTS {self.table} (
+                                SOURCE VARCHAR NOT NULL,
+                                KEY VARCHAR NOT NULL,
+                                ETAG VARCHAR,
+                                SIZE NUMBER,
+                                LAST_MODIFIED TIMESTAMP_TZ,
+                                MAX_EVENT_TIMESTAMP TIMESTAMP_NTZ,
+                                LOADED_AT TIMESTAMP_NTZ,
+                                STATE VARCHAR NOT NULL,
+                                PRIMARY KEY (SOURCE, KEY));''')
+
+    def get_entries(self, source: str) -> Dict[str, LedgerEntry]:
+        df = self.sf.query(f'''SELECT KEY, ETAG, SIZE, LAST_MODIFIED, MAX_EVENT_TIMESTAMP, LOADED_AT, STATE
+                               FROM {self.table}
+                               WHERE SOURCE = {sql_literal(source)};''')
+        entries = {}
+        for x in df.to_dict(orient='records'):
+            x = {k: v if v == v else None for k, v in x.items()}  # NaN/NaT to None.
+            entries[x['KEY']] = LedgerEntry(
+                source=source,
+                key=x['KEY'],
+                etag=x['ETAG'],
+                size=int(x['SIZE']) if x['SIZE'] is not None else None,
+                last_modified=x['LAST_MODIFIED'],
+                max_event_timestamp=x['MAX_EVENT_TIMESTAMP'],
+                loaded_at=x['LOADED_AT'],
+                state=x['STATE']
+            )
+        return entries
+
+    def record(self, entries: List[LedgerEntry]) -> None:
+        if not entries:
+            return
+        values = ',\n'.join([
+            f'({sql_literal(x.source)}, {sql_literal(x.key)}, {sql_literal(x.etag)}, {sql_literal(x.size)}, '
+            f'{sql_literal(x.last_modified)}, {sql_literal(x.max_event_timestamp)}, {sql_literal(x.loaded_at or datetime.utcnow())}, {sql_literal(x.state)})'
+            for x in entries
+        ])
+        query = f'''MERGE INTO {self.table} t
+                    USING (SELECT $1 AS SOURCE, $2 AS KEY, $3 AS ETAG, $4 AS SIZE, $5 AS LAST_MODIFIED,
+                                  $6 AS MAX_EVENT_TIMESTAMP, $7 AS LOADED_AT, $8 AS STATE
+                           FROM VALUES {values}) s
+                    ON t.SOURCE = s.SOURCE AND t.KEY = s.KEY
+                    WHEN MATCHED THEN UPDATE SET ETAG = s.ETAG, SIZE = s.SIZE, LAST_MODIFIED = s.LAST_MODIFIED,
+                                                 MAX_EVENT_TIMESTAMP = s.MAX_EVENT_TIMESTAMP, LOADED_AT = s.LOADED_AT, STATE = s.STATE
+                    WHEN NOT MATCHED THEN INSERT (SOURCE, KEY, ETAG, SIZE, LAST_MODIFIED, MAX_EVENT_TIMESTAMP, LOADED_AT, STATE)
+                                          VALUES (s.SOURCE, s.KEY, s.ETAG, s.SIZE, s.LAST_MODIFIED, s.MAX_EVENT_TIMESTAMP, s.LOADED_AT, s.STATE);'''
+        self.sf.execute(query)
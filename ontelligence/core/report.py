@@ -0,0 +1,93 @@
+import os
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional
+
+from ontelligence.core.schemas.report import PhaseReport, RunReport
+from ontelligence.providers.snowflake.snowflake import Snowflake
+from ontelligence.utils.log import LoggingMixin
+
+
+class BaseReportSink(ABC):
+    """Abstract base class for destinations of pipeline run reports"""
+
+    @abstractmethod
+    def emit(self, report: RunReport) -> None:
+        raise NotImplementedError
+
+
+class LogReportSink(LoggingMixin, BaseReportSink):
+    """Logs each report as a single JSON line"""
+
+    def emit(self, report: RunReport) -> None:
+        self.log.info(report.to_json())
+
+
+class JsonLinesReportSink(BaseReportSink):
+    """Appends each report as a JSON line to a local file"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def emit(self, report: RunReport) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.file_path)), exist_ok=True)
+        with open(self.file_path, 'a') as f:
+            f.write(report.to_json() + '\n')
+
+
+class RunReporter(LoggingMixin):
+    """Times the phases of a pipeline run and attributes the Snowflake queries executed in each phase"""
+
+    def __init__(self, sf: Snowflake, source: str, target: str, run_id: Optional[str] = None, sinks: Optional[List[BaseReportSink]] = None):
+        self.sf = sf
+        self.sinks = sinks if sinks is not None else [LogReportSink()]
+        self.report = RunReport(source=source, target=target, run_id=run_id, started_at=datetime.utcnow())
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        phase = PhaseReport(name=name, started_at=datetime.utcnow())
+        self.report.phases.append(phase)
+        started = time.perf_counter()
+        with self.sf.record_query_ids() as query_ids:
+            try:
+                yield phase
+            finally:
+                phase.wall_time_ms = int((time.perf_counter() - started) * 1000)
+                phase.query_ids = list(query_ids)
+
+    def skip(self, name: str) -> None:
+        self.report.phases.append(PhaseReport(name=name, started_at=datetime.utcnow(), wall_time_ms=0, skipped=True))
+
+    def finish(self, error: Optional[BaseException] = None) -> RunReport:
+        """Adds QUERY_HISTORY metrics, totals the report and emits it to every sink"""
+        self.report.wall_time_ms = int((time.perf_counter() - self._started) * 1000)
+        self.report.status = 'failed' if error else 'success'
+        self.report.error = str(error) if error else None
+
+        try:
+            self._add_query_history()
+        except Exception as e:
+            self.log.warning(f'Could not retrieve query history for the run report: {str(e)}')
+
+        for each_sink in self.sinks:
+            try:
+                each_sink.emit(self.report)
+            except Exception as e:
+                self.log.warning(f'Could not emit the run report to {type(each_sink).__name__}: {str(e)}')
+        return self.report
+
+    def _add_query_history(self) -> None:
+        query_ids = [x for each_phase in self.report.phases for x in each_phase.query_ids]
+        history = self.sf.get_query_history(query_ids=query_ids)
+        if history.empty:
+            return
+        history = history.set_index('QUERY_ID')
+        for each_phase in self.report.phases:
+            _history = history[history.index.isin(each_phase.query_ids)]
+            each_phase.bytes_scanned = int(_history['BYTES_SCANNED'].fillna(0).sum())
+            each_phase.credits = float(_history['WAREHOUSE_CREDITS'].sum() + _history['CREDITS_USED_CLOUD_SERVICES'].fillna(0).sum())
+        self.report.bytes_scanned = sum(x.bytes_scanned or 0 for x in self.report.phases)
+        self.report.credits = sum(x.credits or 0 for x in self.report.phases)
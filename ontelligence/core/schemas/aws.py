@@ -1,5 +1,6 @@
 import os
 import re
+from datetime import datetime
 from typing import Optional
 
 from pydantic.dataclasses import dataclass
@@ -64,3 +65,16 @@ class S3Key(BaseDataClass):
     @property
     def key(self):
         return f'{self.prefix}{self.name}'
+
+
+@dataclass
+class S3Object(BaseDataClass):
+    bucket: str
+    key: str
+    etag: Optional[str] = None
+    size: Optional[int] = None
+    last_modified: Optional[datetime] = None
+
+    @property
+    def path(self):
+        return f's3://{self.bucket}/{self.key}'
@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional, List
 
 from pydantic.dataclasses import dataclass
@@ -17,3 +18,11 @@ class Table(BaseDataClass):
     db_schema: str
     name: str
     columns: Optional[List[Column]] = None
+
+
+@dataclass
+class FileEntry(BaseDataClass):
+    name: str
+    last_modified: Optional[datetime] = None
+    size: Optional[int] = None
+    file_date: Optional[datetime] = None  # Parsed from the {DATE} or {TIMESTAMP} indicator in the name.
@@ -0,0 +1,18 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic.dataclasses import dataclass
+
+from ontelligence.core.schemas.base import BaseDataClass
+
+
+@dataclass
+class LedgerEntry(BaseDataClass):
+    source: str
+    key: str
+    etag: Optional[str] = None
+    size: Optional[int] = None
+    last_modified: Optional[datetime] = None
+    max_event_timestamp: Optional[datetime] = None
+    loaded_at: Optional[datetime] = None
+    state: str = 'LOADED'
@@ -0,0 +1,44 @@
+import json
+import dataclasses
+from dataclasses import field
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic.dataclasses import dataclass
+
+from ontelligence.core.schemas.base import BaseDataClass
+
+
+@dataclass
+class PhaseReport(BaseDataClass):
+    name: str
+    started_at: Optional[datetime] = None
+    wall_time_ms: Optional[int] = None
+    skipped: bool = False
+    query_ids: List[str] = field(default_factory=list)
+    rows: Optional[int] = None
+    bytes_scanned: Optional[int] = None
+    credits: Optional[float] = None
+
+
+@dataclass
+class RunReport(BaseDataClass):
+    source: str
+    target: str
+    run_id: Optional[str] = None
+    status: Optional[str] = None
+    error: Optional[str] = None
+    started_at: Optional[datetime] = None
+    wall_time_ms: Optional[int] = None
+    phases: List[PhaseReport] = field(default_factory=list)
+    rows_loaded: Optional[int] = None
+    rows_deleted: Optional[int] = None
+    rows_inserted: Optional[int] = None
+    bytes_scanned: Optional[int] = None
+    credits: Optional[float] = None
+
+    def to_dict(self):
+        return dataclasses.asdict(self)
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), default=str, **kwargs)
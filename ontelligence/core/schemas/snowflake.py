@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic.dataclasses import dataclass
 
@@ -19,3 +19,51 @@ class SnowflakeConnection(BaseDataClass):
     warehouse: Optional[str]
     database: Optional[str]
     db_schema: Optional[str]
+
+
+@dataclass
+class UnloadedFile(BaseDataClass):
+    path: str
+    size: int
+    rows: int
+
+
+@dataclass
+class StatementResult(BaseDataClass):
+    query: str
+    query_id: Optional[str] = None
+    row_count: Optional[int] = None
+
+
+@dataclass
+class PipeFileStatus(BaseDataClass):
+    path: str
+    status: str
+    complete: bool = False
+    rows_parsed: Optional[int] = None
+    rows_inserted: Optional[int] = None
+    errors_seen: Optional[int] = None
+    first_error: Optional[str] = None
+
+
+@dataclass
+class QueryProfile(BaseDataClass):
+    query_id: str
+    query_type: Optional[str] = None
+    query_text: Optional[str] = None
+    elapsed_ms: Optional[int] = None
+    queued_ms: Optional[int] = None
+    bytes_scanned: Optional[int] = None
+    partitions_scanned: Optional[int] = None
+    partitions_total: Optional[int] = None
+    bytes_spilled_local: Optional[int] = None
+    bytes_spilled_remote: Optional[int] = None
+    operator_stats: Optional[List[Dict[str, Any]]] = None
+    warnings: Optional[List[str]] = None
+
+    @property
+    def scan_ratio(self) -> Optional[float]:
+        """Fraction of micro-partitions scanned, i.e. 1.0 means pruning eliminated nothing"""
+        if not self.partitions_total:
+            return None
+        return self.partitions_scanned / self.partitions_total
@@ -1,14 +1,28 @@
 import os
-from typing import Any, List, Optional
+import gzip
+import base64
+import hashlib
+import dataclasses
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import boto3
-import smart_open
 from pydantic.dataclasses import dataclass
 
 from ontelligence.providers.snowflake import Snowflake
 from ontelligence.providers.aws.s3 import S3
+from ontelligence.core.checkpoint import BaseCheckpointStore
+from ontelligence.core.ledger import BaseIngestionLedger
+from ontelligence.core.report import BaseReportSink, RunReporter
+from ontelligence.core.schemas.aws import S3Object
 from ontelligence.core.schemas.base import BaseDataClass
-from ontelligence.core.schemas.data import Table
+from ontelligence.core.schemas.data import Table, Column
+from ontelligence.core.schemas.ledger import LedgerEntry
+from ontelligence.core.schemas.report import RunReport
+from ontelligence.utils.conversions import b2gmk
+from ontelligence.utils.date import today
+from ontelligence.utils.file import get_latest_file_date, get_matching_files, DATE_INDICATOR
 
 
 @dataclass
@@ -30,17 +44,50 @@ class S3ToSnowflakeParams(BaseDataClass):
     overlap_columns: Optional[List[str]]
 
 
-def s3_to_snowflake(sf: Snowflake, s3: S3, params: S3ToSnowflakeParams, **kwargs):
+def _infer_s3_data_schema(s3: S3, params: S3ToSnowflakeParams, **kwargs) -> List[Column]:
+    if params.file_profile != 'CSV':
+        raise NotImplementedError(f'Cannot infer a {params.file_profile} file directly from S3 yet. Pass in "data_schema": List[Column]')
+    bucket, key = s3.parse_s3_url(params.s3_path)
+    return s3.infer_data_schema(key=key, bucket=bucket, delimiter=kwargs.get('delimiter', ','), override_dtypes=kwargs.get('override_dtypes'),
+                               cache=kwargs.get('profile_cache'))
+
+
+def _count_rows(sf: Snowflake, table: Table) -> int:
+    cursor = sf.execute(query=f'SELECT COUNT(*) FROM {table.database}.{table.db_schema}.{table.name};', commit=False, return_cursor=True)
+    return cursor.fetchone()[0]
+
+
+STAGE_LOAD = 'stage_load'
+STAGE_QA = 'qa'
+STAGE_OVERLAP_DELETE = 'overlap_delete'
+STAGE_INSERT = 'insert'
+STAGE_CLEANUP = 'cleanup'
+
+
+def s3_to_snowflake(sf: Snowflake, s3: S3, params: S3ToSnowflakeParams, checkpoint_store: Optional[BaseCheckpointStore] = None,
+                    run_id: Optional[str] = None, sinks: Optional[List[BaseReportSink]] = None, **kwargs) -> RunReport:
+    """Loads an S3 object into a Snowflake table through a staging table, skipping stages completed by `run_id`"""
+    reporter = RunReporter(sf=sf, source=params.s3_path, target=f'{params.table.database}.{params.table.db_schema}.{params.table.name}',
+                           run_id=run_id, sinks=sinks)
+    try:
+        _s3_to_snowflake(sf=sf, s3=s3, params=params, reporter=reporter, checkpoint_store=checkpoint_store, run_id=run_id, **kwargs)
+    except Exception as e:
+        reporter.finish(error=e)
+        raise
+
+    phase_rows = {x.name: x.rows for x in reporter.report.phases}
+    reporter.report.rows_loaded = phase_rows.get(STAGE_LOAD)
+    reporter.report.rows_deleted = phase_rows.get(STAGE_OVERLAP_DELETE)
+    reporter.report.rows_inserted = phase_rows.get(STAGE_INSERT)
+    return reporter.finish()
+
+
+def _s3_to_snowflake(sf: Snowflake, s3: S3, params: S3ToSnowflakeParams, reporter: RunReporter,
+                     checkpoint_store: Optional[BaseCheckpointStore] = None, run_id: Optional[str] = None, **kwargs) -> None:
 
     # TODO: file_profile needs to be the entire profile instead of just the file_format.
     params.file_profile = params.file_profile or 'CSV'
 
-    table_exists = sf.table_exists(
-        database=params.table.database,
-        schema=params.table.db_schema,
-        table=params.table.name
-    )
-
     # Define staging table.
     staging_table = Table(
         database=params.table.database,
@@ -48,59 +95,95 @@ def s3_to_snowflake(sf: Snowflake, s3: S3, params: S3ToSnowflakeParams, **kwargs
         name=f'STG_{params.table.name}'
     )
 
+    completed_stages = checkpoint_store.get_completed_stages(run_id=run_id) if checkpoint_store and run_id else {}
+    stage_rows = checkpoint_store.get_stage_rows(run_id=run_id) if completed_stages else {}
+
+    def run_stage(stage: str, func: Callable[[], Optional[int]]) -> None:
+        if stage in completed_stages:
+            sf.log.info(f'Skipping stage "{stage}" of run "{run_id}" completed at {completed_stages[stage]}')
+            reporter.skip(stage)
+            return
+        with reporter.phase(stage) as phase:
+            phase.rows = func()
+        if checkpoint_store and run_id:
+            checkpoint_store.mark_completed(run_id=run_id, stage=stage, rows=phase.rows)
+
+    if STAGE_LOAD in completed_stages and STAGE_INSERT not in completed_stages:
+        # Verify the staging table of the completed stage load before resuming from it, as other runs share STG_ tables.
+        if not sf.table_exists(database=staging_table.database, schema=staging_table.db_schema, table=staging_table.name):
+            sf.log.warning(f'Staging table {staging_table.name} of run "{run_id}" is missing. Reloading it.')
+            checkpoint_store.clear(run_id=run_id, stage=STAGE_LOAD)
+            completed_stages.pop(STAGE_LOAD)
+        else:
+            rows = _count_rows(sf=sf, table=staging_table)
+            if rows != stage_rows.get(STAGE_LOAD):
+                sf.log.warning(f'Staging table {staging_table.name} has {rows} rows instead of the {stage_rows.get(STAGE_LOAD)} loaded by run '
+                               f'"{run_id}". Reloading it.')
+                checkpoint_store.clear(run_id=run_id, stage=STAGE_LOAD)
+                completed_stages.pop(STAGE_LOAD)
+
+    if STAGE_INSERT in completed_stages:
+        # A completed insert renamed the staging table if the final table did not exist, so only the staging table tells.
+        table_exists = sf.table_exists(database=staging_table.database, schema=staging_table.db_schema, table=staging_table.name)
+    else:
+        table_exists = sf.table_exists(database=params.table.database, schema=params.table.db_schema, table=params.table.name)
+
 ########################################################################################################################
 # Load S3 object into staging table.
 ########################################################################################################################
 
-    if table_exists and not params.replace_table and not params.dependency_on_file:
-        # Create staging table like final table.
-        sf.create_table_like(
-            table=staging_table.name,
-            schema=staging_table.db_schema,
-            parent_table=params.table.name,
-            parent_schema=params.table.db_schema,
-            replace_if_exists=True
-        )
-
-        # Copy data into staging table.
-        # Create temporary file format and stage.
-        _file_format = f'tmp_{params.table.database}_{params.table.db_schema}_{params.table.name}'
-        _stage = _file_format
-        _s3_path_for_stage = os.path.split(params.s3_path)[0]
-        _s3_file_name = os.path.split(params.s3_path)[1]
-        if params.file_profile == 'CSV':
-            sf.create_file_format(file_format=_file_format, file_format_type=params.file_profile, replace_if_exists=True, skip_header=True)
-        elif params.file_profile == 'PARQUET':
-            sf.create_file_format(file_format=_file_format, file_format_type=params.file_profile, replace_if_exists=True)
-        sf.create_stage(stage_name=_stage, storage_integration='INSCAPE_STORAGE_INTEGRATION', s3_path=_s3_path_for_stage, file_format=_file_format)
-        # Copy data into staging table.
-        if 'data_schema' not in kwargs:
-            raise NotImplementedError('Cannot infer a file directly from S3 yet. Pass in "data_schema": List[Column]')
-        columns = kwargs['data_schema']
-
-        sf.copy_into_from_stage_expanded(table_name=staging_table.name, stage_name=f'{_stage}/{_s3_file_name}', file_format=_file_format, pattern='*', columns=columns)
-    else:
-        # Analyze file profile and schema.
-        if 'data_schema' not in kwargs:
-            raise NotImplementedError('Cannot infer a file directly from S3 yet. Pass in "data_schema": List[Column]')
-        columns = kwargs['data_schema']
-
-        # Create staging table using analyzed schema.
-        sf.create_table(table=staging_table.name, columns=columns, replace_if_exists=True)
-
-        # Copy data into staging table.
-        # Create temporary file format and stage.
-        _file_format = f'tmp_{params.table.database}_{params.table.db_schema}_{params.table.name}'
-        _stage = _file_format
-        _s3_path_for_stage = os.path.split(params.s3_path)[0]
-        _s3_file_name = os.path.split(params.s3_path)[1]
-        if params.file_profile == 'CSV':
-            sf.create_file_format(file_format=_file_format, file_format_type=params.file_profile, replace_if_exists=True, skip_header=True)
-        elif params.file_profile == 'PARQUET':
-            sf.create_file_format(file_format=_file_format, file_format_type=params.file_profile, replace_if_exists=True)
-        sf.create_stage(stage_name=_stage, storage_integration='INSCAPE_STORAGE_INTEGRATION', s3_path=_s3_path_for_stage, file_format=_file_format)
-        # Copy data into staging table.
-        sf.copy_into_from_stage_expanded(table_name=staging_table.name, stage_name=f'{_stage}/{_s3_file_name}', file_format=_file_format, pattern='*', columns=columns)
+    def load_staging_table():
+        # DDL statements commit implicitly, so the batch only saves the round trips.
+        with sf.batch(transaction=False):
+            if table_exists and not params.replace_table and not params.dependency_on_file:
+                # Create staging table like final table.
+                sf.create_table_like(
+                    table=staging_table.name,
+                    schema=staging_table.db_schema,
+                    parent_table=params.table.name,
+                    parent_schema=params.table.db_schema,
+                    replace_if_exists=True
+                )
+
+                # Copy data into staging table.
+                # Create temporary file format and stage.
+                _file_format = f'tmp_{params.table.database}_{params.table.db_schema}_{params.table.name}'
+                _stage = _file_format
+                _s3_path_for_stage = os.path.split(params.s3_path)[0]
+                _s3_file_name = os.path.split(params.s3_path)[1]
+                if params.file_profile == 'CSV':
+                    sf.create_file_format(file_format=_file_format, file_format_type=params.file_profile, replace_if_exists=True, skip_header=True)
+                elif params.file_profile == 'PARQUET':
+                    sf.create_file_format(file_format=_file_format, file_format_type=params.file_profile, replace_if_exists=True)
+                sf.create_stage(stage_name=_stage, storage_integration='INSCAPE_STORAGE_INTEGRATION', s3_path=_s3_path_for_stage, file_format=_file_format)
+                # Copy data into staging table.
+                columns = kwargs.get('data_schema') or _infer_s3_data_schema(s3=s3, params=params, **kwargs)
+
+                sf.copy_into_from_stage_expanded(table_name=staging_table.name, stage_name=f'{_stage}/{_s3_file_name}', file_format=_file_format, pattern='*', columns=columns)
+            else:
+                # Analyze file profile and schema.
+                columns = kwargs.get('data_schema') or _infer_s3_data_schema(s3=s3, params=params, **kwargs)
+
+                # Create staging table using analyzed schema.
+                sf.create_table(table=staging_table.name, columns=columns, replace_if_exists=True)
+
+                # Copy data into staging table.
+                # Create temporary file format and stage.
+                _file_format = f'tmp_{params.table.database}_{params.table.db_schema}_{params.table.name}'
+                _stage = _file_format
+                _s3_path_for_stage = os.path.split(params.s3_path)[0]
+                _s3_file_name = os.path.split(params.s3_path)[1]
+                if params.file_profile == 'CSV':
+                    sf.create_file_format(file_format=_file_format, file_format_type=params.file_profile, replace_if_exists=True, skip_header=True)
+                elif params.file_profile == 'PARQUET':
+                    sf.create_file_format(file_format=_file_format, file_format_type=params.file_profile, replace_if_exists=True)
+                sf.create_stage(stage_name=_stage, storage_integration='INSCAPE_STORAGE_INTEGRATION', s3_path=_s3_path_for_stage, file_format=_file_format)
+                # Copy data into staging table.
+                sf.copy_into_from_stage_expanded(table_name=staging_table.name, stage_name=f'{_stage}/{_s3_file_name}', file_format=_file_format, pattern='*', columns=columns)
+
+        return _count_rows(sf=sf, table=staging_table)
+
+    run_stage(STAGE_LOAD, load_staging_table)
 
 ########################################################################################################################
 # Run intermediate transformations.
@@ -114,118 +197,238 @@ def s3_to_snowflake(sf: Snowflake, s3: S3, params: S3ToSnowflakeParams, **kwargs
 # Run high-level QA to verify if staging table can be inserted into final table.
 ########################################################################################################################
 
-    staging_table.columns = sf.get_columns(
-        database=staging_table.database,
-        schema=staging_table.db_schema,
-        table=staging_table.name
-    )
-
-    params.table.columns = sf.get_columns(
-        database=params.table.database,
-        schema=params.table.db_schema,
-        table=params.table.name
-    )
+    def get_columns():
+        # Only the QA and insert stages use the columns, so resumed runs past them skip the lookups.
+        if staging_table.columns is None:
+            staging_table.columns = sf.get_columns(
+                database=staging_table.database,
+                schema=staging_table.db_schema,
+                table=staging_table.name
+            )
+            params.table.columns = sf.get_columns(
+                database=params.table.database,
+                schema=params.table.db_schema,
+                table=params.table.name
+            )
+
+    def run_qa():
+        get_columns()
+        if table_exists and not params.replace_table and (params.dependency_on_file or params.extract_script):
+            # Column count QA.
+            if len(staging_table.columns) != len(params.table.columns):
+                # print('STAGING COLUMNS:', staging_table.columns)
+                # print('FINAL COLUMNS:', params.table.columns)
+                raise Exception('The columns in the staging table do not match the target table.')
+
+            # Column names and ordinal position QA.
+
+            # Column dtypes compatibility QA.
+
+            # Check for duplicates.
 
-    if table_exists and not params.replace_table and (params.dependency_on_file or params.extract_script):
-        # Column count QA.
-        if len(staging_table.columns) != len(params.table.columns):
-            # print('STAGING COLUMNS:', staging_table.columns)
-            # print('FINAL COLUMNS:', params.table.columns)
-            raise Exception('The columns in the staging table do not match the target table.')
-
-        # Column names and ordinal position QA.
-
-        # Column dtypes compatibility QA.
-
-        # Check for duplicates.
+        else:
+            dtypes_are_same = True
 
-    else:
-        dtypes_are_same = True
+    run_stage(STAGE_QA, run_qa)
 
 ########################################################################################################################
 # Prepare final table for new data.
 ########################################################################################################################
 
-    if params.overlap_columns and table_exists and not params.replace_table and not params.truncate_table:
-        # Delete overlapping data between staging table and final table.
-        if all(isinstance(x, str) for x in params.overlap_columns):
-            _match_keys = params.overlap_columns
+    def delete_overlapping_data():
+        if params.overlap_columns and table_exists and not params.replace_table and not params.truncate_table:
+            # Delete overlapping data between staging table and final table.
+            if all(isinstance(x, str) for x in params.overlap_columns):
+                _match_keys = params.overlap_columns
+            else:
+                _match_keys = [x.name for x in params.overlap_columns]
+            return sf.delete_overlapping_data(
+                table=params.table.name,
+                schema=params.table.db_schema,
+                match_keys=_match_keys,
+                match_table=staging_table.name,
+                match_schema=staging_table.db_schema,
+                delete_overlapping=True
+            )
+
+    run_stage(STAGE_OVERLAP_DELETE, delete_overlapping_data)
+
+    def insert_into_final_table():
+        get_columns()
+        if table_exists and not params.replace_table:
+            if params.truncate_table:
+                # Truncate final table.
+                sf.truncate_table(database=params.table.database, schema=params.table.db_schema, table=params.table.name)
+
+            # Insert staging table into final table.
+            sf.insert_into(
+                table=params.table.name,
+                schema=params.table.db_schema,
+                from_table=staging_table.name,
+                from_schema=staging_table.db_schema,
+                from_columns=[x.name for x in staging_table.columns],
+                columns=[x.name for x in params.table.columns],
+                ignore_identity_cols=None
+            )
+            return sf.last_row_count
         else:
-            _match_keys = [x.name for x in params.overlap_columns]
-        sf.delete_overlapping_data(
-            table=params.table.name,
-            schema=params.table.db_schema,
-            match_keys=_match_keys,
-            match_table=staging_table.name,
-            match_schema=staging_table.db_schema,
-            delete_overlapping=True
-        )
-
-    if table_exists and not params.replace_table:
-        if params.truncate_table:
-            # Truncate final table.
-            sf.truncate_table(database=params.table.database, schema=params.table.db_schema, table=params.table.name)
-
-        # Insert staging table into final table.
-        sf.insert_into(
-            table=params.table.name,
-            schema=params.table.db_schema,
-            from_table=staging_table.name,
-            from_schema=staging_table.db_schema,
-            from_columns=[x.name for x in staging_table.columns],
-            columns=[x.name for x in params.table.columns],
-            ignore_identity_cols=None
-        )
-
-        #  Drop staging table.
-        sf.drop_table(
-            database=staging_table.database,
-            schema=staging_table.db_schema,
-            table=staging_table.name
-        )
-    else:
-        # Rename staging table to final table.
-        sf.rename_table(
-            table=staging_table.name,
-            rename_to=params.table.name,
-            schema=params.table.db_schema,
-            drop_if_exists=params.replace_table
-        )
-
-
-# def s3_to_s3():
-#
-#     s3_next = S3()
-#     s3_spire = S3()
-#     s3_next.get_session()
-#
-#     # AWS Credentials
-#     session = boto3.Session(
-#         aws_access_key_id='<YOUR S3 KEY>',
-#         aws_secret_access_key='<YOUR S3 SECRET>',
-#     )
-#
-#     def read_in_chunks(file_object, chunk_size=1024):
-#         """Lazy function (generator) to read a file piece by piece.
-#         Default chunk size: 1k."""
-#         while True:
-#             data = file_object.read(chunk_size)
-#             if not data:
-#                 break
-#             yield data
-#
-#     CHUNK_SIZE = 256 * 1024 * 1024  # 256MB
-#     PART_SIZE = 256 * 1024 * 1024  # 256MB
-#
-#     source_s3_url = 's3://path/to/s3/file.gz'
-#     destination_gcp_url = 'gs://path/to/gcs/file.gz'
-#
-#     chunk_index = 0
-#
-#     with open(destination_gcp_url, 'wb', transport_params={'min_part_size': PART_SIZE}) as gcp_sink:
-#         with open(source_s3_url, 'rb', transport_params={'session': session}, ignore_ext=True) as s3_source:
-#             for piece in read_in_chunks(s3_source, CHUNK_SIZE):
-#                 print('Read: ' + size(chunk_index * CHUNK_SIZE) + " (" + str(chunk_index) + ")")
-#                 gcp_sink.write(piece)
-#
-#                 chunk_index = chunk_index + 1
+            # Rename staging table to final table.
+            sf.rename_table(
+                table=staging_table.name,
+                rename_to=params.table.name,
+                schema=params.table.db_schema,
+                drop_if_exists=params.replace_table
+            )
+            return _count_rows(sf=sf, table=params.table)
+
+    run_stage(STAGE_INSERT, insert_into_final_table)
+
+    def drop_staging_table():
+        if table_exists and not params.replace_table:
+            #  Drop staging table.
+            sf.drop_table(
+                database=staging_table.database,
+                schema=staging_table.db_schema,
+                table=staging_table.name
+            )
+
+    run_stage(STAGE_CLEANUP, drop_staging_table)
+
+
+def incremental_s3_to_snowflake(sf: Snowflake, s3: S3, params: S3ToSnowflakeParams, ledger: BaseIngestionLedger,
+                                regex: Optional[str] = None, watermark_column: Optional[str] = None,
+                                ordered_keys: bool = False, lookback_window: Optional[int] = 14, **kwargs) -> List[LedgerEntry]:
+    """Loads only the new or changed S3 objects under `params.s3_path` (a prefix) and records them in `ledger`"""
+    run_id = kwargs.pop('run_id', None)
+    source = f'{params.table.database}.{params.table.db_schema}.{params.table.name}'
+    bucket, prefix = s3.parse_s3_url(params.s3_path)
+    prefix = prefix + '/' if prefix and params.s3_path.endswith('/') else prefix
+    entries = ledger.get_entries(source=source)
+
+    # Re-delivered files at or before the last loaded key are not listed with ordered_keys, even if their ETag changed.
+    start_after = max(entries) if ordered_keys and entries else None
+    objects = s3.list_objects(bucket=bucket, prefix=prefix, start_after=start_after)
+
+    if regex:
+        if DATE_INDICATOR in regex and not any(x in kwargs for x in ['exact_date', 'start_date']):
+            # Window from the date in the name of the latest loaded key.
+            latest_date = get_latest_file_date(files=list(entries), regex=regex, **kwargs)
+            if latest_date:
+                kwargs['start_date'] = latest_date.strftime(kwargs.get('date_format', '%Y-%m-%d'))
+            else:
+                kwargs['start_date'] = today(delta_days=-lookback_window, **kwargs)
+        matched_keys = set(get_matching_files(files=[x.key for x in objects], regex=regex, **kwargs))
+        objects = [x for x in objects if x.key in matched_keys]
+
+    new_objects = sorted(ledger.get_new_objects(source=source, objects=objects, entries=entries), key=lambda x: (x.last_modified, x.key))
+    sf.log.info(f'Found {len(new_objects)} new or changed file(s) out of {len(objects)} listed for {source}')
+
+    loaded = []
+    for each_object in new_objects:
+        _params = dataclasses.replace(params, s3_path=each_object.path)
+        _run_id = f'{run_id}/{each_object.key}@{each_object.etag}' if run_id else None
+        s3_to_snowflake(sf=sf, s3=s3, params=_params, run_id=_run_id, **kwargs)
+
+        max_event_timestamp = None
+        if watermark_column:
+            max_event_timestamp = sf.query(f'SELECT MAX("{watermark_column}") AS "max" FROM {source};')['max'][0]
+            max_event_timestamp = max_event_timestamp if max_event_timestamp == max_event_timestamp else None
+
+        entry = LedgerEntry(source=source, key=each_object.key, etag=each_object.etag, size=each_object.size,
+                            last_modified=each_object.last_modified, max_event_timestamp=max_event_timestamp,
+                            loaded_at=datetime.utcnow())
+        # Record each file as soon as it is loaded so a failure part-way through does not reload earlier files.
+        ledger.record(entries=[entry])
+        loaded.append(entry)
+    return loaded
+
+
+S3_MIN_PART_SIZE = 5 * 1024 ** 2
+S3_MAX_PARTS = 10000
+
+
+def s3_to_s3(source: S3, destination: S3, source_path: str, destination_path: str, part_size: int = 64 * 1024 ** 2,
+             max_concurrency: int = 16, compression: Optional[str] = None, compression_level: int = 6,
+             verify_checksum: bool = True) -> S3Object:
+    """Streams an S3 object between differently-credentialed S3 providers with concurrent ranged GETs and part uploads"""
+    if compression not in [None, 'GZIP']:
+        raise ValueError(f'Unsupported compression: {compression}')
+
+    source_bucket, source_key = source.parse_s3_url(source_path)
+    destination_bucket, destination_key = destination.parse_s3_url(destination_path)
+    metadata = source.get_conn().head_object(Bucket=source_bucket, Key=source_key)
+    size = metadata['ContentLength']
+    source_etag = metadata['ETag'].strip('"')
+
+    part_size = max(part_size, S3_MIN_PART_SIZE, -(-size // S3_MAX_PARTS))
+    offsets = list(range(0, size, part_size)) or [0]
+
+    # Each part is gzipped independently, which makes a multi-member gzip stream.
+    def download(offset: int) -> Tuple[bytes, bytes]:
+        data = source.read_range(key=source_key, bucket=source_bucket, start=offset, end=min(offset + part_size, size) - 1,
+                                 if_match=metadata['ETag']) if size else b''
+        return data, gzip.compress(data, compresslevel=compression_level) if compression == 'GZIP' else data
+
+    def upload(part_number: int, data: bytes) -> Tuple[Dict[str, Any], bytes]:
+        digest = hashlib.md5(data).digest()
+        part = destination.upload_part(key=destination_key, bucket=destination_bucket, upload_id=upload_id, part_number=part_number,
+                                       data=data, content_md5=base64.b64encode(digest).decode())
+        return part, digest
+
+    upload_id = destination.create_multipart_upload(key=destination_key, bucket=destination_bucket)
+    source_md5 = hashlib.md5()
+    try:
+        with ThreadPoolExecutor(max_workers=max_concurrency) as download_pool, \
+                ThreadPoolExecutor(max_workers=max_concurrency) as upload_pool:
+            downloads = deque()
+            uploads = set()
+            completed_uploads = []
+            buffer = bytearray()
+            next_offset = 0
+            uploaded_size = 0
+
+            while next_offset < len(offsets) or downloads:
+                while next_offset < len(offsets) and len(downloads) < max_concurrency:
+                    downloads.append(download_pool.submit(download, offsets[next_offset]))
+                    next_offset += 1
+
+                # Parts are assembled in order; compressed parts are buffered until they reach the part size.
+                raw, data = downloads.popleft().result()
+                if verify_checksum:
+                    source_md5.update(raw)
+                buffer += data
+                is_last = next_offset == len(offsets) and not downloads
+                if len(buffer) >= part_size or is_last:
+                    if len(uploads) >= max_concurrency:
+                        done, uploads = wait(uploads, return_when=FIRST_COMPLETED)
+                        completed_uploads.extend([x.result() for x in done])
+                    part_number = len(completed_uploads) + len(uploads) + 1
+                    uploads.add(upload_pool.submit(upload, part_number, bytes(buffer)))
+                    uploaded_size += len(buffer)
+                    buffer = bytearray()
+
+            completed_uploads.extend([x.result() for x in uploads])
+
+        completed_uploads = sorted(completed_uploads, key=lambda x: x[0]['PartNumber'])
+        completed = destination.complete_multipart_upload(key=destination_key, bucket=destination_bucket, upload_id=upload_id,
+                                                          parts=[x[0] for x in completed_uploads])
+        destination_etag = completed['ETag']
+    except BaseException:
+        destination.abort_multipart_upload(key=destination_key, bucket=destination_bucket, upload_id=upload_id)
+        raise
+
+    if verify_checksum:
+        if '-' not in source_etag and source_md5.hexdigest() != source_etag:
+            # Single-part ETags are the MD5 of the object unless it is encrypted with SSE-KMS/SSE-C.
+            if metadata.get('ServerSideEncryption') in [None, 'AES256'] and 'SSECustomerAlgorithm' not in metadata:
+                destination.delete_keys(keys=destination_key, bucket=destination_bucket)
+                raise Exception(f'Checksum mismatch: {source_path} was modified or corrupted while streaming it. Deleted {destination_path}.')
+        # Multipart ETags of SSE-KMS/SSE-C keys are not derived from the part MD5s, so only the Content-MD5 of each part applies.
+        if completed.get('ServerSideEncryption') not in ['aws:kms', 'aws:kms:dsse'] and 'SSECustomerAlgorithm' not in completed:
+            expected_etag = hashlib.md5(b''.join([x[1] for x in completed_uploads])).hexdigest() + f'-{len(completed_uploads)}'
+            if destination_etag != expected_etag:
+                destination.delete_keys(keys=destination_key, bucket=destination_bucket)
+                raise Exception(f'Checksum mismatch: {destination_path} had ETag {destination_etag}, expected {expected_etag}. Deleted it.')
+
+    destination.log.info(f'Streamed {b2gmk(uploaded_size)} from {source_path} to {destination_path} in {len(completed_uploads)} part(s)')
+    return S3Object(bucket=destination_bucket, key=destination_key, etag=destination_etag, size=uploaded_size)
@@ -5,6 +5,8 @@ import io
 import re
 import json
 import shutil
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from typing import Any, List, Dict, Optional, Tuple, Union
 from urllib.parse import urlparse
@@ -13,14 +15,16 @@ from boto3.s3.transfer import S3Transfer, TransferConfig
 from botocore.exceptions import ClientError
 
 from ontelligence.providers.aws.base import BaseAwsProvider
-from ontelligence.core.schemas.aws import S3Bucket, S3Key
+from ontelligence.core.schemas.aws import S3Bucket, S3Key, S3Object
+from ontelligence.core.schemas.data import Column, FileEntry
 from ontelligence.utils.decorators.function_factory import provide_if_missing
-from ontelligence.utils.file import chunks
+from ontelligence.utils.cache import ProfileCache
+from ontelligence.utils.dtype import infer_data_schema_from_sample
+from ontelligence.utils.file import FileIndex, chunks
 
 
 provide_bucket = provide_if_missing('bucket')
 
-
 class S3(BaseAwsProvider):
 
     def __init__(self, conn_id: Optional[str] = None, bucket: Optional[str] = None, **kwargs):
@@ -36,6 +40,7 @@ class S3(BaseAwsProvider):
         # TODO: Populate self.bucket and self.prefix from connection when not provided to S3 class.
         self.bucket = bucket
         self.prefix = kwargs['prefix'] if 'prefix' in kwargs else ''
+        self._schema_cache: Dict[Tuple[str, str], List[Column]] = {}  # Inferred schemas keyed by (ETag, delimiter).
 
     @staticmethod
     def parse_s3_url(url: str) -> Tuple[str, str]:
@@ -192,6 +197,41 @@ class S3(BaseAwsProvider):
 
         return keys
 
+    @provide_bucket
+    def list_objects(self, bucket: Optional[str] = None, prefix: Optional[str] = None, delimiter: Optional[str] = None,
+                     start_after: Optional[str] = None, page_size: Optional[int] = None, max_items: Optional[int] = None) -> List[S3Object]:
+        """Lists objects (with ETag, size and last modified date) in a bucket under prefix"""
+        prefix = prefix or self.prefix
+        delimiter = delimiter or ''
+        config = {'PageSize': page_size, 'MaxItems': max_items}
+        params = {'Bucket': bucket, 'Prefix': prefix, 'Delimiter': delimiter, 'PaginationConfig': config}
+        if start_after:
+            params['StartAfter'] = start_after
+
+        paginator = self.get_conn().get_paginator('list_objects_v2')
+        response = paginator.paginate(**params)
+
+        objects = []
+        for page in response:
+            if 'Contents' in page:
+                for k in [x for x in page['Contents'] if x['Key'] != prefix]:
+                    objects.append(S3Object(bucket=bucket, key=k['Key'], etag=k['ETag'].strip('"'), size=k['Size'],
+                                            last_modified=k['LastModified']))
+
+        return objects
+
+    @provide_bucket
+    def get_file_index(self, bucket: Optional[str] = None, prefix: Optional[str] = None, regex: Optional[str] = None, **kwargs) -> FileIndex:
+        """Indexes keys under prefix matching regex by the date in the key, then last modified date, from one listing"""
+        entries = [FileEntry(name=x.key, size=x.size, last_modified=x.last_modified)
+                   for x in self.list_objects(bucket=bucket, prefix=prefix) if not x.key.endswith('/')]
+        return FileIndex(entries=entries, regex=regex, **kwargs)
+
+    @provide_bucket
+    def get_latest_key(self, bucket: Optional[str] = None, prefix: Optional[str] = None, regex: Optional[str] = None, **kwargs) -> Optional[str]:
+        latest = self.get_file_index(bucket=bucket, prefix=prefix, regex=regex, **kwargs).get_latest_file()
+        return latest.name if latest else None
+
     @provide_bucket
     def delete_keys(self, keys: Union[str, List[str]], bucket: Optional[str] = None):
         if isinstance(keys, str):
@@ -256,6 +296,85 @@ class S3(BaseAwsProvider):
         )
         return ''.join(event['Records']['Payload'].decode('utf-8') for event in response['Payload'] if 'Records' in event)
 
+    @provide_bucket
+    def read_range(self, key: str, start: int, end: int, bucket: Optional[str] = None, if_match: Optional[str] = None) -> bytes:
+        """Reads the bytes between `start` and `end` (inclusive) of a key, failing if its ETag no longer matches `if_match`"""
+        conditions = {'IfMatch': if_match} if if_match else {}
+        return self.get_conn().get_object(Bucket=bucket, Key=key, Range=f'bytes={start}-{end}', **conditions)['Body'].read()
+
+    @provide_bucket
+    def sample_key(self, key: str, bucket: Optional[str] = None, sample_size: int = 1024 ** 2, samples: int = 4,
+                   size: Optional[int] = None) -> str:
+        """Reads whole lines from the head and evenly spaced interior offsets of a key without downloading it"""
+        size = size if size is not None else self.get_conn().head_object(Bucket=bucket, Key=key)['ContentLength']
+        if not size:
+            return ''
+
+        head = self.read_range(key=key, start=0, end=min(sample_size, size) - 1, bucket=bucket)
+        if head[:2] == b'\x1f\x8b':
+            # Gzip objects cannot be decompressed from an interior offset, so they are sampled from the head.
+            return self._sample_gzip_key(key=key, bucket=bucket, head=head, sample_size=sample_size, size=size)
+        if len(head) < size:
+            head = head[:head.rfind(b'\n') + 1]
+
+        def _read_interior(offset: int) -> bytes:
+            end = min(offset + sample_size, size) - 1
+            data = self.read_range(key=key, start=offset, end=end, bucket=bucket)
+            data = data[data.find(b'\n') + 1:]  # Drop the partial first line.
+            return data if end == size - 1 else data[:data.rfind(b'\n') + 1]
+
+        offsets = [size * i // samples for i in range(1, samples)]
+        offsets = [x for x in offsets if x >= len(head)]
+        with ThreadPoolExecutor(max_workers=max(len(offsets), 1)) as executor:
+            interior = list(executor.map(_read_interior, offsets))
+        return b''.join([head] + interior).decode('utf-8', errors='replace')
+
+    def _sample_gzip_key(self, key: str, bucket: str, head: bytes, sample_size: int, size: int) -> str:
+        """Decompresses whole lines from the head of a (possibly multi-member) gzip key, up to `sample_size` bytes"""
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        sample, position, data = b'', len(head), head
+        while True:
+            while data and len(sample) < sample_size:
+                if decompressor.eof:
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)  # Next gzip member.
+                sample += decompressor.decompress(data, sample_size - len(sample))
+                data = decompressor.unconsumed_tail or (decompressor.unused_data if decompressor.eof else b'')
+            if len(sample) >= sample_size or position >= size:
+                break
+            data = self.read_range(key=key, start=position, end=min(position + sample_size, size) - 1, bucket=bucket)
+            position += len(data)
+        if len(sample) >= sample_size:
+            sample = sample[:sample.rfind(b'\n') + 1]
+        return sample.decode('utf-8', errors='replace')
+
+    @provide_bucket
+    def infer_data_schema(self, key: str, bucket: Optional[str] = None, delimiter: str = ',', override_dtypes: Optional[Dict[str, Any]] = None,
+                          sample_size: int = 1024 ** 2, samples: int = 4, cache: Optional[ProfileCache] = None) -> List[Column]:
+        """Infers the schema of a delimited key from sampled byte ranges, cached by ETag"""
+        metadata = self.get_conn().head_object(Bucket=bucket, Key=key)
+        cache_key = (metadata['ETag'].strip('"'), delimiter)
+        if cache_key not in self._schema_cache and cache:
+            cached = cache.get(content_key=cache.get_etag_key(metadata['ETag']), field=f'columns:{delimiter}')
+            if cached:
+                self._schema_cache[cache_key] = [Column(**x) for x in cached]
+        if cache_key not in self._schema_cache:
+            sample = self.sample_key(key=key, bucket=bucket, sample_size=sample_size, samples=samples, size=metadata['ContentLength'])
+            try:
+                self._schema_cache[cache_key] = infer_data_schema_from_sample(sample=sample, delimiter=delimiter)
+            except Exception as e:
+                # Interior samples can split a quoted field that spans lines; fall back to the head of the key.
+                self.log.warning(f'Could not parse interior samples of {key}, using the head only: {str(e)}')
+                sample = self.sample_key(key=key, bucket=bucket, sample_size=sample_size, samples=1, size=metadata['ContentLength'])
+                self._schema_cache[cache_key] = infer_data_schema_from_sample(sample=sample, delimiter=delimiter)
+            if cache:
+                cache.put(content_key=cache.get_etag_key(metadata['ETag']), field=f'columns:{delimiter}',
+                          value=[{'name': x.name, 'dtype': x.dtype} for x in self._schema_cache[cache_key]])
+        columns = self._schema_cache[cache_key]
+        if override_dtypes:
+            _override_dtypes = {k.lower(): v for k, v in override_dtypes.items()}
+            columns = [Column(name=x.name, dtype=str(_override_dtypes.get(x.name.lower(), x.dtype))) for x in columns]
+        return columns
+
 ########################################################################################################################
 # Write Key.
 ########################################################################################################################
@@ -337,6 +456,35 @@ class S3(BaseAwsProvider):
     def move_key(self):
         raise NotImplementedError
 
+    @provide_bucket
+    def create_multipart_upload(self, key: str, bucket: Optional[str] = None, encrypt: bool = False, acl_policy: Optional[str] = None) -> str:
+        """Starts a multipart upload and returns its upload ID"""
+        extra_args = {}
+        if encrypt:
+            extra_args['ServerSideEncryption'] = "AES256"
+        if acl_policy:
+            extra_args['ACL'] = acl_policy
+        return self.get_conn().create_multipart_upload(Bucket=bucket, Key=key, **extra_args)['UploadId']
+
+    @provide_bucket
+    def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes, bucket: Optional[str] = None,
+                    content_md5: Optional[str] = None) -> Dict[str, Any]:
+        """Uploads one part of a multipart upload; S3 rejects the part if `content_md5` (base64) does not match"""
+        extra_args = {'ContentMD5': content_md5} if content_md5 else {}
+        res = self.get_conn().upload_part(Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=data, **extra_args)
+        return {'PartNumber': part_number, 'ETag': res['ETag']}
+
+    @provide_bucket
+    def complete_multipart_upload(self, key: str, upload_id: str, parts: List[Dict[str, Any]], bucket: Optional[str] = None) -> Dict[str, Any]:
+        """Completes a multipart upload and returns the response, including the ETag and encryption of the new key"""
+        parts = sorted(parts, key=lambda x: x['PartNumber'])
+        res = self.get_conn().complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={'Parts': parts})
+        return {**res, 'ETag': res['ETag'].strip('"')}
+
+    @provide_bucket
+    def abort_multipart_upload(self, key: str, upload_id: str, bucket: Optional[str] = None) -> None:
+        self.get_conn().abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+
     def generate_presigned_url(self, client_method: str, params: Optional[dict] = None, expires_in: int = 3600, http_method: Optional[str] = None) -> Optional[str]:
         """Generate a pre-signed URL given a client, its method, and arguments"""
         try:
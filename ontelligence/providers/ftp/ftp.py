@@ -1,7 +1,11 @@
 import os
+import ftplib
+from datetime import datetime, timezone
 from typing import Optional, List
 
+from ontelligence.core.schemas.data import FileEntry
 from ontelligence.providers.ftp.base import BaseFtpProvider
+from ontelligence.utils.file import FileIndex
 
 
 class FTP(BaseFtpProvider):
@@ -22,15 +26,34 @@ class FTP(BaseFtpProvider):
             self.get_conn().cwd(path)
         return self.get_conn().nlst()
 
-    def get_latest_file(self, files: List[str]):
-        latest_file = None
-        latest_time = None
-        for file in files:
-            time = self.get_conn().sendcmd('MDTM ' + file)
-            if (latest_time is None) or (time > latest_time):
-                latest_file = file
-                latest_time = time
-        return latest_file
+    def list_files(self, path: Optional[str] = None) -> List[FileEntry]:
+        """Lists files with their size and modification time in a single MLSD command (falls back to NLST + MDTM)"""
+        try:
+            return [FileEntry(name=name, size=int(facts['size']) if 'size' in facts else None,
+                              last_modified=self._parse_modify(facts['modify']) if 'modify' in facts else None)
+                    for name, facts in self.get_conn().mlsd(path=path or '', facts=['type', 'size', 'modify'])
+                    if facts.get('type', 'file') == 'file']
+        except ftplib.error_perm:
+            self.log.warning('FTP server does not support MLSD; falling back to one MDTM command per file')
+            names = self.get_conn().nlst(*([path] if path else []))
+            return [FileEntry(name=x, last_modified=self._parse_modify(self.get_conn().sendcmd('MDTM ' + x).split()[-1])) for x in names]
+
+    @staticmethod
+    def _parse_modify(value: str) -> datetime:
+        """Parses an MLSD/MDTM timestamp (YYYYMMDDHHMMSS[.sss], in UTC)"""
+        return datetime.strptime(value[:14], '%Y%m%d%H%M%S').replace(tzinfo=timezone.utc)
+
+    def get_file_index(self, path: Optional[str] = None, regex: Optional[str] = None, **kwargs) -> FileIndex:
+        return FileIndex(entries=self.list_files(path=path), regex=regex, **kwargs)
+
+    def get_latest_file(self, files: Optional[List[str]] = None, regex: Optional[str] = None, path: Optional[str] = None, **kwargs) -> Optional[str]:
+        """Returns the latest of files (or of all files matching regex) by the date in its name, then modification time"""
+        entries = self.list_files(path=path)
+        if files is not None:
+            files = set(files)
+            entries = [x for x in entries if x.name in files]
+        latest = FileIndex(entries=entries, regex=regex, **kwargs).get_latest_file()
+        return latest.name if latest else None
 
     def download_file(self, file: str, output_folder: Optional[str] = ''):
         local_path = os.path.join(output_folder, file)
@@ -1,7 +1,11 @@
 import os
+import stat
+from datetime import datetime, timezone
 from typing import Optional, List
 
+from ontelligence.core.schemas.data import FileEntry
 from ontelligence.providers.ftp.base import BaseSftpProvider
+from ontelligence.utils.file import FileIndex
 
 
 class SFTP(BaseSftpProvider):
@@ -22,15 +26,22 @@ class SFTP(BaseSftpProvider):
             self.get_conn().cwd(path)
         return self.get_conn().listdir()
 
-    def get_latest_file(self, files: List[str]):
-        latest_file = None
-        latest_time = None
-        for file in files:
-            time = self.get_conn().sendcmd('MDTM ' + file)
-            if (latest_time is None) or (time > latest_time):
-                latest_file = file
-                latest_time = time
-        return latest_file
+    def list_files(self, path: Optional[str] = None) -> List[FileEntry]:
+        """Lists files with their size and modification time in a single listdir_attr call"""
+        return [FileEntry(name=x.filename, size=x.st_size, last_modified=datetime.fromtimestamp(x.st_mtime, tz=timezone.utc))
+                for x in self.get_conn().listdir_attr(path=path or '.') if x.st_mode is None or stat.S_ISREG(x.st_mode)]
+
+    def get_file_index(self, path: Optional[str] = None, regex: Optional[str] = None, **kwargs) -> FileIndex:
+        return FileIndex(entries=self.list_files(path=path), regex=regex, **kwargs)
+
+    def get_latest_file(self, files: Optional[List[str]] = None, regex: Optional[str] = None, path: Optional[str] = None, **kwargs) -> Optional[str]:
+        """Returns the latest of files (or of all files matching regex) by the date in its name, then modification time"""
+        entries = self.list_files(path=path)
+        if files is not None:
+            files = set(files)
+            entries = [x for x in entries if x.name in files]
+        latest = FileIndex(entries=entries, regex=regex, **kwargs).get_latest_file()
+        return latest.name if latest else None
 
     def download_file(self, file: str, output_folder: Optional[str] = ''):
         local_path = os.path.join(output_folder, file)
@@ -55,4 +66,4 @@ class SFTP(BaseSftpProvider):
 ########################################################################################################################
 
     def get_file_modification_date(self, file):
-        raise NotImplementedError
+        return datetime.fromtimestamp(self.get_conn().stat(file).st_mtime, tz=timezone.utc)
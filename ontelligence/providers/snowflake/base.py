@@ -14,6 +14,7 @@ class BaseSnowflakeProvider(BaseProvider):
     warehouse = None
     database = None
     schema = None
+    user = None
 
     def __init__(self, conn_id: str, **kwargs):
         super().__init__(secret_schema=SnowflakeSecret, connection_schema=SnowflakeConnection)
@@ -31,16 +32,13 @@ class BaseSnowflakeProvider(BaseProvider):
         self.database = self.kwargs.get('database', conn.data.database)
         self.schema = self.kwargs.get('schema', conn.data.db_schema)
 
-        user = self.kwargs.get('user', secret.data.user)
-        private_key = self.kwargs.get('private_key', secret.data.ssh.private_key)
-        pass_phrase = self.kwargs.get('pass_phrase', secret.data.ssh.pass_phrase)
-
-        pkb = load_pem_private_key(private_key.encode(), password=pass_phrase.encode(), backend=default_backend()) \
-            .private_bytes(encoding=Encoding.DER, format=PrivateFormat.PKCS8, encryption_algorithm=NoEncryption())
+        self.user = self.kwargs.get('user', secret.data.user)
+        pkb = self._load_private_key(secret=secret).private_bytes(encoding=Encoding.DER, format=PrivateFormat.PKCS8,
+                                                                   encryption_algorithm=NoEncryption())
 
         connection_config = {
             'account': self.account,
-            'user': user,
+            'user': self.user,
             'private_key': pkb,
             'warehouse': self.warehouse,
             'database': self.database,
@@ -48,3 +46,13 @@ class BaseSnowflakeProvider(BaseProvider):
         }
 
         return snowflake.connector.connect(**connection_config)
+
+    def _load_private_key(self, secret):
+        private_key = self.kwargs.get('private_key', secret.data.ssh.private_key)
+        pass_phrase = self.kwargs.get('pass_phrase', secret.data.ssh.pass_phrase)
+        return load_pem_private_key(private_key.encode(), password=pass_phrase.encode(), backend=default_backend())
+
+    def get_private_key(self):
+        """Loads the private key from the connection's secret without keeping it on the provider"""
+        conn = self._get_connection(conn_id=self.conn_id, override_data=self.kwargs)
+        return self._load_private_key(secret=self._get_secret(secret_id=conn.secret, override_data=self.kwargs))
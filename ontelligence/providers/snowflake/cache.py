@@ -0,0 +1,139 @@
+import os
+import re
+import hashlib
+from typing import List, Optional
+
+import pandas as pd
+import sqlparse
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from ontelligence.core.config import settings
+from ontelligence.utils.log import LoggingMixin
+
+
+# Results of queries using these cannot be reused even if the referenced tables did not change.
+_NON_DETERMINISTIC = re.compile(r'\b(CURRENT_\w+|LOCALTIME\w*|SYSDATE|GETDATE|SYSTIMESTAMP|RANDOM|UUID_STRING|SEQ\d)\b', flags=re.IGNORECASE)
+_TOKEN = re.compile(r"'(?:[^'\\]|\\.)*'|\"[^\"]*\"|[\w$]+|\S")
+_IDENTIFIER = re.compile(r'"[^"]+"|[A-Za-z_][\w$]*')
+# Keywords that end the FROM clause of the current (sub)query.
+_FROM_CLAUSE_END = {'WHERE', 'GROUP', 'HAVING', 'QUALIFY', 'ORDER', 'LIMIT', 'OFFSET', 'FETCH', 'WINDOW',
+                    'UNION', 'EXCEPT', 'INTERSECT', 'MINUS', 'SELECT'}
+# Functions whose arguments may contain FROM, e.g. EXTRACT(YEAR FROM dt).
+_FROM_FUNCTIONS = {'EXTRACT', 'TRIM', 'SUBSTRING'}
+_CTE_NAME = re.compile(r'(?:\bWITH|,)\s*("[^"]+"|[\w$]+)\s+AS\s*\(', flags=re.IGNORECASE)
+
+
+class QueryResultCache(LoggingMixin):
+    """Local Parquet cache of query results keyed by normalized SQL, role and the LAST_ALTERED of the referenced tables"""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 10 * 1024 ** 3):
+        if pq is None:
+            raise ImportError('Python package pyarrow is required for the query result cache. Install it with "pip install ontelligence[parquet]".')
+        self.cache_dir = cache_dir or os.path.join(settings.HOME_PATH, 'query_cache')
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def normalize_sql(query: str) -> str:
+        query = sqlparse.format(query, strip_comments=True, strip_whitespace=True, keyword_case='upper')
+        return query.strip().rstrip(';').strip()
+
+    @staticmethod
+    def is_cacheable(query: str) -> bool:
+        return not _NON_DETERMINISTIC.search(query) and bool(re.match(r'^\s*(SELECT|WITH)\b', query, flags=re.IGNORECASE))
+
+    @staticmethod
+    def get_referenced_tables(query: str) -> Optional[List[str]]:
+        """Returns the names that follow FROM/JOIN excluding CTE names, or None if a FROM clause cannot be fully accounted for"""
+        tokens = _TOKEN.findall(sqlparse.format(query, strip_comments=True))
+        cte_names = {x.strip('"').upper() for x in _CTE_NAME.findall(query)}
+        tables = set()
+        in_from_clause, in_function = [False], [False]  # Per parenthesis depth.
+        for i, token in enumerate(tokens):
+            keyword = token.upper()
+            if token == '(':
+                in_from_clause.append(False)
+                in_function.append(i > 0 and tokens[i - 1].upper() in _FROM_FUNCTIONS)
+            elif token == ')':
+                if len(in_from_clause) > 1:
+                    in_from_clause.pop()
+                    in_function.pop()
+            elif in_function[-1]:
+                continue
+            elif token == ',' and in_from_clause[-1]:
+                return None  # Comma-separated FROM list.
+            elif keyword in _FROM_CLAUSE_END:
+                in_from_clause[-1] = False
+            elif keyword in ['FROM', 'JOIN']:
+                in_from_clause[-1] = True
+                parts, j = [], i + 1
+                while j < len(tokens) and _IDENTIFIER.fullmatch(tokens[j]):
+                    parts.append(tokens[j])
+                    if tokens[j + 1:j + 2] != ['.']:
+                        break
+                    j += 2
+                if not parts:
+                    if tokens[i + 1:i + 2] == ['(']:
+                        continue  # Subquery.
+                    return None  # E.g. a stage or a string.
+                if len(parts) > 3:
+                    return None
+                if '.'.join(parts).strip('"').upper() not in cte_names:
+                    tables.add('.'.join(parts))
+        return sorted(tables)
+
+    def get_key(self, query: str, role: Optional[str], fingerprint: str) -> str:
+        data = '\n'.join([self.normalize_sql(query), str(role or '').upper(), fingerprint])
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f'{key}.parquet')
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        path = self._get_path(key)
+        try:
+            table = pq.read_table(path, memory_map=True)
+        except (FileNotFoundError, OSError, pa.ArrowInvalid):
+            return None
+        os.utime(path)  # Mark as recently used.
+        return table.to_pandas()
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        path = self._get_path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp_path)
+            os.replace(tmp_path, path)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            self.log.warning(f'Could not cache query result: {str(e)}')
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes the least recently used results until the cache fits in `max_bytes`"""
+        entries = []
+        for each_entry in os.scandir(self.cache_dir):
+            if each_entry.is_file() and each_entry.name.endswith('.parquet'):
+                stat = each_entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, each_entry.path))
+        total_size = sum(x[1] for x in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+
+    def clear(self) -> None:
+        for each_entry in os.scandir(self.cache_dir):
+            if each_entry.name.endswith('.parquet'):
+                os.remove(each_entry.path)
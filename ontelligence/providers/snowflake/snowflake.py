@@ -1,9 +1,21 @@
-from typing import Optional, List, Dict
+import os
+import re
+import json
+import gzip
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Optional, List, Dict
 
 import pandas as pd
 
 from ontelligence.core.schemas.data import Table, Column
+from ontelligence.core.schemas.snowflake import QueryProfile, StatementResult, UnloadedFile
+from ontelligence.providers.aws.s3 import S3
 from ontelligence.providers.snowflake.base import BaseSnowflakeProvider
+from ontelligence.providers.snowflake.cache import QueryResultCache
 from ontelligence.utils.decorators.function_factory import provide_if_missing
 from ontelligence.utils.file import get_clean_headers
 
@@ -11,6 +23,25 @@ from ontelligence.utils.file import get_clean_headers
 provide_database_and_schema = provide_if_missing(['database', 'schema'])
 
 
+def sql_literal(value: Any) -> str:
+    """Renders a Python value as a Snowflake SQL literal"""
+    if type(value).__module__ == 'numpy':
+        value = value.item()
+    if value is None or (isinstance(value, float) and value != value):
+        return 'NULL'
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, (int, float, Decimal)):
+        return str(value)
+    if isinstance(value, datetime):
+        if value.tzinfo:
+            return f"'{value.isoformat()}'::TIMESTAMP_TZ"
+        return f"'{value.isoformat()}'::TIMESTAMP_NTZ"
+    if isinstance(value, date):
+        return f"'{value.isoformat()}'::DATE"
+    return "'{}'".format(str(value).replace('\\', '\\\\').replace("'", "''"))
+
+
 class Snowflake(BaseSnowflakeProvider):
 
     chunk_size = 1024 ** 2 * 25
@@ -20,8 +51,19 @@ class Snowflake(BaseSnowflakeProvider):
     database = None
     schema = None
 
+    # Credits consumed per hour of warehouse uptime, used to attribute credits to individual queries.
+    warehouse_credits_per_hour = {
+        'X-SMALL': 1, 'SMALL': 2, 'MEDIUM': 4, 'LARGE': 8, 'X-LARGE': 16,
+        '2X-LARGE': 32, '3X-LARGE': 64, '4X-LARGE': 128, '5X-LARGE': 256, '6X-LARGE': 512
+    }
+
     def __init__(self, conn_id, **kwargs):
         super().__init__(conn_id=conn_id, **kwargs)
+        self._query_id_recorders = []
+        self.result_cache = None
+        self._batch = None
+        self.last_query_id = None
+        self.last_row_count = None
         self.__cursor = self.get_conn().cursor()
         self.use_role(role=self.role)
 
@@ -35,8 +77,16 @@ class Snowflake(BaseSnowflakeProvider):
 ########################################################################################################################
 
     def execute(self, query, commit=True, return_cursor=False):
+        if self._batch is not None:
+            if return_cursor:
+                raise Exception('Cannot read query results inside a batch. Run the query outside of "Snowflake.batch()".')
+            self._batch.append(query)
+            return
         self.__cursor.execute(query)
+        self.last_query_id = self.__cursor.sfqid
+        self._record_query_id(self.last_query_id)
         row_count = self.__cursor.rowcount
+        self.last_row_count = row_count
         if row_count != -1:
             self.log.info(f'Number of rows affected by query: {row_count}')
         if commit:
@@ -44,7 +94,67 @@ class Snowflake(BaseSnowflakeProvider):
         if return_cursor:
             return self.__cursor
 
-    def query(self, query: str, chunk_size: Optional[int] = None, return_chunks: bool = False) -> pd.DataFrame:
+    def _record_query_id(self, query_id: Optional[str]) -> None:
+        for each_recorder in self._query_id_recorders:
+            each_recorder.append(query_id)
+
+    @contextmanager
+    def record_query_ids(self):
+        """Yields a list that collects the IDs of the statements executed inside the block"""
+        query_ids = []
+        self._query_id_recorders.append(query_ids)
+        try:
+            yield query_ids
+        finally:
+            self._query_id_recorders = [x for x in self._query_id_recorders if x is not query_ids]
+
+    @contextmanager
+    def batch(self, transaction: bool = True):
+        """Collects the statements issued by `execute` inside the block and runs them in a single round trip on exit"""
+        # DDL statements commit implicitly in Snowflake, so `transaction` only makes DML statements atomic.
+        if self._batch is not None:
+            raise Exception('Batches cannot be nested.')
+        self._batch = []
+        try:
+            yield self._batch
+            statements = self._batch
+        finally:
+            self._batch = None
+        self.execute_batch(statements=statements, transaction=transaction)
+
+    def execute_batch(self, statements: List[str], transaction: bool = True) -> List[StatementResult]:
+        """Runs statements as one multi-statement request, committing once, and returns the result of each statement"""
+        statements = [x.strip().rstrip(';') for x in statements if x.strip().rstrip(';')]
+        if not statements:
+            return []
+        if transaction:
+            statements = ['BEGIN'] + statements + ['COMMIT']
+        script = ';\n'.join(statements) + ';'
+
+        results = []
+        try:
+            self.__cursor.execute(script, num_statements=len(statements))
+            while True:
+                results.append(StatementResult(query=statements[len(results)], query_id=self.__cursor.sfqid, row_count=self.__cursor.rowcount))
+                self._record_query_id(self.__cursor.sfqid)
+                if not self.__cursor.nextset():
+                    break
+        except Exception:
+            if transaction:
+                self.__cursor.execute('ROLLBACK;')
+            raise
+        finally:
+            if results:
+                self.last_query_id = results[-1].query_id
+                self.last_row_count = results[-1].row_count
+        if not transaction:
+            self.get_conn().commit()
+        self.log.info(f'Executed a batch of {len(results)} statements')
+        return results
+
+    def query(self, query: str, chunk_size: Optional[int] = None, return_chunks: bool = False, use_cache: bool = False) -> pd.DataFrame:
+        if use_cache and not return_chunks:
+            return self._query_with_cache(query=query, chunk_size=chunk_size)
         chunk_size = chunk_size if chunk_size else self.chunk_size
         cur = self.execute(query=query, commit=False, return_cursor=True)
         columns = [desc[0] for desc in cur.description]
@@ -62,6 +172,57 @@ class Snowflake(BaseSnowflakeProvider):
         except Exception as e:
             raise Exception('Could not execute query:' + str(e))
 
+########################################################################################################################
+# Result cache.
+########################################################################################################################
+
+    def enable_result_cache(self, cache_dir: Optional[str] = None, max_bytes: int = 10 * 1024 ** 3) -> QueryResultCache:
+        """Configures the local result cache used by `query(..., use_cache=True)`"""
+        self.result_cache = QueryResultCache(cache_dir=cache_dir, max_bytes=max_bytes)
+        return self.result_cache
+
+    def _query_with_cache(self, query: str, chunk_size: Optional[int] = None) -> pd.DataFrame:
+        if self.result_cache is None:
+            self.enable_result_cache()
+        fingerprint = None
+        tables = self.result_cache.get_referenced_tables(query) if self.result_cache.is_cacheable(query) else None
+        if tables is not None:
+            fingerprint = self.get_table_fingerprint(tables=tables)
+        if fingerprint is None:
+            self.log.info('Query result is not cacheable. Running query.')
+            return self.query(query=query, chunk_size=chunk_size)
+
+        key = self.result_cache.get_key(query=query, role=self.role, fingerprint=fingerprint)
+        df = self.result_cache.get(key)
+        if df is not None:
+            self.log.info(f'Serving query result from cache: {key}')
+            return df
+        df = self.query(query=query, chunk_size=chunk_size)
+        self.result_cache.put(key, df)
+        return df
+
+    def get_table_fingerprint(self, tables: List[str]) -> Optional[str]:
+        """Returns the LAST_ALTERED timestamp of each table, or None if any is missing or not a base table (e.g. a view)"""
+        resolved = []
+        for each_table in tables:
+            parts = [x.strip('"') if x.startswith('"') else x.upper() for x in re.findall(r'"[^"]+"|[^.]+', each_table)]
+            parts = [str(self.database).upper(), str(self.schema).upper()][:3 - len(parts)] + parts
+            resolved.append(tuple(parts))
+
+        fingerprints = []
+        for database in sorted({x[0] for x in resolved}):
+            _tables = sorted({x for x in resolved if x[0] == database})
+            conditions = '\n                           OR '.join(
+                [f'(TABLE_SCHEMA = {sql_literal(x[1])} AND TABLE_NAME = {sql_literal(x[2])})' for x in _tables])
+            query = f'''SELECT TABLE_SCHEMA, TABLE_NAME, TABLE_TYPE, LAST_ALTERED
+                        FROM "{database}".INFORMATION_SCHEMA.TABLES
+                        WHERE {conditions};'''
+            rows = self.execute(query=query, commit=False, return_cursor=True).fetchall()
+            if len(rows) != len(_tables) or any(x[2] != 'BASE TABLE' for x in rows):
+                return None
+            fingerprints.extend([f'{database}.{x[0]}.{x[1]}@{x[3]}' for x in rows])
+        return '\n'.join(sorted(fingerprints))
+
 ########################################################################################################################
 # Session.
 ########################################################################################################################
@@ -269,7 +430,6 @@ class Snowflake(BaseSnowflakeProvider):
                     PURGE = FALSE;'''
 
         self.log_sql(query)
-        print('\n' + query)
         self.execute(query=query)
 
 ########################################################################################################################
@@ -295,8 +455,12 @@ class Snowflake(BaseSnowflakeProvider):
     def drop_pipe(self, pipe: str) -> None:
         self.execute(f'DROP PIPE IF EXISTS {pipe};')
 
-    def run_pipe(self):
-        raise NotImplementedError
+    def run_pipe(self, pipe: str, s3: S3, bucket: Optional[str] = None, prefix: str = '', ledger=None,
+                 wait: bool = True, timeout: int = 600, poll_interval: int = 10):
+        """Submits new files under prefix, the S3 prefix of the pipe's stage, through the Snowpipe REST API"""
+        from ontelligence.providers.snowflake.snowpipe import SnowpipeClient  # Avoids a circular import with core.ledger.
+        client = SnowpipeClient(sf=self, pipe=pipe, ledger=ledger, stage_prefix=prefix)
+        return client.ingest(s3=s3, bucket=bucket, prefix=prefix, wait=wait, timeout=timeout, poll_interval=poll_interval)
 
 ########################################################################################################################
 # Insert into.
@@ -365,31 +529,80 @@ class Snowflake(BaseSnowflakeProvider):
                      file_type: Optional[str] = None,
                      compression: Optional[str] = None,
                      header: Optional[bool] = True,
-                     single: Optional[bool] = True
-                     ):
-
-        s3_path = s3_path + file_name if s3_path.endswith('/') else s3_path
+                     single: Optional[bool] = True,
+                     partition_by: Optional[str] = None,
+                     max_file_size: Optional[int] = None
+                     ) -> List[UnloadedFile]:
+        """Unloads a query to S3 (in parallel with single=False) and returns the manifest of produced files"""
+        if partition_by and single:
+            raise ValueError('A partitioned unload produces several files. Pass in single=False with "partition_by"')
+        location = s3_path + file_name if s3_path.endswith('/') else s3_path
         storage_integration = storage_integration or None
         file_type = file_type or 'CSV'
-        compression = compression or 'NONE'
+        compression = compression or ('NONE' if file_type == 'CSV' else 'AUTO')
         header = 'TRUE' if header else 'FALSE'
-        single = str(single).upper()
+        single = bool(single)
+        max_file_size = max_file_size or (5 * 1024 ** 3 if single else 256 * 1024 ** 2)
+        csv_options = '''
+                        FIELD_OPTIONALLY_ENCLOSED_BY='"'
+                        NULL_IF = ('', 'NULL', 'null', 'N/A', '//N')''' if file_type == 'CSV' else ''
+        # OVERWRITE is not supported together with PARTITION BY.
+        partition_by = f'\n                    PARTITION BY ({partition_by})' if partition_by else '\n                    OVERWRITE=TRUE'
 
-        query = f'''COPY INTO '{s3_path}'
+        query = f'''COPY INTO '{location}'
                     FROM ({query.rstrip(';')})
                     STORAGE_INTEGRATION={storage_integration}
                     FILE_FORMAT=(
                         TYPE={file_type}
-                        COMPRESSION={compression}
-                        FIELD_OPTIONALLY_ENCLOSED_BY='"'
-                        NULL_IF = ('', 'NULL', 'null', 'N/A', '//N')
-                    )
-                    SINGLE={single}
-                    OVERWRITE=TRUE
+                        COMPRESSION={compression}{csv_options}
+                    ){partition_by}
+                    SINGLE={str(single).upper()}
                     HEADER={header}
-                    MAX_FILE_SIZE={5 * 1024**3};'''
+                    MAX_FILE_SIZE={max_file_size}
+                    DETAILED_OUTPUT=TRUE;'''
         self.log_sql(query)
-        self.execute(query=query)
+        cursor = self.execute(query=query, return_cursor=True)
+
+        folder = location.rsplit('/', 1)[0] + '/'
+        manifest = []
+        for file_path, file_size, row_count in cursor.fetchall():
+            # FILE_NAME is relative to the location's folder when it includes the file name prefix.
+            path = folder + file_path if file_path.startswith(location[len(folder):]) else location + file_path
+            manifest.append(UnloadedFile(path=path, size=file_size, rows=row_count))
+        self.log.info(f'Unloaded {sum(x.rows for x in manifest)} rows into {len(manifest)} file(s) under {location}')
+        return manifest
+
+    def download_export(self, manifest: List[UnloadedFile], s3: S3, local_path: str, combine: bool = False,
+                        header: bool = True, max_concurrency: int = 8) -> str:
+        """Downloads the files of an unload concurrently into `local_path`, or stitches CSV files into it with `combine`"""
+        non_csv_files = [x.path for x in manifest if re.search(r'\.(parquet|json)(\.|$)', os.path.basename(x.path), re.IGNORECASE)]
+        if combine and non_csv_files:
+            raise ValueError(f'Only CSV unloads can be combined, got {non_csv_files[0]}')
+        folder = os.path.dirname(os.path.abspath(local_path)) if combine else local_path
+        common_prefix = os.path.dirname(os.path.commonprefix([x.path for x in manifest])) + '/'
+
+        def _download(file: UnloadedFile) -> str:
+            bucket, key = s3.parse_s3_url(file.path)
+            # Partition sub-folders are kept, so a Parquet unload lands as a dataset.
+            _local_folder = os.path.join(folder, os.path.dirname(file.path[len(common_prefix):]))
+            os.makedirs(_local_folder, exist_ok=True)
+            return s3.download_file(key=key, bucket=bucket, local_path=_local_folder)
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            local_files = list(executor.map(_download, manifest))
+
+        if not combine:
+            return local_path
+
+        with open(local_path, 'wb') as f_out:
+            for i, each_file in enumerate(local_files):
+                _open = gzip.open if each_file.endswith('.gz') else open
+                with _open(each_file, 'rb') as f_in:
+                    if header and i > 0:
+                        f_in.readline()
+                    shutil.copyfileobj(f_in, f_out, length=self.chunk_size)
+                os.remove(each_file)
+        return local_path
 
     @provide_database_and_schema
     def export_table(self, table: str,
@@ -401,9 +614,15 @@ class Snowflake(BaseSnowflakeProvider):
                      header: Optional[bool] = True,
                      database: Optional[str] = None,
                      schema: Optional[str] = None,
-                     single: Optional[bool] = True
-                     ):
-        self.export_query(
+                     single: Optional[bool] = True,
+                     partition_by: Optional[str] = None,
+                     max_file_size: Optional[int] = None,
+                     s3: Optional[S3] = None,
+                     local_path: Optional[str] = None,
+                     combine: bool = False
+                     ) -> List[UnloadedFile]:
+        """Unloads a table to S3 and, when `s3` and `local_path` are given, downloads it (see `download_export`)"""
+        manifest = self.export_query(
             query=f'SELECT * FROM {database}.{schema}.{table}',
             file_name=file_name,
             s3_path=s3_path,
@@ -411,8 +630,15 @@ class Snowflake(BaseSnowflakeProvider):
             file_type=file_type,
             compression=compression,
             header=header,
-            single=single
+            single=single,
+            partition_by=partition_by,
+            max_file_size=max_file_size
         )
+        if local_path:
+            if not s3:
+                raise ValueError('Please provide an S3 provider to download the export to "local_path"')
+            self.download_export(manifest=manifest, s3=s3, local_path=local_path, combine=combine, header=header)
+        return manifest
 
 ########################################################################################################################
 # Stored procedures.
@@ -432,32 +658,186 @@ class Snowflake(BaseSnowflakeProvider):
         using = f' USING {using}' if using else ''
         return self.query(f"EXPLAIN{using} {statement.rstrip(';')};")
 
+########################################################################################################################
+# Query history.
+########################################################################################################################
+
+    def get_query_history(self, query_ids: List[str]) -> pd.DataFrame:
+        """Returns QUERY_HISTORY metrics of queries run in this session, with an estimate of the warehouse credits used"""
+        if not query_ids:
+            return pd.DataFrame()
+        ids = ', '.join([sql_literal(x) for x in query_ids])
+        df = self.query(f'''SELECT QUERY_ID, QUERY_TYPE, WAREHOUSE_NAME, WAREHOUSE_SIZE, BYTES_SCANNED, ROWS_PRODUCED,
+                                     COMPILATION_TIME, EXECUTION_TIME, TOTAL_ELAPSED_TIME, QUEUED_PROVISIONING_TIME,
+                                     QUEUED_OVERLOAD_TIME, CREDITS_USED_CLOUD_SERVICES, QUERY_TEXT
+                              FROM TABLE({self.database}.INFORMATION_SCHEMA.QUERY_HISTORY_BY_SESSION(RESULT_LIMIT => 10000))
+                              WHERE QUERY_ID IN ({ids});''')
+        credits_per_hour = df['WAREHOUSE_SIZE'].fillna('').str.upper().map(self.warehouse_credits_per_hour).fillna(0)
+        df['WAREHOUSE_CREDITS'] = df['EXECUTION_TIME'].fillna(0) / (3600 * 1000) * credits_per_hour
+        return df
+
+    def get_query_operator_stats(self, query_id: str) -> pd.DataFrame:
+        """Returns the per-operator statistics of a completed query"""
+        df = self.query(f'SELECT * FROM TABLE(GET_QUERY_OPERATOR_STATS({sql_literal(query_id)}));')
+        for col in ['OPERATOR_STATISTICS', 'EXECUTION_TIME_BREAKDOWN', 'OPERATOR_ATTRIBUTES']:
+            if col in df.columns:
+                df[col] = df[col].map(lambda x: json.loads(x) if isinstance(x, str) else x)
+        return df
+
+########################################################################################################################
+# Query profiling.
+########################################################################################################################
+
+    def profile_queries(self, query_ids: List[str], max_scan_ratio: float = 0.8, min_partitions: int = 10,
+                        max_spill_bytes: int = 0, operator_stats: bool = True) -> List[QueryProfile]:
+        """Returns the QUERY_HISTORY metrics of queries, with pruning and spills totalled from their operator statistics"""
+        history = self.get_query_history(query_ids=query_ids)
+        history = {x['QUERY_ID']: {k: v if v == v else None for k, v in x.items()} for x in history.to_dict(orient='records')}
+
+        profiles = []
+        for query_id in query_ids:
+            x = history.get(query_id)
+            if x is None:
+                continue
+            profile = QueryProfile(
+                query_id=query_id,
+                query_type=x['QUERY_TYPE'],
+                query_text=x['QUERY_TEXT'],
+                elapsed_ms=x['TOTAL_ELAPSED_TIME'],
+                queued_ms=(x['QUEUED_PROVISIONING_TIME'] or 0) + (x['QUEUED_OVERLOAD_TIME'] or 0),
+                bytes_scanned=x['BYTES_SCANNED'],
+                warnings=[]
+            )
+            if operator_stats:
+                profile.operator_stats = self.get_query_operator_stats(query_id=query_id).to_dict(orient='records')
+                self._add_operator_totals(profile)
+
+            for each_operator in profile.operator_stats or []:
+                pruning = (each_operator.get('OPERATOR_STATISTICS') or {}).get('pruning') or {}
+                scanned, total = pruning.get('partitions_scanned'), pruning.get('partitions_total')
+                if total and total >= min_partitions and scanned / total > max_scan_ratio:
+                    table = (each_operator.get('OPERATOR_ATTRIBUTES') or {}).get('table_name')
+                    profile.warnings.append(f'{each_operator.get("OPERATOR_TYPE")} on {table} scanned {scanned} of {total} partitions')
+            if (profile.bytes_spilled_local or 0) > max_spill_bytes:
+                profile.warnings.append(f'Spilled {profile.bytes_spilled_local} bytes to local storage')
+            if profile.bytes_spilled_remote:
+                profile.warnings.append(f'Spilled {profile.bytes_spilled_remote} bytes to remote storage')
+
+            for each_warning in profile.warnings:
+                self.log.warning(f'Query {query_id}: {each_warning}')
+            profiles.append(profile)
+        return profiles
+
+    @staticmethod
+    def _add_operator_totals(profile: QueryProfile) -> None:
+        """Totals the pruning and spilling statistics of a query's operators"""
+        totals = {}
+        for each_operator in profile.operator_stats:
+            statistics = each_operator.get('OPERATOR_STATISTICS') or {}
+            for group, key in [('pruning', 'partitions_scanned'), ('pruning', 'partitions_total'),
+                               ('spilling', 'bytes_spilled_local_storage'), ('spilling', 'bytes_spilled_remote_storage')]:
+                value = (statistics.get(group) or {}).get(key)
+                if value is not None:
+                    totals[key] = totals.get(key, 0) + value
+        profile.partitions_scanned = totals.get('partitions_scanned')
+        profile.partitions_total = totals.get('partitions_total')
+        profile.bytes_spilled_local = totals.get('bytes_spilled_local_storage', 0)
+        profile.bytes_spilled_remote = totals.get('bytes_spilled_remote_storage', 0)
+
+    @contextmanager
+    def profile(self, **kwargs):
+        """Yields a list that is filled on exit with a QueryProfile per statement executed inside the block"""
+        profiles, failed = [], True
+        with self.record_query_ids() as query_ids:
+            try:
+                yield profiles
+                failed = False
+            finally:
+                try:
+                    profiles.extend(self.profile_queries(query_ids=[x for x in query_ids if x], **kwargs))
+                except Exception as e:
+                    if not failed:
+                        raise
+                    self.log.warning(f'Could not profile the statements of a failed block: {str(e)}')
+
 ########################################################################################################################
 # Misc.
 ########################################################################################################################
 
-    def delete_overlapping_data(self, table, schema, match_table, match_schema, match_keys, debug=False, delete_overlapping=True):
+    def delete_overlapping_data(self, table, schema, match_table, match_schema, match_keys, debug=False, delete_overlapping=True,
+                                in_list_threshold: int = 1000) -> int:
+        """Deletes rows of table whose keys exist in match_table, and returns the number of rows deleted"""
         # use delete_overlapping=False to remove duplicate data for large datasets
-        all_match_keys = []
-        if delete_overlapping:
-            for key in match_keys:
-                if key.lower().startswith('trunc('):
-                    key = key.lower().strip().replace('trunc(', '').replace(')', '')
-                    # join_pattern = 'TRUNC({0}.{1}.{2}."{3}") = TRUNC({4}.{5}.{6}."{7}")'
-                    join_pattern = 'DATE_TRUNC("day", {0}.{1}.{2}."{3}") = DATE_TRUNC("day", {4}.{5}.{6}."{7}")'
-                elif key.lower().startswith('nvl('):
-                    key = key.lower().strip().replace('nvl(', '').replace(')', '')
-                    join_pattern = 'NVL({0}.{1}.{2}."{3}") = NVL({4}.{5}.{6}."{7}")'
-                else:
-                    join_pattern = '{0}.{1}.{2}."{3}" = {4}.{5}.{6}."{7}"'
-                all_match_keys.extend([join_pattern.format(self.database, schema, table, str(key).strip('"').strip("'"),
-                                                           self.database, match_schema, match_table, str(key).strip('"').strip("'"))])
-            join_statement = '\n                AND '.join(all_match_keys)
-            query = f'''DELETE FROM {self.database}.{schema}.{table}
-                        WHERE EXISTS (SELECT 1 FROM {self.database}.{match_schema}.{match_table}
-                                      WHERE {join_statement});'''
-            self.log_sql(query)
-            self.execute(query)
+        if not delete_overlapping:
+            return 0
+
+        keys = []
+        for key in match_keys:
+            kind = 'plain'
+            if key.lower().startswith('trunc('):
+                kind = 'trunc'
+                key = key.lower().strip().replace('trunc(', '').replace(')', '')
+            elif key.lower().startswith('nvl('):
+                kind = 'nvl'
+                key = key.lower().strip().replace('nvl(', '').replace(')', '')
+            keys.append(('"{}"'.format(str(key).strip().strip('"').strip("'")), kind))
+
+        target = f'{self.database}.{schema}.{table}'
+        source = f'{self.database}.{match_schema}.{match_table}'
+        source_keys = [f"DATE_TRUNC('DAY', {col})" if kind == 'trunc' else col for col, kind in keys]
+
+        # Bounds of each key in the (small) staging table, added as literal predicates on bare target columns so
+        # micro-partitions can be pruned. TRUNC(key) matches a day range and NVL(key) matches NULLs to NULLs.
+        aggregates = []
+        for i, col in enumerate(source_keys):
+            aggregates.append(f'MIN({col}) AS MIN_{i}, MAX({col}) AS MAX_{i}, COUNT(DISTINCT {col}) AS DISTINCT_{i}, '
+                              f'COUNT_IF({col} IS NULL) AS NULLS_{i}')
+        bounds = self.query(f"SELECT COUNT(*) AS ROW_COUNT, {', '.join(aggregates)} FROM {source};")
+        bounds = {k: v if v == v else None for k, v in bounds.to_dict(orient='records')[0].items()}
+        if not bounds['ROW_COUNT']:
+            return 0
+
+        predicates = []
+        for i, (col, kind) in enumerate(keys):
+            low, high, n_distinct, n_nulls = bounds[f'MIN_{i}'], bounds[f'MAX_{i}'], bounds[f'DISTINCT_{i}'], bounds[f'NULLS_{i}']
+            if low is None and kind != 'nvl':
+                return 0  # NULL keys never match.
+            if low is None:
+                predicates.append(f't.{col} IS NULL')
+                continue
+            if kind == 'trunc':
+                low = pd.Timestamp(low).normalize().to_pydatetime()
+                high = pd.Timestamp(high).normalize().to_pydatetime() + timedelta(days=1)
+                predicate = f't.{col} >= {sql_literal(low)} AND t.{col} < {sql_literal(high)}'
+            elif n_distinct <= in_list_threshold:
+                values = self.query(f'SELECT DISTINCT {col} AS VALUE FROM {source} WHERE {col} IS NOT NULL;')['VALUE']
+                predicate = f"t.{col} IN ({', '.join([sql_literal(x) for x in values])})"
+            else:
+                predicate = f't.{col} BETWEEN {sql_literal(low)} AND {sql_literal(high)}'
+            if kind == 'nvl' and n_nulls:
+                predicate = f'({predicate} OR t.{col} IS NULL)'
+            predicates.append(predicate)
+
+        joins = []
+        for i, (col, kind) in enumerate(keys):
+            if kind == 'trunc':
+                joins.append(f"t.{col} >= s.KEY_{i} AND t.{col} < DATEADD('DAY', 1, s.KEY_{i})")
+            elif kind == 'nvl':
+                joins.append(f'EQUAL_NULL(t.{col}, s.KEY_{i})')
+            else:
+                joins.append(f't.{col} = s.KEY_{i}')
+
+        select_keys = ', '.join([f'{col} AS KEY_{i}' for i, col in enumerate(source_keys)])
+        where_statement = '\n                      AND '.join(predicates)
+        join_statement = '\n                                        AND '.join(joins)
+        query = f'''DELETE FROM {target} t
+                    WHERE {where_statement}
+                      AND EXISTS (SELECT 1 FROM (SELECT DISTINCT {select_keys} FROM {source}) s
+                                  WHERE {join_statement});'''
+        self.log_sql(query)
+        self.execute(query)
+        return self.last_row_count
+
         # else:
         #     for key in match_keys:
         #         join_pattern = f'{key} IN (SELECT DISTINCT {key} FROM {match_schema}.{match_table})'
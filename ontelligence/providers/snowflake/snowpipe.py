@@ -0,0 +1,146 @@
+import time
+import dataclasses
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+try:
+    from snowflake.ingest import SimpleIngestManager, StagedFile
+except ImportError:
+    SimpleIngestManager = None
+    StagedFile = None
+from cryptography.hazmat.primitives.serialization import Encoding, PrivateFormat, NoEncryption
+
+from ontelligence.core.ledger import BaseIngestionLedger, LEDGER_FAILED, LEDGER_LOADED, LEDGER_SUBMITTED
+from ontelligence.core.schemas.aws import S3Object
+from ontelligence.core.schemas.ledger import LedgerEntry
+from ontelligence.core.schemas.snowflake import PipeFileStatus
+from ontelligence.providers.aws.s3 import S3
+from ontelligence.providers.snowflake.base import BaseSnowflakeProvider
+from ontelligence.utils.file import chunks
+from ontelligence.utils.log import LoggingMixin
+
+
+class SnowpipeClient(LoggingMixin):
+    """Loads staged files through the Snowpipe REST API, tracking submitted files in the ledger until they load"""
+
+    # Max number of files per insertFiles request.
+    max_files_per_request = 5000
+
+    # insertReport only keeps load events for 10 minutes.
+    insert_report_retention = timedelta(minutes=10)
+
+    def __init__(self, sf: BaseSnowflakeProvider, pipe: str, ledger: Optional[BaseIngestionLedger] = None, stage_prefix: str = ''):
+        if SimpleIngestManager is None:
+            raise ImportError('Python package snowflake-ingest is required for Snowpipe ingestion. '
+                              'Install it with "pip install ontelligence[snowpipe]".')
+        sf.get_conn()  # Resolves the account and user.
+        self.pipe = pipe if pipe.count('.') == 2 else f'{sf.database}.{sf.schema}.{pipe}'
+        self.ledger = ledger
+        self.stage_prefix = stage_prefix  # S3 prefix the pipe's stage points to, stripped from keys to get staged paths.
+        # The REST API client signs requests with an unencrypted PEM, which is only handed to the client.
+        private_key = sf.get_private_key().private_bytes(encoding=Encoding.PEM, format=PrivateFormat.PKCS8,
+                                                         encryption_algorithm=NoEncryption()).decode()
+        self.manager = SimpleIngestManager(account=sf.account, user=sf.user, pipe=self.pipe, private_key=private_key,
+                                           host=f'{sf.account}.snowflakecomputing.com')
+        self.submitted: Dict[str, LedgerEntry] = {}  # Not yet reconciled, keyed by path relative to the stage.
+
+    def get_staged_path(self, key: str) -> str:
+        if self.stage_prefix and key.startswith(self.stage_prefix):
+            key = key[len(self.stage_prefix):]
+        return key.lstrip('/')
+
+    def _is_submitted(self, obj: S3Object) -> bool:
+        previous = self.submitted.get(self.get_staged_path(obj.key))
+        return previous is not None and previous.etag == obj.etag
+
+    def submit(self, objects: List[S3Object]) -> List[S3Object]:
+        """Submits objects that were not submitted or loaded before, in batches of up to 5000 files"""
+        if self.ledger:
+            objects = self.ledger.get_new_objects(source=self.pipe, objects=objects)
+        objects = [x for x in objects if not self._is_submitted(x)]
+
+        for each_chunk in chunks(objects, chunk_size=self.max_files_per_request):
+            staged_files = [StagedFile(self.get_staged_path(x.key), x.size) for x in each_chunk]
+            response = self.manager.ingest_files(staged_files=staged_files, request_id=uuid4())
+            if response.get('responseCode') != 'SUCCESS':
+                raise Exception(f'Snowpipe rejected insertFiles request for {self.pipe}: {response}')
+            entries = [LedgerEntry(source=self.pipe, key=x.key, etag=x.etag, size=x.size, last_modified=x.last_modified,
+                                   loaded_at=datetime.utcnow(), state=LEDGER_SUBMITTED) for x in each_chunk]
+            if self.ledger:
+                self.ledger.record(entries)
+            self.submitted.update({self.get_staged_path(x.key): x for x in entries})
+            self.log.info(f'Submitted {len(each_chunk)} files to {self.pipe}')
+        return objects
+
+    @staticmethod
+    def _to_status(file: dict) -> PipeFileStatus:
+        return PipeFileStatus(
+            path=file['path'],
+            status=file.get('status'),
+            complete=file.get('complete', False),
+            rows_parsed=file.get('rowsParsed'),
+            rows_inserted=file.get('rowsInserted'),
+            errors_seen=file.get('errorsSeen'),
+            first_error=file.get('firstError')
+        )
+
+    def _scan_load_history(self, paths: List[str], statuses: Dict[str, PipeFileStatus]) -> None:
+        """Adds the loadHistoryScan status of files that are no longer in insertReport"""
+        submitted_at = min(self.submitted[x].loaded_at or datetime.utcnow() for x in paths) - timedelta(minutes=1)
+        response = self.manager.get_history_range(start_time_inclusive=submitted_at.replace(tzinfo=timezone.utc).isoformat())
+        for each_file in response.get('files', []):
+            if each_file['path'] in paths:
+                statuses[each_file['path']] = self._to_status(each_file)
+
+    def wait(self, timeout: int = 600, poll_interval: int = 10) -> Dict[str, PipeFileStatus]:
+        """Polls the load status of submitted files, including those of earlier runs, and reconciles them in the ledger"""
+        if self.ledger:
+            for each_entry in self.ledger.get_entries(source=self.pipe).values():
+                if each_entry.state == LEDGER_SUBMITTED:
+                    self.submitted.setdefault(self.get_staged_path(each_entry.key), each_entry)
+        if not self.submitted:
+            return {}
+
+        statuses: Dict[str, PipeFileStatus] = {}
+        expired_before = datetime.utcnow() - self.insert_report_retention
+        expired = [x for x, entry in self.submitted.items() if entry.loaded_at and entry.loaded_at < expired_before]
+        if expired:
+            self._scan_load_history(paths=expired, statuses=statuses)
+
+        started_at = time.monotonic()
+        while True:
+            for each_file in self.manager.get_history().get('files', []):
+                if each_file['path'] in self.submitted:
+                    statuses[each_file['path']] = self._to_status(each_file)
+            pending = [x for x in self.submitted if x not in statuses or not statuses[x].complete]
+            if not pending or time.monotonic() - started_at >= timeout:
+                break
+            time.sleep(poll_interval)
+
+        if pending:
+            self._scan_load_history(paths=pending, statuses=statuses)
+
+        self._record(statuses=statuses)
+        for path, status in statuses.items():
+            if status.complete and status.status != 'LOADED':
+                self.log.warning(f'{path} {status.status} through {self.pipe}: {status.first_error}')
+        return statuses
+
+    def _record(self, statuses: Dict[str, PipeFileStatus]) -> None:
+        """Reconciles completed files to LOADED or FAILED in the ledger and stops tracking them"""
+        completed = {x: status for x, status in statuses.items() if status.complete and x in self.submitted}
+        entries = [dataclasses.replace(self.submitted.pop(x), loaded_at=datetime.utcnow(),
+                                       state=LEDGER_LOADED if status.status == 'LOADED' else LEDGER_FAILED) for x, status in completed.items()]
+        if self.ledger and entries:
+            self.ledger.record(entries)
+
+    def ingest(self, s3: S3, bucket: Optional[str] = None, prefix: Optional[str] = None, wait: bool = True,
+               timeout: int = 600, poll_interval: int = 10) -> Dict[str, PipeFileStatus]:
+        """Lists objects under prefix, submits the new ones and (optionally) waits for them to load"""
+        prefix = prefix if prefix is not None else self.stage_prefix
+        objects = [x for x in s3.list_objects(bucket=bucket, prefix=prefix) if not x.key.endswith('/')]
+        self.submit(objects=objects)
+        if not wait:
+            return {}
+        return self.wait(timeout=timeout, poll_interval=poll_interval)
@@ -0,0 +1,89 @@
+import os
+import json
+import time
+import sqlite3
+from typing import Any, Callable, Optional
+
+from ontelligence.core.config import settings
+from ontelligence.utils.hash import get_hash_of_file
+
+
+class ProfileCache:
+    """Persistent SQLite cache of file profiles, keyed by the SHA-256 of local files or the ETag of S3 objects"""
+
+    def __init__(self, db_path: Optional[str] = None, max_entries: int = 10000):
+        self.db_path = db_path or os.path.join(settings.HOME_PATH, 'profiles.db')
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS profiles (
+                                content_key TEXT NOT NULL,
+                                field TEXT NOT NULL,
+                                value TEXT NOT NULL,
+                                PRIMARY KEY (content_key, field));''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS profile_usage (
+                                content_key TEXT PRIMARY KEY,
+                                last_used REAL NOT NULL);''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS file_hashes (
+                                path TEXT PRIMARY KEY,
+                                size INTEGER NOT NULL,
+                                mtime_ns INTEGER NOT NULL,
+                                content_key TEXT NOT NULL);''')
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    def get_file_key(self, file_path: str) -> str:
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        with self._connect() as conn:
+            row = conn.execute('SELECT content_key FROM file_hashes WHERE path = ? AND size = ? AND mtime_ns = ?;',
+                               (path, stat.st_size, stat.st_mtime_ns)).fetchone()
+        if row:
+            return row[0]
+        content_key = f'sha256:{get_hash_of_file(path)}'
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?);', (path, stat.st_size, stat.st_mtime_ns, content_key))
+        return content_key
+
+    @staticmethod
+    def get_etag_key(etag: str) -> str:
+        etag = etag.strip('"')
+        return f'etag:{etag}'
+
+    def get(self, content_key: str, field: str) -> Optional[Any]:
+        with self._connect() as conn:
+            row = conn.execute('SELECT value FROM profiles WHERE content_key = ? AND field = ?;', (content_key, field)).fetchone()
+            if row is None:
+                return None
+            conn.execute('INSERT OR REPLACE INTO profile_usage VALUES (?, ?);', (content_key, time.time()))
+        return json.loads(row[0])
+
+    def put(self, content_key: str, field: str, value: Any) -> None:
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO profiles VALUES (?, ?, ?);', (content_key, field, json.dumps(value)))
+            conn.execute('INSERT OR REPLACE INTO profile_usage VALUES (?, ?);', (content_key, time.time()))
+        self.evict()
+
+    def get_or_compute(self, content_key: str, field: str, compute: Callable[[], Any]) -> Any:
+        value = self.get(content_key=content_key, field=field)
+        if value is None:
+            value = compute()
+            self.put(content_key=content_key, field=field, value=value)
+        return value
+
+    def evict(self) -> None:
+        """Removes the profiles of the least recently used files until at most `max_entries` remain"""
+        with self._connect() as conn:
+            count = conn.execute('SELECT COUNT(*) FROM profile_usage;').fetchone()[0]
+            if count <= self.max_entries:
+                return
+            stale = conn.execute('SELECT content_key FROM profile_usage ORDER BY last_used LIMIT ?;', (count - self.max_entries,)).fetchall()
+            conn.executemany('DELETE FROM profiles WHERE content_key = ?;', stale)
+            conn.executemany('DELETE FROM profile_usage WHERE content_key = ?;', stale)
+            conn.executemany('DELETE FROM file_hashes WHERE content_key = ?;', stale)
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            for table in ['profiles', 'profile_usage', 'file_hashes']:
+                conn.execute(f'DELETE FROM {table};')
@@ -1,10 +1,20 @@
+import io
 import gzip
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 from pandas.api.types import infer_dtype as pd_infer_dtype
 from botocore.response import StreamingBody
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
 
 from ontelligence.core.schemas.data import Column
+from ontelligence.utils.cache import ProfileCache
 from ontelligence.utils.file import File
 
 
@@ -43,11 +53,19 @@ class Float(BaseDataType):
         return 'FLOAT'
 
 
+class Number(BaseDataType):
+    def __init__(self, precision=38, scale=0):
+        self.precision = precision
+        self.scale = scale
+
+    def __repr__(self):
+        return f'NUMBER({self.precision},{self.scale})'
+
+
 class DateTime(BaseDataType):
-    # TODO: Add time_zone.
-    def __init__(self, timestamp=False):
+    def __init__(self, timestamp=False, time_zone=False):
         self.timestamp = timestamp
-        # self.time_zone = None
+        self.time_zone = time_zone
 
     def __repr__(self):
         # return 'DateTime()'
@@ -82,7 +100,7 @@ def infer_dtype(values: pd.Series, round_up: bool = False):
         _df = pd.to_datetime(values.values, errors='coerce')
 
         if _df.isnull().any() or _df.dtype in ['object'] or values.str.match(r'^[0-9]+:[0-9]+:?[0-9]*\.?[0-9]*').any():
-            max_length = len(max([str(x) for x in values], key=len))
+            max_length = int(values.astype(str).str.len().max())
             return String(size=get_string_size(max_length, round_up=round_up))  # 'VARCHAR({})'.format(get_string_size(max_length))
         else:
             dtype = 'date' if _df.normalize().equals(_df) else 'datetime'
@@ -114,40 +132,470 @@ def infer_dtype(values: pd.Series, round_up: bool = False):
     raise UnknownDtypeException(f'Unmapped data type: {dtype}')
 
 
-def infer_data_schema(file_path, delimiter=',', override_dtypes=None, columns=None, compression=None):
+# Max precision of Snowflake's NUMBER type.
+MAX_NUMBER_PRECISION = 38
+
+# Candidate formats, tried on a small probe before a whole column is parsed with an explicit format.
+DATETIME_FORMATS = [
+    '%Y-%m-%d',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%d %H:%M',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%SZ',
+    '%Y-%m-%dT%H:%M:%S.%fZ',
+    '%Y-%m-%d %H:%M:%S%z',
+    '%Y-%m-%d %H:%M:%S.%f%z',
+    '%Y-%m-%dT%H:%M:%S%z',
+    '%Y-%m-%dT%H:%M:%S.%f%z',
+    '%Y/%m/%d',
+    '%Y/%m/%d %H:%M:%S',
+    '%m/%d/%Y',
+    '%m/%d/%Y %H:%M:%S',
+    '%m/%d/%Y %H:%M',
+    '%m/%d/%Y %I:%M:%S %p',
+    '%d-%b-%Y',
+    '%d-%b-%Y %H:%M:%S',
+]
+
+# Values longer than this are never treated as numbers.
+_MAX_NUMERIC_LENGTH = 100
+_SCIENTIFIC_PATTERN = r'[+-]?(?:\d+\.?\d*|\.\d+)[eE][+-]?\d+'
+_BOOLEAN_VALUES = ['true', 'false', 'True', 'False', 'TRUE', 'FALSE']
+
+
+def get_numeric_stats(values: pd.Series):
+    """Returns the non-numeric count, max integer digits, max scale and exponent usage of non-null string values"""
+    # Leading zeros (e.g. zip codes) are not numeric
+    if values.empty:
+        return 0, 0, 0, False
+    lengths = values.str.len().to_numpy()
+    candidates = values[lengths <= _MAX_NUMERIC_LENGTH].to_numpy(dtype=str)
+    width = candidates.dtype.itemsize // 4
+    if not len(candidates) or not width:
+        return len(values), 0, 0, False
+    chars = candidates.view(np.uint32).reshape(len(candidates), width)
+
+    is_digit = (chars >= 48) & (chars <= 57)
+    is_dot = chars == 46
+    is_pad = chars == 0
+    signed = (chars[:, 0] == 43) | (chars[:, 0] == 45)
+    valid = is_digit | is_dot | is_pad
+    valid[:, 0] |= signed
+    n_dots = is_dot.sum(axis=1)
+
+    rows = np.arange(len(chars))
+    start = signed.astype(np.int64)
+    first = chars[rows, np.minimum(start, width - 1)]
+    second = chars[rows, np.minimum(start + 1, width - 1)]
+    leading_zero = (first == 48) & (start + 1 < width) & (second >= 48) & (second <= 57)
+    is_decimal = valid.all(axis=1) & (n_dots <= 1) & is_digit.any(axis=1) & ~leading_zero
+
+    is_exponent = (chars == 101) | (chars == 69)
+    maybe_scientific = ~is_decimal & is_exponent.any(axis=1) & (valid | is_exponent | (chars == 43) | (chars == 45)).all(axis=1)
+    n_scientific = int(pd.Series(candidates[maybe_scientific]).str.fullmatch(_SCIENTIFIC_PATTERN).sum()) if maybe_scientific.any() else 0
+
+    n_decimal = int(is_decimal.sum())
+    if not n_decimal:
+        return len(values) - n_scientific, 0, 0, bool(n_scientific)
+    length = width - is_pad.sum(axis=1)
+    dot_position = np.where(n_dots > 0, is_dot.argmax(axis=1), length)
+    int_digits = dot_position - start - (first == 48)  # A single leading zero (e.g. 0.5) is not significant.
+    scale = np.where(n_dots > 0, length - dot_position - 1, 0)
+    return (len(values) - n_decimal - n_scientific, int(int_digits[is_decimal].max()), int(scale[is_decimal].max()),
+            bool(n_scientific))
+
+
+def get_number_type(int_digits: int, scale: int, scientific: bool = False, max_length: int = 0) -> BaseDataType:
+    if scale == 0 and not scientific and int_digits > MAX_NUMBER_PRECISION:
+        return String(size=max_length)
+    if scientific or int_digits + scale > MAX_NUMBER_PRECISION:
+        return Float()
+    return Number(precision=max(int_digits + scale, 1), scale=scale)
+
+
+def parse_datetime(values: pd.Series, fmt: str) -> pd.Series:
+    parsed = pd.to_datetime(values, format=fmt, errors='coerce')
+    if not pd.api.types.is_datetime64_any_dtype(parsed):
+        parsed = pd.to_datetime(values, format=fmt, errors='coerce', utc=True)  # Mixed UTC offsets.
+    return parsed
+
+
+def find_datetime_format(values: pd.Series, probe_size: int = 100) -> Tuple[Optional[str], Optional[pd.Series]]:
+    """Finds a format that parses a small probe of values, then parses every value with that explicit format"""
+    probe = values.iloc[:probe_size]
+    for fmt in DATETIME_FORMATS:
+        if not pd.to_datetime(probe, format=fmt, errors='coerce', utc=True).notna().all():
+            continue
+        parsed = parse_datetime(values, fmt)
+        if parsed.notna().all():
+            return fmt, parsed
+    return None, None
+
+
+def includes_time(parsed: pd.Series) -> bool:
+    return parsed.dt.tz is not None or not (parsed == parsed.dt.normalize()).all()
+
+
+def detect_datetime(values: pd.Series, probe_size: int = 100) -> Optional[DateTime]:
+    fmt, parsed = find_datetime_format(values, probe_size=probe_size)
+    if fmt is None:
+        return None
+    return DateTime(timestamp=includes_time(parsed), time_zone=parsed.dt.tz is not None)
+
+
+def detect_dtype(values: pd.Series, probe_size: int = 100) -> BaseDataType:
+    """Classifies raw string values with vectorized kernels, computing NUMBER precision/scale and VARCHAR size"""
+    values = values.dropna().astype(str)
+    values = values[values != '']
+    if values.empty:
+        return String()  # Empty
+    max_length = int(values.str.len().max())
+
+    if values.isin(_BOOLEAN_VALUES).all():
+        return Boolean()
+
+    non_numeric, int_digits, scale, scientific = get_numeric_stats(values)
+    if not non_numeric:
+        return get_number_type(int_digits=int_digits, scale=scale, scientific=scientific, max_length=max_length)
+
+    dtype = detect_datetime(values, probe_size=probe_size)
+    if dtype:
+        return dtype
+    return String(size=max_length)
+
+
+def get_snowflake_type(dtype: BaseDataType) -> str:
+    """Renders a data type as a precise Snowflake type for DDL"""
+    if isinstance(dtype, String):
+        return f'VARCHAR({dtype.size})' if dtype.size else 'VARCHAR'
+    if isinstance(dtype, DateTime):
+        if dtype.timestamp:
+            return 'TIMESTAMP_TZ' if dtype.time_zone else 'TIMESTAMP_NTZ'
+        return 'DATE'
+    if isinstance(dtype, Integer):
+        return 'NUMBER(38,0)'
+    return repr(dtype)
+
+
+def get_arrow_type(dtype: str):
+    """Maps a data type rendered by infer_data_schema (e.g. INTEGER, NUMBER(10,2), TIMESTAMP_TZ) to a pyarrow type"""
+    if pa is None:
+        raise ImportError('Python package pyarrow is required for Arrow types. Install it with "pip install ontelligence[parquet]".')
+    dtype = dtype.upper().replace(' ', '')
+    if dtype.startswith('NUMBER('):
+        precision, scale = [int(x) for x in dtype[len('NUMBER('):-1].split(',')]
+        if scale == 0 and precision <= 18:
+            return pa.int64()
+        return pa.decimal128(precision, scale)
+    if dtype in ['INTEGER', 'INT', 'BIGINT']:
+        return pa.int64()
+    if dtype in ['FLOAT', 'DOUBLE', 'REAL']:
+        return pa.float64()
+    if dtype == 'BOOLEAN':
+        return pa.bool_()
+    if dtype == 'DATE':
+        return pa.date32()
+    if dtype in ['DATETIME', 'TIMESTAMP', 'TIMESTAMP_NTZ']:
+        return pa.timestamp('us')
+    if dtype in ['TIMESTAMP_TZ', 'TIMESTAMP_LTZ']:
+        return pa.timestamp('us', tz='UTC')
+    return pa.string()
+
+
+def merge_dtypes(a: Optional[BaseDataType], b: Optional[BaseDataType]) -> Optional[BaseDataType]:
+    """Returns the narrowest data type that can hold values of both a and b"""
+    if a is None or b is None:
+        return a or b
+    if type(a) == type(b):
+        if isinstance(a, DateTime):
+            return DateTime(timestamp=a.timestamp or b.timestamp, time_zone=a.time_zone or b.time_zone)
+        if isinstance(a, Number):
+            int_digits, scale = max(a.precision - a.scale, b.precision - b.scale), max(a.scale, b.scale)
+            return get_number_type(int_digits=int_digits, scale=scale)
+        if isinstance(a, String):
+            return String(size=max(a.size or 0, b.size or 0) or None)
+        return a
+    if {type(a), type(b)} in [{Integer, Float}, {Number, Float}]:
+        return Float()
+    return String(size=max(getattr(a, 'size', None) or 0, getattr(b, 'size', None) or 0) or None)
+
+
+class ColumnProfile:
+    """Incremental statistics of a column, updated one chunk at a time and mergeable across chunks and processes"""
+    # With sample_size the type comes from a reservoir sample; nulls, lengths and numeric ranges still see every value
+
+    def __init__(self, name: str, sample_size: Optional[int] = None, precise: bool = False, seed: int = 0):
+        self.name = name
+        self.precise = precise
+        self.count = 0
+        self.null_count = 0
+        self.max_length = 0
+        self.dtype = None
+        self.sample_size = sample_size
+        self.sample = []
+        self.non_numeric_count = 0
+        self.has_fraction = False
+        self.min_value = None
+        self.max_value = None
+        self.non_boolean_count = 0
+        self.max_int_digits = 0
+        self.max_scale = 0
+        self.scientific = False
+        self.datetime_formats = []
+        self.non_datetime_count = 0
+        self.has_time = False
+        self.has_time_zone = False
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values: pd.Series) -> 'ColumnProfile':
+        count = len(values)
+        values = values.dropna()
+        if not values.empty:
+            self.max_length = max(self.max_length, int(values.astype(str).str.len().max()))
+            if self.sample_size:
+                self._update_aggregates(values)
+                self._update_sample(values)
+            else:
+                self.dtype = merge_dtypes(self.dtype, self._infer(values.drop_duplicates()))
+        self.count += count
+        self.null_count += count - len(values)
+        return self
+
+    def _infer(self, values: pd.Series) -> BaseDataType:
+        return detect_dtype(values) if self.precise else infer_dtype(values)
+
+    def _update_aggregates(self, values: pd.Series) -> None:
+        if self.precise:
+            values = values.astype(str).drop_duplicates()  # Counts below are of distinct values.
+            non_numeric, int_digits, scale, scientific = get_numeric_stats(values)
+            self.non_numeric_count += non_numeric
+            self.non_boolean_count += int((~values.isin(_BOOLEAN_VALUES)).sum())
+            self.max_int_digits = max(self.max_int_digits, int_digits)
+            self.max_scale = max(self.max_scale, scale)
+            self.scientific = self.scientific or scientific
+            self._update_datetime_aggregates(values)
+            return
+        if not pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            # The parser only leaves a chunk as objects if some of its values are not numeric.
+            self.non_numeric_count += len(values) if values.dtype == object else 0
+            if values.dtype == object:
+                self._update_datetime_aggregates(values.astype(str).drop_duplicates())
+            return
+        numeric = values
+        if not numeric.empty:
+            self.has_fraction = self.has_fraction or bool((numeric % 1 != 0).any())
+            self.min_value = min(numeric.min(), self.min_value) if self.min_value is not None else numeric.min()
+            self.max_value = max(numeric.max(), self.max_value) if self.max_value is not None else numeric.max()
+
+    def _update_datetime_aggregates(self, values: pd.Series) -> None:
+        """Counts distinct values that none of the datetime formats detected so far (or a new one) can parse"""
+        if self.non_datetime_count:
+            return  # Already known not to be a datetime column.
+        values = values[values != '']
+        for fmt in self.datetime_formats:
+            parsed = parse_datetime(values, fmt)
+            self._update_time_flags(parsed.dropna())
+            values = values[parsed.isna()]
+        if values.empty:
+            return
+        fmt, parsed = find_datetime_format(values)
+        if fmt is None:
+            self.non_datetime_count += len(values)
+            return
+        self.datetime_formats.append(fmt)
+        self._update_time_flags(parsed)
+
+    def _update_time_flags(self, parsed: pd.Series) -> None:
+        if not parsed.empty:
+            self.has_time = self.has_time or includes_time(parsed)
+            self.has_time_zone = self.has_time_zone or parsed.dt.tz is not None
+
+    def _update_sample(self, values: pd.Series) -> None:
+        """Reservoir sampling (algorithm R) over the non-null values seen so far"""
+        seen_before = self.count - self.null_count  # Non-null values seen in previous chunks.
+        values = values.tolist()
+        free = max(self.sample_size - len(self.sample), 0)
+        self.sample.extend(values[:free])
+        positions = np.arange(seen_before + free, seen_before + len(values)) + 1
+        if not len(positions):
+            return
+        accepted = np.flatnonzero(self._rng.random(len(positions)) < self.sample_size / positions)
+        for i, slot in zip(accepted, self._rng.integers(0, self.sample_size, len(accepted))):
+            self.sample[slot] = values[free + i]
+
+    def merge(self, other: 'ColumnProfile') -> 'ColumnProfile':
+        if self.sample_size:
+            self.sample = self._merge_samples(other)
+            self.non_numeric_count += other.non_numeric_count
+            self.has_fraction = self.has_fraction or other.has_fraction
+            self.min_value = min([x for x in [self.min_value, other.min_value] if x is not None], default=None)
+            self.max_value = max([x for x in [self.max_value, other.max_value] if x is not None], default=None)
+            self.non_boolean_count += other.non_boolean_count
+            self.max_int_digits = max(self.max_int_digits, other.max_int_digits)
+            self.max_scale = max(self.max_scale, other.max_scale)
+            self.scientific = self.scientific or other.scientific
+            self.datetime_formats += [x for x in other.datetime_formats if x not in self.datetime_formats]
+            self.non_datetime_count += other.non_datetime_count
+            self.has_time = self.has_time or other.has_time
+            self.has_time_zone = self.has_time_zone or other.has_time_zone
+        self.count += other.count
+        self.null_count += other.null_count
+        self.max_length = max(self.max_length, other.max_length)
+        self.dtype = merge_dtypes(self.dtype, other.dtype)
+        return self
+
+    def _merge_samples(self, other: 'ColumnProfile') -> list:
+        """Combines two reservoirs into a uniform sample of the union, weighting each by the values it represents"""
+        seen, other_seen = self.count - self.null_count, other.count - other.null_count
+        size = min(self.sample_size, len(self.sample) + len(other.sample))
+        if not size:
+            return []
+        n = self._rng.hypergeometric(seen, other_seen, size) if seen and other_seen else (size if seen else 0)
+        n = min(max(n, size - len(other.sample)), len(self.sample))
+        pick = self._rng.choice(len(self.sample), n, replace=False)
+        other_pick = self._rng.choice(len(other.sample), size - n, replace=False)
+        return [self.sample[i] for i in pick] + [other.sample[i] for i in other_pick]
+
+    def get_dtype(self, round_up: bool = False) -> BaseDataType:
+        dtype = self.dtype
+        if self.sample_size:
+            dtype = self._infer(pd.Series(self.sample).drop_duplicates()) if self.sample else None
+            if isinstance(dtype, DateTime):
+                dtype = String() if self.non_datetime_count else DateTime(
+                    timestamp=dtype.timestamp or self.has_time, time_zone=dtype.time_zone or self.has_time_zone)
+            elif self.precise:
+                dtype = self._widen_precise_sample_dtype(dtype)
+            elif isinstance(dtype, (Integer, Float, Boolean)) and self.non_numeric_count:
+                dtype = String()
+            elif isinstance(dtype, Integer) and self.has_fraction:
+                dtype = Float()
+            elif isinstance(dtype, Integer) and max(abs(self.min_value), abs(self.max_value)) > 9223372036854775807:
+                dtype = String()
+        if dtype is None:
+            return String()  # Empty
+        if isinstance(dtype, String):
+            return String(size=get_string_size(self.max_length, round_up=round_up))
+        return dtype
+
+    def _widen_precise_sample_dtype(self, dtype: Optional[BaseDataType]) -> Optional[BaseDataType]:
+        if isinstance(dtype, Boolean) and self.non_boolean_count:
+            return String()
+        if isinstance(dtype, (Number, Float)) and self.non_numeric_count:
+            return String()
+        if isinstance(dtype, Number):
+            return get_number_type(int_digits=self.max_int_digits, scale=self.max_scale, scientific=self.scientific)
+        return dtype
+
+
+def profile_chunk(chunk: pd.DataFrame, sample_size: Optional[int] = None, precise: bool = False) -> Dict[str, ColumnProfile]:
+    return {column: ColumnProfile(name=column, sample_size=sample_size, precise=precise).update(chunk[column])
+            for column in chunk.columns}
+
+
+def merge_profiles(profiles: Dict[str, ColumnProfile], other: Dict[str, ColumnProfile]) -> Dict[str, ColumnProfile]:
+    for column, profile in other.items():
+        if column in profiles:
+            profiles[column].merge(profile)
+        else:
+            profiles[column] = profile
+    return profiles
+
+
+def _to_strings(df: pd.DataFrame) -> pd.DataFrame:
+    """Renders values as strings, without the '.0' that nulls leave on integer columns cast to float"""
+    def _column(values: pd.Series) -> pd.Series:
+        non_null = values.dropna()
+        if pd.api.types.is_float_dtype(values) and (non_null % 1 == 0).all() and (non_null.abs() < 2 ** 53).all():
+            values = values.astype('Int64')
+        return values.astype(str).where(values.notna())
+    return df.apply(_column)
+
+
+def infer_data_schema(file_path, delimiter=',', override_dtypes=None, columns=None, compression=None,
+                      chunk_size: int = 100000, processes: int = 1, sample_size: Optional[int] = None,
+                      precise_types: bool = False, cache: Optional[ProfileCache] = None):
+    """Infers the data type of each column in a single pass over the file, profiling chunks in `processes` workers"""
     override_dtypes = override_dtypes if override_dtypes else dict()
+    _override_dtypes = {k.lower(): v for k, v in override_dtypes.items()}
     dtypes = []
 
     if isinstance(file_path, (StreamingBody, gzip.GzipFile)):
         # compression flag ommited below because pandas.read_csv only uses compression for on-disk data as per docs
-        file_path = pd.read_csv(filepath_or_buffer=file_path, delimiter=delimiter)
+        file_path = pd.read_csv(filepath_or_buffer=file_path, delimiter=delimiter, dtype=str if precise_types else None)
 
     if isinstance(file_path, pd.DataFrame):
         columns = list(file_path.columns)
+        # Precise types are detected from the values as strings, as when reading a file.
+        profiles = profile_chunk(_to_strings(file_path), precise=True) if precise_types else {}
         for column in columns:
-            if override_dtypes and column.lower() in [x.lower() for x in list(override_dtypes.keys())]:
-                dtypes.extend([override_dtypes[column]])
+            if column.lower() in _override_dtypes:
+                dtypes.extend([_override_dtypes[column.lower()]])
+            elif precise_types:
+                dtypes.extend([get_snowflake_type(profiles[column].get_dtype())])
             else:
                 dtypes.extend([infer_dtype(file_path[column])])
         return [Column(name=x, dtype=str(y)) for x, y in zip(columns, dtypes)]
 
     # columns = columns if columns else File(file_path).get_headers(delimiter=delimiter, compression=compression)
     if not columns:
-        _file = File(file_path)
+        _file = File(file_path, profile_cache=cache)
         columns = _file.get_headers(delimiter=delimiter, compression=compression)
 
-    for column in columns:
-        if override_dtypes and column.lower() in [x.lower() for x in list(override_dtypes.keys())]:
-            dtypes.extend([override_dtypes[column]])
+    usecols = [x for x in columns if x.lower() not in _override_dtypes]
+    cached_dtypes, content_key = {}, None
+    cache_field = f'dtypes:{delimiter}:{precise_types}:{sample_size}'
+    if cache and isinstance(file_path, str):
+        content_key = cache.get_file_key(file_path)
+        cached_dtypes = cache.get(content_key=content_key, field=cache_field) or {}
+        if all(x in cached_dtypes for x in usecols):
+            usecols = []
+
+    profiles = {}
+    if usecols:
+        read_options = {'dtype': str} if precise_types else {'infer_datetime_format': True}
+        reader = pd.read_csv(file_path, sep=delimiter, chunksize=chunk_size, usecols=usecols,
+                             low_memory=False, compression=compression, **read_options)
+        if processes > 1:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                futures = deque()
+                for chunk in reader:
+                    futures.append(executor.submit(profile_chunk, chunk, sample_size, precise_types))
+                    if len(futures) >= 2 * processes:  # Bounds the number of chunks held in memory.
+                        merge_profiles(profiles, futures.popleft().result())
+                while futures:
+                    merge_profiles(profiles, futures.popleft().result())
         else:
-            values = pd.DataFrame()
-            reader = pd.read_csv(file_path, sep=delimiter, chunksize=10000, usecols=[column],
-                                 infer_datetime_format=True, low_memory=False, compression=compression)
-
             for chunk in reader:
-                chunk.dropna(axis=0, inplace=True)
-                values = pd.concat([values, chunk], ignore_index=True)
-                values.drop_duplicates(inplace=True)
-            dtypes.extend([infer_dtype(values[column])])
+                merge_profiles(profiles, profile_chunk(chunk, sample_size=sample_size, precise=precise_types))
+
+    for column in columns:
+        if column.lower() in _override_dtypes:
+            dtypes.extend([_override_dtypes[column.lower()]])
+        elif column in profiles:
+            dtype = profiles[column].get_dtype()
+            dtypes.extend([get_snowflake_type(dtype) if precise_types else dtype])
+        else:
+            dtypes.extend([cached_dtypes.get(column, get_snowflake_type(String()) if precise_types else String())])
     # return columns, dtypes
+    if content_key and profiles:
+        cached_dtypes.update({x: str(y) for x, y in zip(columns, dtypes) if x in profiles})
+        cache.put(content_key=content_key, field=cache_field, value=cached_dtypes)
     return [Column(name=x, dtype=str(y)) for x, y in zip(columns, dtypes)]
+
+
+def infer_data_schema_from_sample(sample: str, delimiter=',', override_dtypes=None, precise_types: bool = False):
+    """Infers a schema from a text sample whose first line is the header (e.g. byte ranges sampled from S3)"""
+    override_dtypes = override_dtypes if override_dtypes else dict()
+    _override_dtypes = {k.lower(): v for k, v in override_dtypes.items()}
+    data = pd.read_csv(io.StringIO(sample), sep=delimiter, low_memory=False, dtype=str if precise_types else None)
+
+    dtypes = []
+    for column in data.columns:
+        if column.lower() in _override_dtypes:
+            dtypes.extend([_override_dtypes[column.lower()]])
+        else:
+            values = data[column].dropna().drop_duplicates()
+            dtypes.extend([get_snowflake_type(detect_dtype(values)) if precise_types else infer_dtype(values)])
+    return [Column(name=x, dtype=str(y)) for x, y in zip(data.columns, dtypes)]
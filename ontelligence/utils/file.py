@@ -6,8 +6,11 @@ List of hex signatures:
 # Reference: https://en.wikipedia.org/wiki/List_of_file_signatures
 
 """
+import io
 import os
 import re
+import zlib
+import hashlib
 
 import csv
 import gzip
@@ -15,14 +18,31 @@ import shutil
 import tarfile
 import binascii
 import filecmp
+from bisect import bisect_left, bisect_right
+from collections import deque
 from _io import TextIOWrapper
-from typing import Generator, TypeVar, List, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Generator, TypeVar, List, Optional, Set, Tuple, Union
+from urllib.parse import quote
 
 import pandas as pd
 from cchardet import UniversalDetector
 from botocore.response import StreamingBody
-
-from ontelligence.utils.date import today, resolve_date_input
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pc = None
+    pa_csv = None
+    pq = None
+
+from ontelligence.core.schemas.data import FileEntry
+from ontelligence.utils.cache import ProfileCache
+from ontelligence.utils.date import DATE_FORMAT, today, resolve_date_input
 
 
 COMPRESSION_TYPES = ['.zip', '.7z', '.gz', 'tar.gz', '.bz2']
@@ -72,6 +92,339 @@ HEX_SIGNATURES = {
 # TODO: How do you apply multiple complex transformations simultaneously?
 
 
+GZIP_SIGNATURE = bytes.fromhex(HEX_SIGNATURES['.gz'])
+ROW_COUNT_BLOCK_SIZE = 1024 ** 2 * 16  # 16MB
+
+
+def _count_newlines(block: bytes, in_quotes: bool, quotechar: bytes) -> Tuple[int, bool]:
+    """Counts newlines outside quoted fields; splitting on the quote char alternates between outside and inside"""
+    parts = block.split(quotechar)
+    count = sum(x.count(b'\n') for x in parts[1 if in_quotes else 0::2])
+    return count, in_quotes != ((len(parts) - 1) % 2 == 1)
+
+
+def count_newlines_in_range(file_path: str, start: int, end: int, quotechar: Optional[str] = None) -> Tuple[int, int, bool]:
+    """Counts newlines in bytes [start, end) of a file for both starting quote states, and whether its quote count is odd"""
+    counts, odd_quotes = [0, 0], False
+    _quotechar = quotechar.encode() if quotechar else None
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            block = f.read(min(ROW_COUNT_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            if not _quotechar:
+                counts[0] += block.count(b'\n')
+                continue
+            for state in [0, 1]:
+                count, _ = _count_newlines(block, in_quotes=(state == 1) != odd_quotes, quotechar=_quotechar)
+                counts[state] += count
+            odd_quotes = odd_quotes != (block.count(_quotechar) % 2 == 1)
+    return counts[0], counts[1] if _quotechar else counts[0], odd_quotes
+
+
+def iter_blocks(file_obj, block_size: int = ROW_COUNT_BLOCK_SIZE) -> Generator[bytes, None, None]:
+    """Yields blocks of at most block_size bytes of a binary stream, decompressing (multi-member) gzip streams on the fly"""
+    decompressor, is_first = None, True
+    for data in iter(lambda: file_obj.read(block_size), b''):
+        if is_first and data[:3] == GZIP_SIGNATURE:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        is_first = False
+        if not decompressor:
+            yield data
+            continue
+        while data:
+            yield decompressor.decompress(data, block_size)
+            # At the end of a member, its unconsumed tail is the start of the next one.
+            if decompressor.eof:
+                data = decompressor.unused_data  # Next gzip member.
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            elif decompressor.unconsumed_tail:
+                data = decompressor.unconsumed_tail
+            else:
+                break
+    if decompressor:
+        yield decompressor.flush()
+
+
+def compress_blocks(f_in, f_out, level: int = 6, block_size: int = ROW_COUNT_BLOCK_SIZE, threads: Optional[int] = None) -> None:
+    """Gzips f_in into f_out as one gzip member per block, compressing blocks concurrently and writing them in order"""
+    threads = threads or os.cpu_count() or 1
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for block in iter(lambda: f_in.read(block_size), b''):
+            pending.append(executor.submit(gzip.compress, block, level))
+            if len(pending) > threads * 2:
+                f_out.write(pending.popleft().result())
+        if not pending and not f_out.tell():
+            pending.append(executor.submit(gzip.compress, b'', level))
+        while pending:
+            f_out.write(pending.popleft().result())
+
+
+def count_rows(file_obj, quotechar: Optional[str] = None, block_size: int = ROW_COUNT_BLOCK_SIZE) -> int:
+    """Counts lines in a binary stream with block reads, skipping newlines inside quoted fields if `quotechar` is given"""
+    _quotechar = quotechar.encode() if quotechar else None
+    count, in_quotes, last_byte = 0, False, b''
+    for block in iter_blocks(file_obj, block_size=block_size):
+        if not block:
+            continue
+        if _quotechar:
+            n, in_quotes = _count_newlines(block, in_quotes=in_quotes, quotechar=_quotechar)
+            count += n
+        else:
+            count += block.count(b'\n')
+        last_byte = block[-1:]
+    return count + (1 if last_byte and last_byte != b'\n' else 0)
+
+
+def _find_row_end(block: bytes, start: int, in_quotes: bool, quotechar: Optional[bytes]) -> Tuple[int, bool]:
+    """Returns the index past the first newline at or after start outside a quoted field (-1 if none) and the end quote state"""
+    while True:
+        i = block.find(b'\n', start)
+        if i == -1:
+            return -1, (in_quotes != (block.count(quotechar, start) % 2 == 1)) if quotechar else False
+        if quotechar:
+            in_quotes = in_quotes != (block.count(quotechar, start, i) % 2 == 1)
+        if not in_quotes:
+            return i + 1, False
+        start = i + 1
+
+
+class _RowSplitter:
+    """Finds row-aligned part boundaries in a stream of blocks, after every `part_size` bytes or `rows_per_part` rows"""
+
+    def __init__(self, quotechar: Optional[str] = None, part_size: Optional[int] = None, rows_per_part: Optional[int] = None, offset: int = 0):
+        self.quotechar = quotechar.encode() if quotechar else None
+        self.part_size = part_size
+        self.rows_per_part = rows_per_part
+        self.offset = offset  # Stream offset of the next block.
+        self.part_start = offset
+        self.part_rows = 0
+        self.in_quotes = False
+
+    def feed(self, block: bytes) -> List[int]:
+        """Returns the stream offsets (exclusive) at which parts end within block"""
+        cuts, pos = [], 0
+        while pos < len(block):
+            if self.part_size:
+                start = max(pos, self.part_start + self.part_size - 1 - self.offset)
+                if start >= len(block):
+                    break
+                if start > pos and self.quotechar:
+                    self.in_quotes = self.in_quotes != (block.count(self.quotechar, pos, start) % 2 == 1)
+                end, self.in_quotes = _find_row_end(block, start, self.in_quotes, self.quotechar)
+            else:
+                end, start = -1, pos
+                for _ in range(self.rows_per_part - self.part_rows):
+                    end, self.in_quotes = _find_row_end(block, start, self.in_quotes, self.quotechar)
+                    if end == -1:
+                        break
+                    self.part_rows += 1
+                    start = end
+            if end == -1:
+                pos = len(block)
+                break
+            cuts.append(self.offset + end)
+            self.part_start, self.part_rows, pos = self.offset + end, 0, end
+        if pos < len(block) and self.quotechar:
+            self.in_quotes = self.in_quotes != (block.count(self.quotechar, pos) % 2 == 1)
+        self.offset += len(block)
+        return cuts
+
+
+class _RangeReader(io.RawIOBase):
+    """Reads header plus bytes [start, end) of a file, optionally gzip-compressing them on the fly"""
+
+    block_size = 1024 ** 2 * 8
+
+    def __init__(self, file_path: str, start: int, end: int, header: bytes = b'', compression: Optional[str] = None):
+        self.file = open(file_path, 'rb')
+        self.file.seek(start)
+        self.remaining = end - start
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compression == 'GZIP' else None
+        # The header gets its own gzip member, so combining parts can drop it without recompressing.
+        self.buffer = gzip.compress(header, compresslevel=6) if self.compressor and header else header
+
+    def readable(self):
+        return True
+
+    def readinto(self, b) -> int:
+        while not self.buffer and self.file:
+            data = self.file.read(min(self.block_size, self.remaining)) if self.remaining > 0 else b''
+            self.remaining -= len(data)
+            if not data:
+                self.buffer = self.compressor.flush() if self.compressor else b''
+                self.file.close()
+                self.file = None
+            else:
+                self.buffer = self.compressor.compress(data) if self.compressor else data
+        n = min(len(b), len(self.buffer))
+        b[:n] = self.buffer[:n]
+        self.buffer = self.buffer[n:]
+        return n
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+        super().close()
+
+
+def _write_part(file_path: str, start: int, end: int, header: bytes, output_path: str, compression: Optional[str] = None) -> str:
+    with _RangeReader(file_path, start, end, header=header, compression=compression) as f_in, open(output_path, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out, length=_RangeReader.block_size)
+    return output_path
+
+
+def _find_boundary(file_path: str, offset: int, in_quotes: bool, quotechar: Optional[str] = None) -> int:
+    """Returns the end of the row that contains offset, given the quote state at offset"""
+    _quotechar = quotechar.encode() if quotechar else None
+    with open(file_path, 'rb') as f:
+        f.seek(offset)
+        while True:
+            block = f.read(1024 ** 2)
+            if not block:
+                return offset
+            end, in_quotes = _find_row_end(block, 0, in_quotes, _quotechar)
+            if end != -1:
+                return offset + end
+            offset += len(block)
+
+
+def _is_gzip(file_path: str) -> bool:
+    with open(file_path, 'rb') as f:
+        return f.read(3) == GZIP_SIGNATURE
+
+
+def _read_first_line(file_path: str) -> bytes:
+    with (gzip.open if _is_gzip(file_path) else open)(file_path, 'rb') as f:
+        return f.readline()
+
+
+def _ends_with_newline(file_path: str) -> bool:
+    with open(file_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        if not f.tell():
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+def _get_gzip_body_offset(file_path: str, header: bytes) -> Optional[int]:
+    """Returns the offset of the second gzip member if the first member holds exactly the header line, else None"""
+    with open(file_path, 'rb') as f:
+        head = f.read(len(header) + 1024 * 64)  # A member holding only the header is never larger than this.
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = decompressor.decompress(head, len(header) + 1)
+    if not decompressor.eof or data != header:
+        return None
+    return len(head) - len(decompressor.unused_data)
+
+
+def _copy_file(file_path: str, f_out, offset: int = 0, block_size: int = 1024 ** 2 * 8) -> None:
+    """Appends the file from offset to f_out, with os.sendfile where the platform supports it"""
+    with open(file_path, 'rb') as f_in:
+        size = os.fstat(f_in.fileno()).st_size
+        f_out.flush()
+        try:
+            while offset < size:
+                sent = os.sendfile(f_out.fileno(), f_in.fileno(), offset, min(size - offset, 1024 ** 3))
+                if sent == 0:
+                    break
+                offset += sent
+            return
+        except (AttributeError, OSError):
+            pass
+        f_in.seek(offset)
+        f_out.seek(0, os.SEEK_END)
+        shutil.copyfileobj(f_in, f_out, length=block_size)
+
+
+class AnalyzingReader(io.RawIOBase):
+    """Reads a byte stream once, feeding every block to incremental hash, size, magic, line count and encoding analyzers"""
+    # Wrap it in io.BufferedReader to analyze the file while a parser (e.g. pandas) consumes it
+
+    def __init__(self, raw, block_size: int = 1024 ** 2 * 8):
+        self.raw = raw
+        self.block_size = block_size
+        self.sha256 = hashlib.sha256()
+        self.raw_bytes = 0
+        self.signature = b''
+        self.compression = None
+        self.content_bytes = 0
+        self.line_count = 0
+        self.last_byte = b''
+        self.encoding_detector = UniversalDetector()
+        self._decompressor = None
+        self._buffer = b''
+        self._offset = 0
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def _decompress(self, data: bytes) -> bytes:
+        blocks = []
+        while data:
+            blocks.append(self._decompressor.decompress(data))
+            if not self._decompressor.eof:
+                break
+            data = self._decompressor.unused_data  # Next gzip member.
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        return b''.join(blocks)
+
+    def _next_block(self) -> bytes:
+        data = self.raw.read(self.block_size)
+        if not data:
+            self._eof = True
+            self.encoding_detector.close()
+            return b''
+        if not self.raw_bytes and data[:3] == GZIP_SIGNATURE:
+            self.compression = 'GZIP'
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self.sha256.update(data)
+        self.raw_bytes += len(data)
+        if len(self.signature) < 300:
+            self.signature += data[:300 - len(self.signature)]
+
+        content = self._decompress(data) if self._decompressor else data
+        self.content_bytes += len(content)
+        self.line_count += content.count(b'\n')
+        if content:
+            self.last_byte = content[-1:]
+        if not self.encoding_detector.done:
+            self.encoding_detector.feed(content)
+        return content
+
+    def prefetch(self, size: int) -> bytes:
+        """Returns (without consuming) at least `size` bytes of content, or all of it if shorter"""
+        while len(self._buffer) - self._offset < size and not self._eof:
+            self._buffer = self._buffer[self._offset:] + self._next_block()
+            self._offset = 0
+        return self._buffer[self._offset:self._offset + size]
+
+    def readinto(self, b) -> int:
+        while self._offset >= len(self._buffer) and not self._eof:
+            self._buffer, self._offset = self._next_block(), 0
+        n = min(len(b), len(self._buffer) - self._offset)
+        b[:n] = self._buffer[self._offset:self._offset + n]
+        self._offset += n
+        return n
+
+    def drain(self) -> None:
+        """Consumes the rest of the stream"""
+        self._buffer, self._offset = b'', 0
+        while not self._eof:
+            self._next_block()
+
+    def get_row_count(self) -> int:
+        """Number of lines, counting an unterminated last line"""
+        return self.line_count + (1 if self.content_bytes and self.last_byte != b'\n' else 0)
+
+
 class FileObjectMixin:
 
     file_path = None
@@ -79,15 +432,25 @@ class FileObjectMixin:
     is_streaming_body = None
     extension = None
     dialect = None
+    profile_cache = None
 
     sample_size = 1024 ** 2 * 10  # 10MB
+    sniff_size = 1024 * 64  # The csv sniffer's cost grows quickly with the sample size.
 
-    def __init__(self, file_path_or_buffer):
+    def __init__(self, file_path_or_buffer, profile_cache: Optional[ProfileCache] = None):
         if isinstance(file_path_or_buffer, str):
             self.file_path = file_path_or_buffer
         elif isinstance(file_path_or_buffer, StreamingBody):
             self.is_streaming_body = True
             self.file_obj = file_path_or_buffer
+        self.profile_cache = profile_cache
+
+    def _get_cached(self, field: str, compute: Callable[[], Any]) -> Any:
+        """Returns field of the file's profile from the profile cache (keyed by content hash), computing it on a miss"""
+        if not self.profile_cache or not self.file_path:
+            return compute()
+        content_key = self.profile_cache.get_file_key(self.file_path)
+        return self.profile_cache.get_or_compute(content_key=content_key, field=field, compute=compute)
 
     # Reference.
 
@@ -171,15 +534,21 @@ class FileObjectMixin:
     def guess_encoding(self):
         if self.is_streaming_body:
             result = self._guess_encoding(self.file_obj)
-        else:
+            return result.get('encoding')
+
+        def _guess():
             with self._open(self.file_path, 'rb') as f:
-                result = self._guess_encoding(f)
-        return result.get('encoding')
+                return self._guess_encoding(f).get('encoding')
+        return self._get_cached('encoding', _guess)
 
     def guess_dialect(self):
         if not self.dialect:
-            _sample = self._read_sample()
-            self.dialect = csv.Sniffer().sniff(sample=_sample)
+            attributes = ['delimiter', 'quotechar', 'escapechar', 'doublequote', 'skipinitialspace', 'lineterminator', 'quoting']
+
+            def _sniff():
+                dialect = csv.Sniffer().sniff(sample=self._read_sample())
+                return {x: getattr(dialect, x) for x in attributes}
+            self.dialect = type('sniffed', (csv.Dialect,), self._get_cached('dialect', _sniff))
         return self.dialect
 
     # def guess_delimiter(self):
@@ -195,17 +564,42 @@ class FileObjectMixin:
     def get_headers(self, delimiter=',', skip_rows=0, compression=None) -> List[str]:
         if isinstance(self.file_path, (StreamingBody, gzip.GzipFile)):
             compression = None
-        try:
-            data = pd.read_csv(self.file_path, sep=delimiter, skiprows=skip_rows, compression=compression, nrows=10, low_memory=False)
-            return data.columns.tolist()
-        except ValueError as e:
-            print(f'Error: {str(e)} {os.path.split(self.file_path)[-1]}')
-            raise e
 
-    def get_row_count(self) -> int:
-        if isinstance(self.file_path, StreamingBody):
-            return self.file_path.read().decode('utf-8').count('\n')
-        return sum(1 for _ in open(self.file_path))
+        def _read_headers():
+            try:
+                data = pd.read_csv(self.file_path, sep=delimiter, skiprows=skip_rows, compression=compression, nrows=10, low_memory=False)
+                return data.columns.tolist()
+            except ValueError as e:
+                print(f'Error: {str(e)} {os.path.split(self.file_path)[-1]}')
+                raise e
+        return self._get_cached(f'headers:{delimiter}:{skip_rows}', _read_headers)
+
+    def get_row_count(self, quotechar: Optional[str] = None, processes: int = 1) -> int:
+        """Counts lines (including the header) with block reads, over byte ranges in `processes` workers for local files"""
+        if self.is_streaming_body:
+            return count_rows(self.file_obj, quotechar=quotechar)
+
+        def _count():
+            size = os.stat(self.file_path).st_size
+            with open(self.file_path, 'rb') as f:
+                signature = f.read(3)
+                if processes <= 1 or size < ROW_COUNT_BLOCK_SIZE or signature == GZIP_SIGNATURE:
+                    f.seek(0)
+                    return count_rows(f, quotechar=quotechar)
+                f.seek(size - 1)
+                last_byte = f.read(1)
+
+            step = -(-size // processes)
+            ranges = [(x, min(x + step, size)) for x in range(0, size, step)]
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                results = executor.map(count_newlines_in_range, *zip(*[(self.file_path, x, y, quotechar) for x, y in ranges]))
+                count, in_quotes = 0, False
+                for outside, inside, odd_quotes in results:
+                    count += inside if in_quotes else outside
+                    in_quotes = in_quotes != odd_quotes
+            return count + (1 if last_byte != b'\n' else 0)
+
+        return self._get_cached(f'row_count:{quotechar}' if quotechar else 'row_count', _count)
 
     def get_column_count(self) -> int:
         raise NotImplementedError
@@ -225,30 +619,152 @@ class FileObjectMixin:
 
     # Breakdown.
 
-    def split(self):
-        raise NotImplementedError
+    def _get_part_path(self, output_dir: Optional[str], index: int, compression: Optional[str]) -> str:
+        ext = self.get_extension()
+        base_name = os.path.basename(self.file_path)[:-len(ext)] if ext else os.path.basename(self.file_path)
+        ext = ext[:-len('.gz')] if ext.endswith('.gz') else ext
+        ext += '.gz' if compression == 'GZIP' else ''
+        return os.path.join(output_dir or os.path.dirname(self.file_path), f'{base_name}_part_{index:04d}{ext}')
+
+    def split(self, parts: Optional[int] = None, part_size: Optional[int] = None, rows_per_part: Optional[int] = None,
+              output_dir: Optional[str] = None, header: bool = True, quotechar: Optional[str] = None,
+              compression: Optional[str] = None, processes: int = 1, s3=None, bucket: Optional[str] = None,
+              prefix: str = '') -> List[str]:
+        """Splits the file into row-aligned parts by size, count or rows, written locally or streamed to S3 (returns keys)"""
+        if sum(x is not None for x in [parts, part_size, rows_per_part]) != 1:
+            raise ValueError('Exactly one of "parts", "part_size" and "rows_per_part" must be specified')
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
 
-    def combine(self):
-        raise NotImplementedError
+        with open(self.file_path, 'rb') as f:
+            block = f.read(ROW_COUNT_BLOCK_SIZE)
+        if block[:3] == GZIP_SIGNATURE:
+            if parts:
+                # Estimated from the uncompressed size in the gzip trailer (of the last member, modulo 4GB).
+                with open(self.file_path, 'rb') as f:
+                    f.seek(-4, os.SEEK_END)
+                    uncompressed_size = max(int.from_bytes(f.read(4), 'little'), self.get_size())
+                part_size = -(-uncompressed_size // parts)
+            return self._split_stream(part_size=part_size, rows_per_part=rows_per_part,
+                                      output_dir=output_dir, header=header, quotechar=quotechar, compression=compression,
+                                      s3=s3, bucket=bucket, prefix=prefix)
+
+        _quotechar = quotechar.encode() if quotechar else None
+        header_end = _find_row_end(block, 0, False, _quotechar)[0] if header else 0
+        header_bytes = block[:header_end] if header_end > 0 else b''
+        header_end = max(header_end, 0)
+        size = self.get_size()
+
+        if rows_per_part:
+            splitter = _RowSplitter(quotechar=quotechar, rows_per_part=rows_per_part, offset=header_end)
+            boundaries = []
+            with open(self.file_path, 'rb') as f:
+                f.seek(header_end)
+                for each_block in iter(lambda: f.read(ROW_COUNT_BLOCK_SIZE), b''):
+                    boundaries.extend(splitter.feed(each_block))
+        else:
+            part_size = part_size or -(-(size - header_end) // parts)
+            targets = list(range(header_end + part_size, size, part_size))
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                in_quotes = [False] * len(targets)
+                if quotechar:
+                    # The quote state at each target follows from the parity of quote chars before it.
+                    starts = [header_end] + targets[:-1]
+                    results = executor.map(count_newlines_in_range, *zip(*[(self.file_path, x, y, quotechar) for x, y in zip(starts, targets)]))
+                    state = False
+                    for i, (_, _, odd_quotes) in enumerate(results):
+                        state = in_quotes[i] = state != odd_quotes
+                boundaries = list(executor.map(_find_boundary, *zip(*[(self.file_path, x, y, quotechar) for x, y in zip(targets, in_quotes)]))) if targets else []
+        boundaries = sorted(set(x for x in boundaries if header_end < x < size))
+        ranges = list(zip([header_end] + boundaries, boundaries + [size]))
+        ranges = [x for x in ranges if x[1] > x[0]] or [(header_end, size)]
+
+        output_paths = [self._get_part_path(output_dir, i, compression) for i in range(len(ranges))]
+        if s3 is not None:
+            keys = [prefix + os.path.basename(x) for x in output_paths]
+            with ThreadPoolExecutor(max_workers=max(processes, 1)) as executor:
+                futures = [executor.submit(s3.upload_file_obj, file_obj=io.BufferedReader(_RangeReader(self.file_path, x, y, header=header_bytes, compression=compression)),
+                                           key=key, bucket=bucket, replace=True) for (x, y), key in zip(ranges, keys)]
+                [x.result() for x in futures]
+            return keys
+
+        with ProcessPoolExecutor(max_workers=max(processes, 1)) as executor:
+            return list(executor.map(_write_part, *zip(*[(self.file_path, x, y, header_bytes, path, compression) for (x, y), path in zip(ranges, output_paths)])))
+
+    def _split_stream(self, part_size: Optional[int], rows_per_part: Optional[int], output_dir: Optional[str], header: bool,
+                      quotechar: Optional[str], compression: Optional[str], s3, bucket: Optional[str], prefix: str) -> List[str]:
+        """Splits a gzipped file while decompressing it; each finished part is uploaded (and removed) if `s3` is given"""
+        output_paths, header_bytes, splitter, f_out, compressor = [], b'', None, None, None
+        _quotechar = quotechar.encode() if quotechar else None
+
+        def _close_part():
+            if compressor:
+                f_out.write(compressor.flush())
+            f_out.close()
+            if s3 is not None:
+                s3.upload_file(filename=output_paths[-1], key=prefix + os.path.basename(output_paths[-1]), bucket=bucket, replace=True)
+                os.remove(output_paths[-1])
+
+        with gzip.open(self.file_path, 'rb') as f:
+            for block in iter(lambda: f.read(ROW_COUNT_BLOCK_SIZE), b''):
+                if splitter is None:
+                    header_end = max(_find_row_end(block, 0, False, _quotechar)[0], 0) if header else 0
+                    header_bytes, block = block[:header_end], block[header_end:]
+                    splitter = _RowSplitter(quotechar=quotechar, part_size=part_size, rows_per_part=rows_per_part)
+                offset, pos = splitter.offset, 0
+                for cut in splitter.feed(block) + [None]:
+                    end = cut - offset if cut is not None else len(block)
+                    if end > pos and f_out is None:
+                        output_paths.append(self._get_part_path(output_dir, len(output_paths), compression))
+                        f_out = open(output_paths[-1], 'wb')
+                        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compression == 'GZIP' else None
+                        f_out.write(gzip.compress(header_bytes, compresslevel=6) if compressor and header_bytes else header_bytes)
+                    if end > pos:
+                        f_out.write(compressor.compress(block[pos:end]) if compressor else block[pos:end])
+                    if cut is not None and f_out is not None:
+                        _close_part()
+                        f_out = None
+                    pos = end
+        if f_out is not None:
+            _close_part()
+        if s3 is not None:
+            return [prefix + os.path.basename(x) for x in output_paths]
+        return output_paths
+
+    def combine(self, files: List[Any], output_path: str, header: bool = True, delimiter: str = ',') -> str:
+        """Appends files (paths or file objects) to this file into output_path; see FileList.combine"""
+        return FileList([self] + list(files)).combine(output_path=output_path, header=header, delimiter=delimiter)
 
     # Transformation.
 
-    def compress(self, compression: Optional[str] = 'GZIP'):
-        if compression == 'GZIP':
-            with open(self.file_path, 'rb') as f_in:
-                compressed_file_path = f_in.name + '.gz'
-                with gzip.open(compressed_file_path, 'wb') as f_out:
-                    shutil.copyfileobj(f_in, f_out)
+    def compress(self, compression: Optional[str] = 'GZIP', level: int = 6, block_size: int = ROW_COUNT_BLOCK_SIZE,
+                 threads: Optional[int] = None) -> str:
+        """Gzips the file next to it, compressing blocks of `block_size` bytes in `threads` threads (see compress_blocks)"""
+        if compression != 'GZIP':
+            raise NotImplementedError(f'Compression {compression} is not supported')
+        compressed_file_path = self.file_path + '.gz'
+        with open(self.file_path, 'rb') as f_in, open(compressed_file_path, 'wb') as f_out:
+            compress_blocks(f_in, f_out, level=level, block_size=block_size, threads=threads)
         return compressed_file_path
 
-    def uncompress(self):
-        # TODO: Infer file format before uncompressing.
-        with gzip.open(self.file_path, 'rb') as f_in:
-            uncompressed_file_path = f_in.name.rstrip('.gz')
-            with open(uncompressed_file_path, 'wb') as f_out:
-                shutil.copyfileobj(f_in, f_out)
+    def uncompress(self, block_size: int = ROW_COUNT_BLOCK_SIZE) -> str:
+        """Decompresses a (possibly multi-member) gzip file next to it in bounded-size blocks"""
+        if not _is_gzip(self.file_path):
+            raise ValueError(f'{self.file_path} is not gzip compressed')
+        uncompressed_file_path = self.file_path[:-len('.gz')] if self.file_path.endswith('.gz') else self.file_path + '.out'
+        with open(self.file_path, 'rb') as f_in, open(uncompressed_file_path, 'wb') as f_out:
+            for block in iter_blocks(f_in, block_size=block_size):
+                f_out.write(block)
         return uncompressed_file_path
 
+    def convert_to_parquet(self, output_path: Optional[str] = None, **kwargs) -> str:
+        """Converts the CSV file to Parquet next to it (or to output_path); see convert_csv_to_parquet"""
+        source = self.file_obj if self.is_streaming_body else self.file_path
+        if not output_path:
+            ext = self.get_extension()
+            output_path = (self.file_path[:-len(ext)] if ext else self.file_path) + '.parquet'
+        return convert_csv_to_parquet(source=source, output_path=output_path, **kwargs)
+
     def encrypt(self):
         raise NotImplementedError
 
@@ -263,29 +779,64 @@ class File(FileObjectMixin):
 
     profile = None
 
-    def __init__(self, file_path_or_buffer):
-        super().__init__(file_path_or_buffer=file_path_or_buffer)
-
-    def analyze(self):
-        # File Object
-        # self.profile['extension'] = self.file.get_extension()
-        # self.profile['format'] = self.file.infer_file_type()
-        # self.profile['encrypted'] = None
-        # self.profile['compression'] = None
-        # self.profile['size'] = self.file.get_size()
-
-        # Dialect
-        # self.profile['encoding'] = self.file.guess_encoding()
-        # self.profile['delimiter'] = self.file.guess_dialect().delimiter
-        # self.profile['doublequote'] = self.file.guess_dialect().doublequote
-        # self.profile['quotechar'] = self.file.guess_dialect().quotechar
-        # self.profile['skipinitialspace'] = self.file.guess_dialect().skipinitialspace
-        # self.profile['lineterminator'] = self.file.guess_dialect().lineterminator
-        # self.profile['quoting'] = self.file.guess_dialect().quoting
-
-        # Content
-        # self.profile['has_header'] = self.file.has_header()
-        raise NotImplementedError
+    def __init__(self, file_path_or_buffer, profile_cache: Optional[ProfileCache] = None):
+        super().__init__(file_path_or_buffer=file_path_or_buffer, profile_cache=profile_cache)
+
+    def analyze(self, column_stats: bool = False, chunk_size: int = 100000):
+        """Profiles the file in a single pass over its bytes: format, compression, size, hash, encoding, dialect and rows"""
+        source = self.file_obj if self.is_streaming_body else open(self.file_path, 'rb')
+        reader = AnalyzingReader(source)
+        try:
+            text = reader.prefetch(self.sniff_size).decode('utf-8', errors='replace')
+            text = text[:text.rfind('\n') + 1] or text  # Drop a partial last line.
+
+            try:
+                self.dialect = csv.Sniffer().sniff(sample=text)
+            except csv.Error:
+                self.dialect = None
+            try:
+                has_header = csv.Sniffer().has_header(sample=text)
+            except csv.Error:
+                has_header = None
+            headers = next(csv.reader(io.StringIO(text), self.dialect), []) if self.dialect else []
+
+            columns = None
+            if column_stats and self.dialect:
+                from ontelligence.utils.dtype import merge_profiles, profile_chunk  # utils.dtype imports this module.
+                profiles = {}
+                for chunk in pd.read_csv(io.BufferedReader(reader, buffer_size=reader.block_size), sep=self.dialect.delimiter,
+                                         quotechar=self.dialect.quotechar, chunksize=chunk_size, low_memory=False,
+                                         encoding_errors='replace'):
+                    merge_profiles(profiles, profile_chunk(chunk))
+                columns = {x: {'count': y.count, 'null_count': y.null_count, 'max_length': y.max_length, 'dtype': str(y.get_dtype())}
+                           for x, y in profiles.items()}
+            reader.drain()
+        finally:
+            if not self.is_streaming_body:
+                source.close()
+
+        signatures = sorted(HEX_SIGNATURES.items(), key=lambda x: -len(x[1]))
+        file_format = next((k for k, v in signatures if reader.signature.hex().startswith(v)), None)
+        self.profile = {
+            'extension': self.get_extension() if self.file_path else None,
+            'format': file_format or (self.get_extension().lower() if self.file_path else None),
+            'compression': reader.compression,
+            'size': reader.raw_bytes,
+            'uncompressed_size': reader.content_bytes,
+            'sha256': reader.sha256.hexdigest(),
+            'encoding': reader.encoding_detector.result.get('encoding'),
+            'delimiter': self.dialect.delimiter if self.dialect else None,
+            'doublequote': self.dialect.doublequote if self.dialect else None,
+            'quotechar': self.dialect.quotechar if self.dialect else None,
+            'skipinitialspace': self.dialect.skipinitialspace if self.dialect else None,
+            'lineterminator': self.dialect.lineterminator if self.dialect else None,
+            'quoting': self.dialect.quoting if self.dialect else None,
+            'has_header': has_header,
+            'headers': headers,
+            'row_count': reader.get_row_count(),
+            'columns': columns
+        }
+        return self.profile
 
     def get_profile(self):
         if not self.profile:
@@ -303,19 +854,141 @@ class File(FileObjectMixin):
         raise NotImplementedError
 
 
-class Folder:
-
-    def __init__(self, path):
-        raise NotImplementedError
-
-    def get_size(self):
-        raise NotImplementedError
+def translate_glob(pattern: str) -> str:
+    """Translates a glob to a regex in which `*`, `?` and character classes do not match "/" and `**` spans directories"""
+    i, n, parts = 0, len(pattern), []
+    while i < n:
+        char = pattern[i]
+        i += 1
+        if pattern[i - 1:i + 2] == '**/':
+            parts.append('(?:.*/)?')
+            i += 2
+        elif pattern[i - 1:i + 1] == '**':
+            parts.append('.*')
+            i += 1
+        elif char == '*':
+            parts.append('[^/]*')
+        elif char == '?':
+            parts.append('[^/]')
+        elif char == '[':
+            j = i + 1 if pattern[i:i + 1] == '!' else i
+            j = pattern.find(']', j + 1 if pattern[j:j + 1] == ']' else j)  # A leading "]" is part of the class.
+            if j == -1:
+                parts.append(re.escape(char))
+                continue
+            chars, i = pattern[i:j], j + 1
+            negate = chars.startswith('!')
+            chars = ''.join(x if x == '-' else re.escape(x) for x in (chars[1:] if negate else chars))
+            parts.append(f'[^/{chars}]' if negate else f'(?!/)[{chars}]')
+        else:
+            parts.append(re.escape(char))
+    return '(?s:' + ''.join(parts) + r')\Z'
 
-    def get_files(self):
-        raise NotImplementedError
 
-    def search_files(self):
-        raise NotImplementedError
+class Folder:
+    """In-memory index of the files under a directory, built with (recursive) os.scandir and holding each stat"""
+
+    def __init__(self, path: str, recursive: bool = True, follow_symlinks: bool = False):
+        self.path = os.path.abspath(path)
+        self.recursive = recursive
+        self.follow_symlinks = follow_symlinks
+        self._files: Dict[str, Dict[str, os.stat_result]] = {}  # Directory -> file name -> stat.
+        self._subdirs: Dict[str, Set[str]] = {}
+        self._mtimes: Dict[str, int] = {}
+        self.refresh(full=True)
+
+    def _scan(self, path: str, previous: Dict[str, os.stat_result], changed: List[str]) -> List[str]:
+        """Indexes the direct entries of a directory, collects new or changed files and returns new subdirectories"""
+        files, subdirs = {}, set()
+        try:
+            stat = os.stat(path)
+            with os.scandir(path) as it:
+                for each_entry in it:
+                    if each_entry.is_dir(follow_symlinks=self.follow_symlinks):
+                        if self.recursive:
+                            subdirs.add(each_entry.path)
+                    elif each_entry.is_file(follow_symlinks=self.follow_symlinks):
+                        files[each_entry.name] = each_entry.stat(follow_symlinks=self.follow_symlinks)
+        except FileNotFoundError:
+            self._drop(path)
+            return []
+        for name, each_stat in files.items():
+            previous_stat = previous.get(name)
+            if previous_stat is None or (previous_stat.st_size, previous_stat.st_mtime_ns) != (each_stat.st_size, each_stat.st_mtime_ns):
+                changed.append(os.path.join(path, name))
+        self._files[path] = files
+        self._mtimes[path] = stat.st_mtime_ns
+        new_subdirs = list(subdirs - self._subdirs.get(path, set()))
+        for each_subdir in self._subdirs.get(path, set()) - subdirs:
+            self._drop(each_subdir)
+        self._subdirs[path] = subdirs
+        return new_subdirs
+
+    def _drop(self, path: str) -> None:
+        for each_subdir in self._subdirs.pop(path, set()):
+            self._drop(each_subdir)
+        self._files.pop(path, None)
+        self._mtimes.pop(path, None)
+
+    def refresh(self, full: bool = False) -> List[str]:
+        """Updates the index and returns the paths of new or changed files"""
+        previous, changed = self._files, []
+        # Only directories whose mtime changed are re-scanned; files modified in place need a full re-scan
+        if full:
+            self._files, self._subdirs, self._mtimes = {}, {}, {}
+        stack = [self.path] if not self._mtimes else []
+        for each_dir, mtime in list(self._mtimes.items()):
+            if each_dir not in self._mtimes:  # Dropped with a changed parent.
+                continue
+            try:
+                if os.stat(each_dir).st_mtime_ns != mtime:
+                    stack.extend(self._scan(each_dir, previous=previous.get(each_dir, {}), changed=changed))
+            except FileNotFoundError:
+                self._drop(each_dir)
+        while stack:
+            each_dir = stack.pop()
+            stack.extend(self._scan(each_dir, previous=previous.get(each_dir, {}), changed=changed))
+        return sorted(changed)
+
+    def iter_stats(self) -> Generator[Tuple[str, os.stat_result], None, None]:
+        for each_dir, files in self._files.items():
+            prefix = each_dir + os.sep
+            for name, stat in files.items():
+                yield prefix + name, stat
+
+    def get_stat(self, file_path: str) -> Optional[os.stat_result]:
+        file_path = os.path.abspath(file_path)
+        return self._files.get(os.path.dirname(file_path), {}).get(os.path.basename(file_path))
+
+    def get_size(self) -> int:
+        return sum(x.st_size for _, x in self.iter_stats())
+
+    def get_files(self) -> List[str]:
+        return sorted(x for x, _ in self.iter_stats())
+
+    def search_files(self, pattern: Optional[str] = None, regex: Optional[str] = None, modified_after: Optional[Union[float, datetime]] = None,
+                     modified_before: Optional[Union[float, datetime]] = None) -> List[str]:
+        """Searches the index by glob `pattern` (only `**` spans directories), `regex` on relative paths and modification time"""
+        glob_pattern = re.compile(translate_glob(pattern)) if pattern else None
+        regex_pattern = re.compile(regex) if regex else None
+        modified_after = modified_after.timestamp() if isinstance(modified_after, datetime) else modified_after
+        modified_before = modified_before.timestamp() if isinstance(modified_before, datetime) else modified_before
+        results = []
+        match_paths = pattern and '/' in pattern
+        for each_dir, files in self._files.items():
+            prefix = each_dir[len(self.path) + 1:] + '/' if each_dir != self.path else ''
+            for name, stat in files.items():
+                relative_path = prefix + name
+                if glob_pattern and not glob_pattern.match(relative_path if match_paths else name):
+                    continue
+                if regex_pattern and not regex_pattern.search(relative_path):
+                    continue
+                if modified_after is not None and stat.st_mtime <= modified_after:
+                    continue
+                if modified_before is not None and stat.st_mtime >= modified_before:
+                    continue
+                results.append(os.path.join(self.path, relative_path))
+        return sorted(results)
 
 
 # TODO: REMOVE EVERYTHING BELOW HERE.
@@ -352,44 +1025,236 @@ def chunks(items: List[T], chunk_size: int) -> Generator[List[T], None, None]:
         yield items[i: i + chunk_size]
 
 
-# TODO: Without indicators
-# TODO: With date indicator
-# TODO: With timestamp indicator
-# TODO:
-# TODO:
-
-
 DATE_INDICATOR = '{DATE}'
 TIMESTAMP_INDICATOR = '{TIMESTAMP}'
 _ALL_INDICATORS = [DATE_INDICATOR, TIMESTAMP_INDICATOR]
+TIMESTAMP_FORMAT = '%Y%m%d%H%M%S'
 
+_STRFTIME_PATTERNS = {
+    'Y': r'\d{4}', 'y': r'\d{2}', 'm': r'\d{2}', 'd': r'\d{2}', 'H': r'\d{2}', 'I': r'\d{2}', 'M': r'\d{2}', 'S': r'\d{2}',
+    'f': r'\d{1,6}', 'j': r'\d{3}', 'b': r'[a-z]{3}', 'B': r'[a-z]+', 'a': r'[a-z]{3}', 'A': r'[a-z]+', 'p': r'[ap]m',
+    'z': r'[+-]\d{4}', 'Z': r'[a-z]+', '%': '%'
+}
 
-def get_matching_files(files: List[str], regex: Optional[str] = None, **kwargs) -> List[str]:
-    # TODO: How do you handle multiple files delivered on the same day (marked with TIMESTAMP)?
 
-    matched_files = []
-    _regex_patterns = []
+def _strftime_to_regex(date_format: str) -> str:
+    """Translates a strftime format into a regex matching the dates it renders (%-d etc. match one or two digits)"""
+    parts = re.split(r'(%-?.)', date_format)
+    return ''.join((r'\d{1,2}' if x.startswith('%-') else _STRFTIME_PATTERNS.get(x[-1], '.+?')) if x.startswith('%') and len(x) > 1
+                   else re.escape(x) for x in parts)
+
+
+def compile_file_pattern(regex: Optional[str] = None, date_format: str = DATE_FORMAT, timestamp_format: str = TIMESTAMP_FORMAT) -> re.Pattern:
+    """Compiles a file name regex once, turning {DATE} and {TIMESTAMP} indicators into named groups and backreferences"""
     regex = regex or '.*'
-    if any(x in regex for x in _ALL_INDICATORS):
-        if DATE_INDICATOR in regex:
-            resolved_dates = resolve_date_input(**kwargs)
-            _regex_patterns.extend([regex.replace(DATE_INDICATOR, x) for x in resolved_dates['list_of_dates']])
-        if TIMESTAMP_INDICATOR in regex:
-            raise NotImplementedError
-    else:
-        _regex_patterns = [regex]
+    for indicator, group, date_pattern in [(DATE_INDICATOR, 'date', date_format), (TIMESTAMP_INDICATOR, 'timestamp', timestamp_format)]:
+        if indicator in regex:
+            head, tail = regex.split(indicator, 1)
+            regex = head + f'(?P<{group}>{_strftime_to_regex(date_pattern)})' + tail.replace(indicator, f'(?P={group})')
+    return re.compile(regex, flags=re.IGNORECASE)
+
+
+def get_latest_file_date(files: List[str], regex: str, **kwargs) -> Optional[datetime]:
+    """Returns the latest date parsed from the {DATE} or {TIMESTAMP} indicator of the files matching regex"""
+    date_format = kwargs.get('date_format', DATE_FORMAT)
+    timestamp_format = kwargs.get('timestamp_format', TIMESTAMP_FORMAT)
+    pattern = compile_file_pattern(regex, date_format=date_format, timestamp_format=timestamp_format)
+    group, group_format = ('timestamp', timestamp_format) if 'timestamp' in pattern.groupindex else ('date', date_format)
+    if group not in pattern.groupindex:
+        return None
+    tokens = {m.group(group) for m in map(pattern.match, files) if m}
+    dates = []
+    for each_token in tokens:
+        try:
+            dates.append(datetime.strptime(each_token, group_format))
+        except ValueError:
+            continue
+    return max(dates) if dates else None
+
+
+def match_files(files: List[str], regex: Optional[str] = None, **kwargs) -> List[Tuple[str, Optional[datetime]]]:
+    """Returns the distinct files matching regex with the date parsed from their {DATE} or {TIMESTAMP} indicator, by date"""
+    date_format = kwargs.get('date_format', DATE_FORMAT)
+    timestamp_format = kwargs.get('timestamp_format', TIMESTAMP_FORMAT)
+    pattern = compile_file_pattern(regex, date_format=date_format, timestamp_format=timestamp_format)
+    has_date = 'date' in pattern.groupindex
+    has_timestamp = 'timestamp' in pattern.groupindex
+
+    resolved_dates, start_date, end_date = set(), None, None
+    if (has_date or has_timestamp) and any(kwargs.get(x) for x in ['exact_date', 'start_date']):
+        resolved = resolve_date_input(**kwargs)
+        resolved_dates = {x.lower() for x in resolved['list_of_dates']}
+        start_date = datetime.strptime(resolved['date_range']['start_date'], date_format).date()
+        end_date = datetime.strptime(resolved['date_range']['end_date'], date_format).date()
+
+    matched, seen, parsed = [], set(), {}  # Many files share a date, so parsed tokens are memoized.
+    for i, each_file in enumerate(files):
+        if each_file in seen:
+            continue
+        m = pattern.match(each_file)
+        if not m:
+            continue
+        file_date = None
+        if has_date and m.group('date') is not None:
+            token = m.group('date')
+            if start_date and token.lower() not in resolved_dates:
+                continue
+            try:
+                file_date = parsed[token] if token in parsed else parsed.setdefault(token, datetime.strptime(token, date_format))
+            except ValueError:
+                continue
+        if has_timestamp and m.group('timestamp') is not None:
+            token = m.group('timestamp')
+            try:
+                file_date = parsed[token] if token in parsed else parsed.setdefault(token, datetime.strptime(token, timestamp_format))
+            except ValueError:
+                continue
+            if start_date and not start_date <= file_date.date() <= end_date:
+                continue
+        seen.add(each_file)
+        matched.append((file_date or datetime.min, i, each_file))
+    return [(x[2], x[0] if x[0] != datetime.min else None) for x in sorted(matched)]
+
 
-    for each_pattern in _regex_patterns:
-        matched_files.extend([x for x in files if re.match(pattern=each_pattern, string=x, flags=re.IGNORECASE)])
-    return matched_files
+def get_matching_files(files: List[str], regex: Optional[str] = None, **kwargs) -> List[str]:
+    """Returns the distinct files matching regex, oldest first (see match_files)"""
+    return [x for x, _ in match_files(files=files, regex=regex, **kwargs)]
 
 
 def get_latest_file(files: List[str], regex: Optional[str] = None, lookback_window: Optional[int] = 14, **kwargs) -> str:
     kwargs['start_date'] = today(delta_days=-lookback_window)
-    matched_files = get_matching_files(files=files, regex=regex, **kwargs)
-    if not matched_files:
+    latest = FileIndex(entries=[FileEntry(name=x) for x in files], regex=regex, **kwargs).get_latest_file()
+    if not latest:
         raise Exception('Could not find the latest file. Try increasing the "lookback_window" value')
-    return matched_files[-1]
+    return latest.name
+
+
+def _to_naive_utc(dt: Optional[datetime]) -> datetime:
+    if dt is None:
+        return datetime.min
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+
+class FileIndex:
+    """Sorted index of listed files by (date parsed from the name, modification time), built from a single listing"""
+
+    def __init__(self, entries: List[FileEntry], regex: Optional[str] = None, **kwargs):
+        by_name = {x.name: x for x in entries}
+        position = {x: i for i, x in enumerate(by_name)}
+        indexed = []
+        for name, file_date in match_files(files=list(by_name), regex=regex, **kwargs):
+            entry = by_name[name]
+            entry.file_date = file_date
+            # Files with the same date and modification time (or neither) keep their listing order.
+            indexed.append(((_to_naive_utc(file_date or entry.last_modified), _to_naive_utc(entry.last_modified), position[name]), entry))
+        indexed.sort(key=lambda x: x[0])
+        self.entries: List[FileEntry] = [x[1] for x in indexed]
+        self._keys = [x[0][0] for x in indexed]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_latest(self, n: int = 1) -> List[FileEntry]:
+        """Returns the n latest files, latest first"""
+        return self.entries[::-1][:n]
+
+    def get_latest_file(self) -> Optional[FileEntry]:
+        return self.entries[-1] if self.entries else None
+
+    def get_range(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[FileEntry]:
+        """Returns the files dated (or modified, if undated) in [start, end], oldest first"""
+        i = bisect_left(self._keys, _to_naive_utc(start)) if start else 0
+        j = bisect_right(self._keys, _to_naive_utc(end)) if end else len(self._keys)
+        return self.entries[i:j]
+
+
+# Same as the NULL_IF of CSV file formats created by the Snowflake provider.
+PARQUET_NULL_VALUES = ['', 'NULL', 'null', 'N/A', 'None']
+
+
+def _get_partition_path(root: str, partition_cols: List[str], values: list) -> str:
+    names = [f'{x}={quote(str(y.isoformat() if hasattr(y, "isoformat") else y), safe="")}' if y is not None
+             else f'{x}=__HIVE_DEFAULT_PARTITION__' for x, y in zip(partition_cols, values)]
+    return os.path.join(root, *names, 'part-0.parquet')
+
+
+def _iter_partitions(table, partition_cols: List[str]) -> Generator[Tuple[list, Any], None, None]:
+    """Yields the values of the partition columns and the matching rows (without the partition columns) of a table"""
+    data_cols = [x for x in table.column_names if x not in partition_cols]
+    for each_key in table.select(partition_cols).group_by(partition_cols).aggregate([]).to_pylist():
+        mask = None
+        for col in partition_cols:
+            condition = pc.is_null(table[col]) if each_key[col] is None else pc.equal(table[col], each_key[col])
+            mask = condition if mask is None else pc.and_(mask, condition)
+        yield [each_key[x] for x in partition_cols], table.filter(mask).select(data_cols)
+
+
+def convert_csv_to_parquet(source, output_path: str, columns: Optional[List[Any]] = None, delimiter: str = ',',
+                           select: Optional[List[str]] = None, dictionary_columns: Union[bool, List[str]] = True,
+                           partition_cols: Optional[List[str]] = None, row_group_size: int = 1000000,
+                           block_size: int = ROW_COUNT_BLOCK_SIZE, compression: str = 'snappy') -> str:
+    """Converts a CSV to Parquet in a single streaming pass, writing row groups of up to `row_group_size` rows"""
+    # With partition_cols, output_path is the root of a Hive-style partitioned dataset
+    if pq is None:
+        raise ImportError('Python package pyarrow is required for Parquet conversion. Install it with "pip install ontelligence[parquet]".')
+    from ontelligence.utils.dtype import DATETIME_FORMATS, get_arrow_type, infer_data_schema  # utils.dtype imports this module.
+
+    if columns is None and isinstance(source, str):
+        columns = infer_data_schema(source, delimiter=delimiter, precise_types=True)
+    schema, read_types = None, None
+    if columns:
+        types = {x.name: get_arrow_type(x.dtype) for x in columns}
+        schema = pa.schema([(x, types[x]) for x in (select or [x.name for x in columns])])
+        # Dates are read as timestamps, so every format in DATETIME_FORMATS parses, and cast afterwards.
+        read_types = {x.name: pa.timestamp('s') if x.type == pa.date32() else x.type for x in schema}
+
+    if isinstance(source, str):
+        input_file = pa.input_stream(source, compression='gzip' if _is_gzip(source) else None)
+    else:
+        input_file = io.BufferedReader(AnalyzingReader(source))
+    reader = pa_csv.open_csv(
+        input_file,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        parse_options=pa_csv.ParseOptions(delimiter=delimiter, newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=read_types, include_columns=select, null_values=PARQUET_NULL_VALUES, strings_can_be_null=True,
+            timestamp_parsers=[pa_csv.ISO8601] + [x for x in DATETIME_FORMATS if '%f' not in x]  # Arrow has no %f.
+        )
+    )
+    schema = schema or reader.schema
+
+    writers = {}
+
+    def _write(path: str, table) -> None:
+        if path not in writers:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            writers[path] = pq.ParquetWriter(path, table.schema, compression=compression, use_dictionary=dictionary_columns)
+        writers[path].write_table(table, row_group_size=row_group_size)
+
+    def _flush(batches: list) -> None:
+        table = pa.Table.from_batches(batches).cast(schema)
+        if not partition_cols:
+            _write(output_path, table)
+            return
+        for values, part in _iter_partitions(table, partition_cols=partition_cols):
+            _write(_get_partition_path(output_path, partition_cols, values), part)
+
+    try:
+        batches, rows = [], 0
+        for batch in reader:
+            batches.append(batch)
+            rows += batch.num_rows
+            if rows >= row_group_size:
+                _flush(batches)
+                batches, rows = [], 0
+        if batches:
+            _flush(batches)
+        if not writers and not partition_cols:
+            _write(output_path, schema.empty_table())
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return output_path
 
 
 class FileList:
@@ -402,8 +1267,42 @@ class FileList:
     def add_file(self, file: File):
         self.files.append(file)
 
-    def combine(self):
-        # TODO: Check if each file has the same number of columns.
-        # TODO: Check if each file has column headers.
-        # TODO: Check if each file's column headers are the same and in the same order.
-        raise NotImplementedError
+    def combine(self, output_path: str, header: bool = True, delimiter: str = ',') -> str:
+        """Concatenates the files into output_path (gzipped if it ends with .gz), appending gzipped files as raw gzip members"""
+        paths = [x.file_path if isinstance(x, FileObjectMixin) else x for x in self.files]
+        if not paths:
+            raise ValueError('There are no files to combine')
+        first_lines = [_read_first_line(x) for x in paths]
+        columns = [next(csv.reader([x.decode('utf-8', errors='replace').lstrip('\ufeff')], delimiter=delimiter), []) for x in first_lines]
+        for path, each_columns in zip(paths[1:], columns[1:]):
+            if header and each_columns != columns[0]:
+                raise ValueError(f'Headers of {path} do not match headers of {paths[0]}: {each_columns} != {columns[0]}')
+            if len(each_columns) != len(columns[0]):
+                raise ValueError(f'{path} has {len(each_columns)} columns, while {paths[0]} has {len(columns[0])}')
+
+        compress_output = output_path.endswith('.gz')
+        with open(output_path, 'wb') as f_out:
+            for i, (path, first_line) in enumerate(zip(paths, first_lines)):
+                skip_header = header and i > 0
+                is_gzip = _is_gzip(path)
+                if is_gzip == compress_output:
+                    offset = len(first_line) if skip_header else 0
+                    if is_gzip and skip_header:
+                        offset = _get_gzip_body_offset(path, header=first_line)
+                    if offset is not None:
+                        _copy_file(path, f_out, offset=offset)
+                        if not is_gzip and i < len(paths) - 1 and not _ends_with_newline(path):
+                            f_out.write(b'\n')
+                        continue
+
+                with (gzip.open if is_gzip else open)(path, 'rb') as f_in:
+                    if skip_header:
+                        f_in.readline()
+                    if compress_output:
+                        with gzip.GzipFile(fileobj=f_out, mode='wb', compresslevel=6) as gz_out:
+                            shutil.copyfileobj(f_in, gz_out, length=1024 ** 2 * 8)
+                            if not is_gzip and i < len(paths) - 1 and not _ends_with_newline(path):
+                                gz_out.write(b'\n')
+                    else:
+                        shutil.copyfileobj(f_in, f_out, length=1024 ** 2 * 8)
+        return output_path
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 from logging import Logger
 
@@ -46,17 +47,29 @@ class LoggingMixin:
         if context is not None:
             set_context(self.log, context)
 
-    def log_sql(self, query: str):
-        # all_statements = sqlparse.split(query)
+    def log_sql(self, query: str, level: int = logging.DEBUG, max_length: int = 10000):
+        """Logs a statement with its hash; formatting is deferred until the record is emitted"""
+        if not self.log.isEnabledFor(level):
+            return
+        digest = hashlib.sha1(query.encode()).hexdigest()[:12]
+        self.log.log(level, 'SQL [%s]:\n%s', digest, _FormattedSQL(query=query, max_length=max_length))
 
-        # for statement in all_statements:
+
+class _FormattedSQL:
+    """Formats a statement with sqlparse only when converted to a string, capped to `max_length` characters"""
+
+    def __init__(self, query: str, max_length: int):
+        self.query = query
+        self.max_length = max_length
+
+    def __str__(self):
+        query = self.query[:self.max_length]
         formatted_query = sqlparse.format(
             sql=query,
-            # reindent=True,
             reindent_aligned=True,
             keyword_case='upper',
             identifier_case='upper',
-            # strip_whitespace=True
         )
-        print('\n' + formatted_query)
-        # self.log.info(formatted_query)
+        if len(self.query) > self.max_length:
+            formatted_query += f'\n... [truncated {len(self.query) - self.max_length} characters]'
+        return formatted_query
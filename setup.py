@@ -35,6 +35,10 @@ setup(
         'smart_open[all]',
         'jira'
     ],
+    extras_require={
+        'snowpipe': ['snowflake-ingest'],
+        'parquet': ['pyarrow']
+    },
     include_package_data=True,
     zip_safe=False
 )
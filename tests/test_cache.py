@@ -0,0 +1,103 @@
+import logging
+import re
+
+import pandas as pd
+import pytest
+
+from ontelligence.providers.snowflake.cache import QueryResultCache
+from ontelligence.providers.snowflake.snowflake import Snowflake
+
+
+@pytest.mark.parametrize('query, tables', [
+    ('SELECT * FROM db.sch.a JOIN "B" b ON a.id = b.id WHERE a.x = 1', ['"B"', 'db.sch.a']),
+    ('WITH c AS (SELECT * FROM a), d AS (SELECT * FROM b) SELECT * FROM c JOIN d USING (id, dt)', ['a', 'b']),
+    ('SELECT (SELECT MAX(x) FROM a), y FROM b -- FROM c, d', ['a', 'b']),
+    ("SELECT 'FROM x, y' AS s, EXTRACT(YEAR FROM dt) FROM a GROUP BY 1, 2 ORDER BY 1, 2", ['a']),
+    ("SELECT TRIM(BOTH ' ' FROM name), SUBSTRING(name FROM 2) FROM a JOIN b USING (id)", ['a', 'b']),
+    ('SELECT * FROM a UNION ALL SELECT * FROM b ORDER BY 1, 2', ['a', 'b']),
+    ('SELECT * FROM (VALUES (1, 2), (3, 4))', []),
+])
+def test_get_referenced_tables(query, tables):
+    assert QueryResultCache.get_referenced_tables(query) == tables
+
+
+@pytest.mark.parametrize('query', [
+    'SELECT * FROM a, b',
+    'SELECT * FROM a x, b y WHERE x.id = y.id',
+    'SELECT * FROM (SELECT * FROM a) s, b',
+    'SELECT * FROM a, LATERAL FLATTEN(input => a.v)',
+    'SELECT $1 FROM @my_stage/path',
+])
+def test_queries_with_unaccounted_references_bypass_the_cache(query):
+    assert QueryResultCache.get_referenced_tables(query) is None
+
+
+def test_cache_round_trip_and_eviction(tmp_path):
+    cache = QueryResultCache(cache_dir=str(tmp_path), max_bytes=1)
+    key = cache.get_key(query='select  *\nfrom a;', role='r', fingerprint='DB.SCH.A@1')
+    assert key == cache.get_key(query='SELECT * FROM a', role='R', fingerprint='DB.SCH.A@1')
+    assert key != cache.get_key(query='SELECT * FROM a', role='R', fingerprint='DB.SCH.A@2')
+
+    df = pd.DataFrame({'a': [1, 2]})
+    cache.max_bytes = 10 ** 6
+    cache.put(key, df)
+    pd.testing.assert_frame_equal(cache.get(key), df)
+    cache.max_bytes = 1
+    cache.evict()
+    assert cache.get(key) is None
+
+
+class _FakeCursor:
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class _CachingSnowflake(Snowflake):
+    log = logging.getLogger(__name__)
+    database = 'DB'
+    schema = 'SCH'
+    role = 'ROLE'
+
+    def __init__(self, cache_dir, tables):
+        self.result_cache = QueryResultCache(cache_dir=cache_dir)
+        self.tables = tables
+        self.queries = []
+
+    def execute(self, query, commit=True, return_cursor=False):
+        database = re.search(r'FROM "([^"]+)"', query).group(1)
+        names = re.findall(r"TABLE_SCHEMA = '([^']+)' AND TABLE_NAME = '([^']+)'", query)
+        return _FakeCursor([(x[0], x[1]) + self.tables[(database,) + x] for x in names if (database,) + x in self.tables])
+
+    def query(self, query, chunk_size=None, return_chunks=False, use_cache=False):
+        if use_cache:
+            return super().query(query=query, chunk_size=chunk_size, use_cache=True)
+        self.queries.append(query)
+        return pd.DataFrame({'x': [len(self.queries)]})
+
+
+def test_table_fingerprint_resolves_names_and_rejects_views(tmp_path):
+    sf = _CachingSnowflake(str(tmp_path), {('DB', 'SCH', 'A'): ('BASE TABLE', 1), ('DB2', 'S', 'Mixed'): ('BASE TABLE', 2),
+                                           ('DB', 'SCH', 'V'): ('VIEW', 3)})
+
+    assert sf.get_table_fingerprint(['a', 'db2.s."Mixed"']) == 'DB.SCH.A@1\nDB2.S.Mixed@2'
+    assert sf.get_table_fingerprint(['a', 'v']) is None
+    assert sf.get_table_fingerprint(['missing']) is None
+
+
+def test_query_with_cache_reuses_results_until_a_table_changes(tmp_path):
+    tables = {('DB', 'SCH', 'A'): ('BASE TABLE', 1)}
+    sf = _CachingSnowflake(str(tmp_path), tables)
+
+    first = sf.query('SELECT * FROM a', use_cache=True)
+    pd.testing.assert_frame_equal(sf.query('select *  from a;', use_cache=True), first)
+    tables[('DB', 'SCH', 'A')] = ('BASE TABLE', 2)
+    assert sf.query('SELECT * FROM a', use_cache=True)['x'].tolist() == [2]
+
+    for query in ['SELECT * FROM a, b', 'SELECT CURRENT_DATE() FROM a', 'SELECT * FROM missing']:
+        sf.query(query, use_cache=True)
+        sf.query(query, use_cache=True)
+    assert len(sf.queries) == 8
@@ -0,0 +1,50 @@
+import gzip
+import io
+
+import pandas as pd
+
+from ontelligence.utils.dtype import ColumnProfile, DateTime, String, get_snowflake_type, infer_data_schema
+
+
+CSV = b'id,amount,name\n1,10.25,a\n2,3.5,bc\n'
+
+
+def _dtypes(columns):
+    return {x.name: x.dtype for x in columns}
+
+
+def test_precise_types_from_dataframe_stream_and_file(tmp_path):
+    file_path = tmp_path / 'data.csv'
+    file_path.write_bytes(CSV)
+
+    from_file = _dtypes(infer_data_schema(str(file_path), precise_types=True))
+    from_frame = _dtypes(infer_data_schema(pd.read_csv(io.BytesIO(CSV), dtype=str), precise_types=True))
+    from_stream = _dtypes(infer_data_schema(gzip.GzipFile(fileobj=io.BytesIO(gzip.compress(CSV))), precise_types=True))
+
+    assert from_file == from_frame == from_stream
+    assert from_file['id'] == 'NUMBER(1,0)' and from_file['name'].startswith('VARCHAR')
+    assert from_file['amount'].startswith('NUMBER(') and from_file['amount'].endswith(',2)')
+
+
+def test_dataframe_precise_types_honour_overrides_and_nulls():
+    df = pd.DataFrame({'id': [1, None], 'amount': [1.5, None], 'name': ['a', None]})
+    assert _dtypes(infer_data_schema(df, precise_types=True, override_dtypes={'NAME': 'VARIANT'})) == {
+        'id': 'NUMBER(1,0)', 'amount': 'NUMBER(2,1)', 'name': 'VARIANT'}
+    df = pd.DataFrame({'id': pd.array([1, None], dtype='Int64'), 'code': pd.Series(['01', None], dtype=object)})
+    assert _dtypes(infer_data_schema(df, precise_types=True)) == {'id': 'NUMBER(1,0)', 'code': 'VARCHAR(2)'}
+
+
+def test_sampled_dates_widen_to_string_for_unsampled_non_dates():
+    values = pd.Series([f'2024-01-{x % 28 + 1:02d}' for x in range(1000)] + ['n/a'])
+    for precise in [True, False]:
+        profile = ColumnProfile(name='day', sample_size=5, precise=precise).update(values)
+        assert 'n/a' not in profile.sample
+        assert isinstance(profile.get_dtype(), String)
+        assert isinstance(ColumnProfile(name='day', sample_size=5, precise=precise).update(values[:-1]).get_dtype(), DateTime)
+
+
+def test_sampled_dates_widen_to_timestamp_for_unsampled_times():
+    values = pd.Series(['2024-01-01'] * 1000 + ['2024-01-01 12:30:00'])
+    profile = ColumnProfile(name='day', sample_size=5, precise=True).update(values)
+    assert '2024-01-01 12:30:00' not in profile.sample
+    assert get_snowflake_type(profile.get_dtype()) == 'TIMESTAMP_NTZ'
@@ -0,0 +1,188 @@
+import csv
+import gzip
+import hashlib
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+from ontelligence.core.schemas.data import FileEntry
+from ontelligence.utils import file as file_module
+from ontelligence.utils.file import File, FileIndex, get_latest_file
+
+
+CSV = 'id,name,amount\n1,"a, b",1.5\n2,c,2.25\n3,d,\n'
+
+
+def test_analyze_profiles_gzip_file_in_one_pass(tmp_path):
+    data = gzip.compress(CSV.encode())
+    file_path = tmp_path / 'data.csv.gz'
+    file_path.write_bytes(data)
+
+    profile = File(str(file_path)).analyze(column_stats=True)
+
+    assert (profile['format'], profile['compression']) == ('.gz', 'GZIP')
+    assert (profile['size'], profile['uncompressed_size']) == (len(data), len(CSV))
+    assert profile['sha256'] == hashlib.sha256(data).hexdigest()
+    assert (profile['delimiter'], profile['quotechar'], profile['headers']) == (',', '"', ['id', 'name', 'amount'])
+    assert profile['row_count'] == 4
+    assert profile['columns']['amount']['null_count'] == 1
+    assert profile['columns']['id']['dtype'] == 'INTEGER'
+
+
+def _rows(n):
+    # Every third row has a newline inside a quoted field.
+    return 'id,note\n' + ''.join(f'{i},"line\nbreak"\n' if i % 3 == 0 else f'{i},plain\n' for i in range(n))
+
+
+def test_row_count_is_quote_aware_for_plain_and_gzip_files(tmp_path):
+    text = _rows(100) + '100,unterminated'
+    plain_path, gzip_path = tmp_path / 'data.csv', tmp_path / 'data.csv.gz'
+    plain_path.write_text(text)
+    gzip_path.write_bytes(gzip.compress(text[:50].encode()) + gzip.compress(text[50:].encode()))  # Multi-member.
+
+    for file_path in [plain_path, gzip_path]:
+        assert File(str(file_path)).get_row_count() == 102 + 34
+        assert File(str(file_path)).get_row_count(quotechar='"') == 102
+
+
+def test_parallel_row_count_stitches_quote_state_across_ranges(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_module, 'ROW_COUNT_BLOCK_SIZE', 64)
+    file_path = tmp_path / 'data.csv'
+    file_path.write_text(_rows(500))
+
+    assert File(str(file_path)).get_row_count(quotechar='"', processes=3) == 501
+    assert File(str(file_path)).get_row_count(processes=3) == 501 + 167
+
+
+def test_parallel_row_count_matches_serial_count_across_quoted_newlines(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_module, 'ROW_COUNT_BLOCK_SIZE', 64)
+    text = 'id,note\n' + ''.join(f'{i},"{"x" * (i % 90)}\n\n{i}"\n' for i in range(200))
+    file_path = tmp_path / 'data.csv'
+    file_path.write_text(text)
+
+    for quotechar in ['"', None]:
+        with open(file_path, 'rb') as f:
+            serial = file_module.count_rows(f, quotechar=quotechar, block_size=64)
+        assert serial == (201 if quotechar else 601)
+        assert all(File(str(file_path)).get_row_count(quotechar=quotechar, processes=x) == serial for x in [2, 3, 7])
+
+
+def test_get_latest_file_orders_by_date_in_name():
+    days = [(datetime.utcnow() - timedelta(days=x)).strftime('%Y-%m-%d') for x in [0, 1, 30]]
+    # Names sort differently from their dates.
+    files = [f'b_{days[1]}.csv', f'a_{days[0]}.csv', f'c_{days[2]}.csv', 'notes.txt']
+
+    assert get_latest_file(files=files, regex=r'\w_{DATE}\.csv') == f'a_{days[0]}.csv'
+    with pytest.raises(Exception, match='lookback_window'):
+        get_latest_file(files=files[2:], regex=r'\w_{DATE}\.csv')
+
+
+def test_convert_csv_to_parquet_keeps_zero_padded_codes(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    source = tmp_path / 'data.csv'
+    source.write_text('zip,amount,day\n01234,1.50,2024-01-01\n98765,20.25,2024-01-02\n')
+
+    output_path = file_module.convert_csv_to_parquet(str(source), str(tmp_path / 'data.parquet'))
+
+    table = pq.read_table(output_path)
+    assert table.column('zip').to_pylist() == ['01234', '98765']
+    assert [str(x) for x in table.column('amount').to_pylist()] == ['1.50', '20.25']
+    assert [str(x) for x in table.column('day').to_pylist()] == ['2024-01-01', '2024-01-02']
+
+
+def test_match_files_date_window_is_optional():
+    files = ['a_2024-01-02.csv', 'a_2024-13-01.csv', 'a_2024-01-01.csv', 'b_20240103120000.csv', 'b_20240101000000.csv']
+
+    assert file_module.get_matching_files(files=files, regex=r'a_{DATE}\.csv') == ['a_2024-01-01.csv', 'a_2024-01-02.csv']
+    assert file_module.get_matching_files(files=files, regex=r'a_{DATE}\.csv', exact_date='2024-01-02') == ['a_2024-01-02.csv']
+    assert file_module.get_matching_files(files=files, regex=r'b_{TIMESTAMP}\.csv') == ['b_20240101000000.csv', 'b_20240103120000.csv']
+    assert file_module.get_matching_files(files=files, regex=r'b_{TIMESTAMP}\.csv', start_date='2024-01-02',
+                                          end_date='2024-01-05') == ['b_20240103120000.csv']
+
+
+def test_file_index_latest_and_range_queries():
+    modified = datetime(2024, 2, 1)
+    entries = [FileEntry(name='a_2024-01-02.csv', last_modified=modified), FileEntry(name='a_2024-01-01.csv', last_modified=modified),
+               FileEntry(name='undated.csv', last_modified=datetime(2024, 1, 3, 12)), FileEntry(name='a_2024-01-04.csv')]
+
+    index = FileIndex(entries=entries, regex=r'(a_{DATE}|undated)\.csv')  # No date window is needed.
+
+    assert [x.name for x in index.get_latest(2)] == ['a_2024-01-04.csv', 'undated.csv']
+    assert [x.name for x in index.get_range(start=datetime(2024, 1, 2), end=datetime(2024, 1, 3, 23))] == ['a_2024-01-02.csv', 'undated.csv']
+    assert index.get_latest_file().file_date == datetime(2024, 1, 4)
+    assert len(FileIndex(entries=entries, regex=r'a_{DATE}\.csv', exact_date='2024-01-01')) == 1
+
+
+def test_file_index_without_indicators_keeps_listing_order():
+    names = ['b.csv', 'c.csv', 'a.csv']
+    assert [x.name for x in FileIndex(entries=[FileEntry(name=x) for x in names]).entries] == names
+    assert get_latest_file(files=names) == 'a.csv'
+
+
+def _parse_csv(data: bytes) -> list:
+    return list(csv.reader(io.StringIO(data.decode())))
+
+
+def test_combine_skips_repeated_headers_of_mixed_gzip_and_plain_files(tmp_path):
+    inputs = [('a.csv', b'id,name\n1,a\n'), ('b.csv.gz', gzip.compress(b'id,name\n2,b\n')), ('c.csv', b'id,name\n3,c'),
+              ('d.csv.gz', gzip.compress(b'id,name\n') + gzip.compress(b'4,d\n'))]  # Header in a member of its own, as written by split.
+    paths = []
+    for name, data in inputs:
+        (tmp_path / name).write_bytes(data)
+        paths.append(str(tmp_path / name))
+
+    for output_path in [str(tmp_path / 'out.csv'), str(tmp_path / 'out.csv.gz')]:
+        file_module.FileList(paths).combine(output_path=output_path)
+        with open(output_path, 'rb') as f:
+            data = f.read()
+        assert _parse_csv(gzip.decompress(data) if output_path.endswith('.gz') else data) == [
+            ['id', 'name'], ['1', 'a'], ['2', 'b'], ['3', 'c'], ['4', 'd']]
+
+    (tmp_path / 'e.csv').write_bytes(b'id,other\n5,e\n')
+    with pytest.raises(ValueError):
+        file_module.FileList(paths + [str(tmp_path / 'e.csv')]).combine(output_path=str(tmp_path / 'bad.csv'))
+
+
+QUOTED_CSV = b'id,note\n' + b''.join(f'{i},"line {i}\nstill {i}, quoted"\n'.encode() for i in range(20))
+
+
+@pytest.mark.parametrize('input_compression', [None, 'GZIP'])
+@pytest.mark.parametrize('split_options', [{'part_size': 50}, {'parts': 3}, {'rows_per_part': 7}])
+def test_split_keeps_quoted_rows_whole_and_repeats_the_header(tmp_path, monkeypatch, input_compression, split_options):
+    monkeypatch.setattr(file_module, 'ROW_COUNT_BLOCK_SIZE', 64)  # Rows cross block boundaries.
+    file_path = tmp_path / ('data.csv.gz' if input_compression else 'data.csv')
+    file_path.write_bytes(gzip.compress(QUOTED_CSV) if input_compression else QUOTED_CSV)
+
+    part_paths = File(str(file_path)).split(output_dir=str(tmp_path / 'parts'), quotechar='"', compression='GZIP', **split_options)
+
+    assert len(part_paths) > 1
+    parts = []
+    for each_path in part_paths:
+        with open(each_path, 'rb') as f:
+            parts.append(_parse_csv(gzip.decompress(f.read())))
+    assert all(x[0] == ['id', 'note'] for x in parts)
+    assert [row for x in parts for row in x[1:]] == _parse_csv(QUOTED_CSV)[1:]
+    if 'rows_per_part' in split_options:
+        assert [len(x) - 1 for x in parts] == [7, 7, 6]
+    file_module.FileList(part_paths).combine(output_path=str(tmp_path / 'combined.csv'))
+    assert (tmp_path / 'combined.csv').read_bytes() == QUOTED_CSV
+
+
+def test_compress_blocks_round_trips_through_iter_blocks(tmp_path):
+    data = b''.join(f'{i},{i * 7 % 13}\n'.encode() for i in range(5000))
+    f_out = io.BytesIO()
+
+    file_module.compress_blocks(io.BytesIO(data), f_out, block_size=1000, threads=3)
+
+    compressed = f_out.getvalue()
+    assert compressed.count(file_module.GZIP_SIGNATURE) >= len(data) // 1000  # One member per block.
+    assert gzip.decompress(compressed) == data
+    blocks = list(file_module.iter_blocks(io.BytesIO(compressed), block_size=256))
+    assert b''.join(blocks) == data and max(len(x) for x in blocks) <= 256
+    assert b''.join(file_module.iter_blocks(io.BytesIO(data), block_size=256)) == data
+
+    file_path = tmp_path / 'data.csv'
+    file_path.write_bytes(data)
+    with open(File(str(file_path)).compress(block_size=1000, threads=2), 'rb') as f:
+        assert gzip.decompress(f.read()) == data
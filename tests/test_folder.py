@@ -0,0 +1,38 @@
+import os
+import re
+
+import pytest
+
+from ontelligence.utils.file import Folder, translate_glob
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for each_path in ['a.csv', 'b.txt', 'in/c.csv', 'in/2024/d.csv', 'in/2024/e1.csv']:
+        os.makedirs(tmp_path / os.path.dirname(each_path), exist_ok=True)
+        (tmp_path / each_path).write_text('x')
+    return Folder(str(tmp_path))
+
+
+def _search(folder, pattern):
+    return [os.path.relpath(x, folder.path) for x in folder.search_files(pattern=pattern)]
+
+
+def test_glob_star_does_not_cross_directories(folder):
+    assert _search(folder, '*.csv') == ['a.csv', 'in/2024/d.csv', 'in/2024/e1.csv', 'in/c.csv']  # Names only.
+    assert _search(folder, 'in/*.csv') == ['in/c.csv']
+    assert _search(folder, 'in/*/?.csv') == ['in/2024/d.csv']
+    assert _search(folder, 'in/**/*.csv') == ['in/2024/d.csv', 'in/2024/e1.csv', 'in/c.csv']
+    assert _search(folder, 'in/2024/[!d]*.csv') == ['in/2024/e1.csv']
+
+
+@pytest.mark.parametrize('pattern, path, matches', [
+    ('a/*', 'a/b/c', False),
+    ('a/**', 'a/b/c', True),
+    ('a/[b/]', 'a//', False),
+    ('a/[]x]', 'a/]', True),
+    ('a/[', 'a/[', True),
+    ('a.c', 'abc', False),
+])
+def test_translate_glob(pattern, path, matches):
+    assert bool(re.match(translate_glob(pattern), path)) == matches
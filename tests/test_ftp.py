@@ -0,0 +1,53 @@
+import logging
+from types import SimpleNamespace
+
+from ontelligence.providers.ftp.ftp import FTP
+from ontelligence.providers.ftp.sftp import SFTP
+
+
+NAMES = ['a_2024-01-02.csv', 'a_2024-01-03.csv', 'a_2024-01-01.csv', 'notes.txt']
+
+
+class _FakeFTPConnection:
+
+    def mlsd(self, path, facts):
+        yield 'sub', {'type': 'dir'}
+        for i, name in enumerate(NAMES):
+            yield name, {'type': 'file', 'size': '10', 'modify': f'2024020{i + 1}000000'}
+
+
+class _FakeFTP(FTP):
+    log = logging.getLogger(__name__)
+
+    def __init__(self):
+        self.conn = _FakeFTPConnection()
+
+    def get_conn(self):
+        return self.conn
+
+
+class _FakeSFTPConnection:
+
+    def listdir_attr(self, path):
+        return [SimpleNamespace(filename=x, st_size=10, st_mtime=1706745600 + i, st_mode=0o100644) for i, x in enumerate(NAMES)]
+
+
+class _FakeSFTP(SFTP):
+    log = logging.getLogger(__name__)
+
+    def __init__(self):
+        self.conn = _FakeSFTPConnection()
+
+    def get_conn(self):
+        return self.conn
+
+
+def test_file_index_and_latest_file_need_no_date_window():
+    for provider in [_FakeFTP(), _FakeSFTP()]:
+        index = provider.get_file_index(regex=r'a_{DATE}\.csv')
+
+        assert [x.name for x in index.entries] == ['a_2024-01-01.csv', 'a_2024-01-02.csv', 'a_2024-01-03.csv']
+        assert all(x.size == 10 and x.last_modified for x in index.entries)
+        assert provider.get_latest_file(regex=r'a_{DATE}\.csv') == 'a_2024-01-03.csv'
+        assert provider.get_latest_file(files=NAMES[:2], regex=r'a_{DATE}\.csv', start_date='2024-01-01') == 'a_2024-01-03.csv'
+        assert provider.get_latest_file(files=['notes.txt']) == 'notes.txt'
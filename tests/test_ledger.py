@@ -0,0 +1,83 @@
+import logging
+from datetime import datetime, timezone
+
+from ontelligence import pipeline
+from ontelligence.core.ledger import SQLiteIngestionLedger
+from ontelligence.core.schemas.aws import S3Object
+from ontelligence.core.schemas.data import Table
+from ontelligence.core.schemas.ledger import LedgerEntry
+
+
+SOURCE = 'DB.SCHEMA.TABLE'
+
+
+def _object(key, etag='a', day=1):
+    return S3Object(bucket='bucket', key=key, etag=etag, size=1, last_modified=datetime(2024, 1, day, tzinfo=timezone.utc))
+
+
+def test_sqlite_ledger_returns_new_and_changed_objects(tmp_path):
+    ledger = SQLiteIngestionLedger(db_path=str(tmp_path / 'ledger.db'))
+    ledger.record([LedgerEntry(source=SOURCE, key='a.csv', etag='1', last_modified=datetime(2024, 1, 1)),
+                   LedgerEntry(source=SOURCE, key='b.csv', etag='1', last_modified=datetime(2024, 1, 2))])
+
+    objects = [_object('a.csv', etag='1'), _object('b.csv', etag='2'), _object('c.csv')]
+    assert [x.key for x in ledger.get_new_objects(source=SOURCE, objects=objects)] == ['b.csv', 'c.csv']
+    assert ledger.get_latest_entry(source=SOURCE).key == 'b.csv'
+    assert ledger.get_new_objects(source='OTHER', objects=objects) == objects
+
+
+class _FakeLedger(SQLiteIngestionLedger):
+    calls = 0
+
+    def get_entries(self, source):
+        self.calls += 1
+        return super().get_entries(source=source)
+
+
+class _FakeS3:
+    parse_s3_url = staticmethod(lambda url: ('bucket', url[len('s3://bucket/'):]))
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.start_after = None
+
+    def list_objects(self, bucket, prefix, start_after=None):
+        self.start_after = start_after
+        return [x for x in self.objects if not start_after or x.key > start_after]
+
+
+def test_incremental_load_windows_from_date_in_latest_key(tmp_path, monkeypatch):
+    ledger = _FakeLedger(db_path=str(tmp_path / 'ledger.db'))
+    # Uploaded late: the upload time is after the date in the name.
+    ledger.record([LedgerEntry(source=SOURCE, key='in/sales_2024-01-02.csv', etag='1', last_modified=datetime(2024, 1, 10))])
+    loaded = []
+    monkeypatch.setattr(pipeline, 's3_to_snowflake', lambda params, **kwargs: loaded.append(params.s3_path))
+
+    s3 = _FakeS3([_object('in/sales_2024-01-01.csv'), _object('in/sales_2024-01-02.csv', etag='1'),
+                  _object('in/sales_2024-01-03.csv', day=3)])
+    params = pipeline.S3ToSnowflakeParams(s3_path='s3://bucket/in/', table=Table(database='DB', db_schema='SCHEMA', name='TABLE'),
+                                          file_profile='CSV', dependency_on_file=False, extract_script=None,
+                                          truncate_table=False, replace_table=False, overlap_columns=None)
+    sf = type('FakeSnowflake', (), {'log': logging.getLogger(__name__)})()
+    entries = pipeline.incremental_s3_to_snowflake(sf=sf, s3=s3, params=params, ledger=ledger, regex=r'in/sales_{DATE}\.csv',
+                                                   end_date='2024-01-05')
+
+    assert loaded == ['s3://bucket/in/sales_2024-01-03.csv']
+    assert [x.key for x in entries] == ['in/sales_2024-01-03.csv']
+    assert ledger.calls == 1
+
+
+def test_incremental_load_with_ordered_keys_lists_after_last_loaded_key(tmp_path, monkeypatch):
+    ledger = SQLiteIngestionLedger(db_path=str(tmp_path / 'ledger.db'))
+    ledger.record([LedgerEntry(source=SOURCE, key='in/b.csv', etag='1', last_modified=datetime(2024, 1, 2))])
+    monkeypatch.setattr(pipeline, 's3_to_snowflake', lambda params, **kwargs: None)
+
+    s3 = _FakeS3([_object('in/a.csv'), _object('in/b.csv', etag='2'), _object('in/c.csv')])
+    params = pipeline.S3ToSnowflakeParams(s3_path='s3://bucket/in/', table=Table(database='DB', db_schema='SCHEMA', name='TABLE'),
+                                          file_profile='CSV', dependency_on_file=False, extract_script=None,
+                                          truncate_table=False, replace_table=False, overlap_columns=None)
+    sf = type('FakeSnowflake', (), {'log': logging.getLogger(__name__)})()
+    entries = pipeline.incremental_s3_to_snowflake(sf=sf, s3=s3, params=params, ledger=ledger, ordered_keys=True)
+
+    assert s3.start_after == 'in/b.csv'
+    assert [x.key for x in entries] == ['in/c.csv']
@@ -0,0 +1,117 @@
+import logging
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from ontelligence import pipeline
+from ontelligence.core.checkpoint import SQLiteCheckpointStore
+from ontelligence.core.report import BaseReportSink
+from ontelligence.core.schemas.data import Column, Table
+from ontelligence.providers.snowflake.snowflake import Snowflake
+
+
+class _ListSink(BaseReportSink):
+
+    def __init__(self):
+        self.reports = []
+
+    def emit(self, report):
+        self.reports.append(report)
+
+
+class _FakeSnowflake(Snowflake):
+    log = logging.getLogger(__name__)
+
+    def __init__(self, tables=(), error=None, rows=None):
+        self.tables = set(tables)
+        self.error = error
+        self.rows = dict(rows or {})
+        self._query_id_recorders = []
+        self._batch = None
+        self.database, self.schema = 'DB', 'SCHEMA'
+        self.last_row_count = 0
+        self.executed = []
+        self.columns_requested = []
+        self.dropped = []
+
+    def execute(self, query, commit=True, return_cursor=False):
+        self.executed.append(query)
+        if return_cursor:
+            # Only row counts are read, from "SELECT COUNT(*) FROM <database>.<schema>.<table>;".
+            table = query.rstrip(';').split('.')[-1]
+            return SimpleNamespace(fetchone=lambda: (self.rows[table],))
+
+    def table_exists(self, database, schema, table):
+        if self.error:
+            raise self.error
+        return table in self.tables
+
+    def get_query_history(self, query_ids):
+        return pd.DataFrame()
+
+    def get_columns(self, database, schema, table):
+        self.columns_requested.append(table)
+        return [Column(name='a', dtype='VARCHAR')]
+
+    def drop_table(self, database, schema, table):
+        self.dropped.append(table)
+
+
+def _params():
+    return pipeline.S3ToSnowflakeParams(s3_path='s3://bucket/in/a.csv', table=Table(database='DB', db_schema='SCHEMA', name='TABLE'),
+                                        file_profile='CSV', dependency_on_file=False, extract_script=None,
+                                        truncate_table=False, replace_table=False, overlap_columns=None)
+
+
+def test_failure_before_first_stage_is_reported():
+    sink = _ListSink()
+    with pytest.raises(ConnectionError):
+        pipeline.s3_to_snowflake(sf=_FakeSnowflake(error=ConnectionError('no connection')), s3=None, params=_params(), sinks=[sink])
+
+    assert [(x.status, x.error) for x in sink.reports] == [('failed', 'no connection')]
+
+
+def test_resumed_run_after_rename_does_not_drop_staging_table(tmp_path):
+    store = SQLiteCheckpointStore(db_path=str(tmp_path / 'checkpoints.db'))
+    for each_stage in [pipeline.STAGE_LOAD, pipeline.STAGE_QA, pipeline.STAGE_OVERLAP_DELETE, pipeline.STAGE_INSERT]:
+        store.mark_completed(run_id='run', stage=each_stage)
+    # The first run renamed the staging table to the final table, which did not exist before.
+    sf, sink = _FakeSnowflake(tables=['TABLE']), _ListSink()
+
+    report = pipeline.s3_to_snowflake(sf=sf, s3=None, params=_params(), checkpoint_store=store, run_id='run', sinks=[sink])
+
+    assert sf.dropped == []
+    assert sf.columns_requested == []
+    assert report.status == 'success'
+    assert [x.name for x in report.phases if not x.skipped] == [pipeline.STAGE_CLEANUP]
+    assert store.is_completed(run_id='run', stage=pipeline.STAGE_CLEANUP)
+
+
+def test_resumed_run_reloads_staging_table_with_other_row_count(tmp_path):
+    store = SQLiteCheckpointStore(db_path=str(tmp_path / 'checkpoints.db'))
+    store.mark_completed(run_id='run', stage=pipeline.STAGE_LOAD, rows=3)
+    # Another run reloaded the shared staging table since.
+    sf = _FakeSnowflake(tables=['TABLE', 'STG_TABLE'], rows={'STG_TABLE': 5})
+
+    report = pipeline.s3_to_snowflake(sf=sf, s3=None, params=_params(), checkpoint_store=store, run_id='run',
+                                      data_schema=[Column(name='a', dtype='VARCHAR')])
+
+    assert any(x.strip().startswith('COPY INTO DB.SCHEMA.STG_TABLE') for x in sf.executed)
+    assert [x.name for x in report.phases if x.skipped] == []
+    assert report.rows_loaded == 5
+    assert store.get_stage_rows(run_id='run')[pipeline.STAGE_LOAD] == 5
+
+
+def test_resumed_run_keeps_staging_table_with_recorded_row_count(tmp_path):
+    store = SQLiteCheckpointStore(db_path=str(tmp_path / 'checkpoints.db'))
+    store.mark_completed(run_id='run', stage=pipeline.STAGE_LOAD, rows=5)
+    store.mark_completed(run_id='run', stage=pipeline.STAGE_QA)
+    sf = _FakeSnowflake(tables=['TABLE', 'STG_TABLE'], rows={'STG_TABLE': 5})
+
+    report = pipeline.s3_to_snowflake(sf=sf, s3=None, params=_params(), checkpoint_store=store, run_id='run')
+
+    assert not any('COPY INTO' in x for x in sf.executed)
+    assert [x.name for x in report.phases if x.skipped] == [pipeline.STAGE_LOAD, pipeline.STAGE_QA]
+    assert sf.columns_requested == ['STG_TABLE', 'TABLE']
+    assert sf.dropped == ['STG_TABLE']
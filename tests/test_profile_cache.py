@@ -0,0 +1,46 @@
+import os
+
+from ontelligence.utils.cache import ProfileCache
+from ontelligence.utils.file import File
+
+
+def test_file_keys_follow_content(tmp_path):
+    cache = ProfileCache(db_path=str(tmp_path / 'profiles.db'))
+    file_path, copy_path = tmp_path / 'a.csv', tmp_path / 'b.csv'
+    file_path.write_text('id\n1\n')
+    copy_path.write_text('id\n1\n')
+
+    key = cache.get_file_key(str(file_path))
+    assert key.startswith('sha256:') and key == cache.get_file_key(str(copy_path))
+
+    file_path.write_text('id\n2\n')
+    os.utime(file_path, ns=(1, 1))  # A new mtime invalidates the remembered hash.
+    assert cache.get_file_key(str(file_path)) != key
+    assert cache.get_etag_key('"abc"') == 'etag:abc'
+
+
+def test_profiles_are_computed_once_and_evicted(tmp_path):
+    cache = ProfileCache(db_path=str(tmp_path / 'profiles.db'), max_entries=2)
+    calls = []
+    compute = lambda: calls.append(1) or {'rows': 1}
+
+    assert cache.get_or_compute(content_key='a', field='profile', compute=compute) == {'rows': 1}
+    assert cache.get_or_compute(content_key='a', field='profile', compute=compute) == {'rows': 1}
+    assert len(calls) == 1
+
+    cache.put(content_key='b', field='profile', value=2)
+    cache.put(content_key='c', field='profile', value=3)
+    assert cache.get(content_key='a', field='profile') is None  # Least recently used.
+    assert cache.get(content_key='c', field='profile') == 3
+
+
+def test_file_headers_and_row_count_are_served_from_cache(tmp_path):
+    cache = ProfileCache(db_path=str(tmp_path / 'profiles.db'))
+    file_path = tmp_path / 'a.csv'
+    file_path.write_text('id,name\n1,a\n2,b\n')
+    assert File(str(file_path), profile_cache=cache).get_headers() == ['id', 'name']
+    assert File(str(file_path), profile_cache=cache).get_row_count() == 3
+
+    content_key = cache.get_file_key(str(file_path))
+    cache.put(content_key=content_key, field='row_count', value=42)
+    assert File(str(file_path), profile_cache=cache).get_row_count() == 42
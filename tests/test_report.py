@@ -0,0 +1,59 @@
+import json
+
+import pandas as pd
+
+from ontelligence.core.report import JsonLinesReportSink, RunReporter
+from ontelligence.providers.snowflake.snowflake import Snowflake
+
+
+class _FakeSnowflake(Snowflake):
+
+    def __init__(self):
+        self._query_id_recorders = []
+
+    def get_query_history(self, query_ids):
+        return pd.DataFrame({'QUERY_ID': ['q1', 'q2', 'q3'], 'BYTES_SCANNED': [100, None, 50],
+                             'WAREHOUSE_CREDITS': [0.5, 0.25, 1.0], 'CREDITS_USED_CLOUD_SERVICES': [0.1, None, 0.0]})
+
+
+def test_reporter_attributes_queries_and_metrics_to_phases(tmp_path):
+    sf, file_path = _FakeSnowflake(), str(tmp_path / 'reports' / 'runs.jsonl')
+    reporter = RunReporter(sf=sf, source='s3://bucket/a.csv', target='DB.SCHEMA.TABLE', run_id='run', sinks=[JsonLinesReportSink(file_path)])
+
+    sf._record_query_id('before')
+    with reporter.phase('load') as phase:
+        sf._record_query_id('q1')
+        sf._record_query_id('q2')
+        phase.rows = 10
+    reporter.skip('qa')
+    with reporter.phase('insert'):
+        sf._record_query_id('q3')
+    report = reporter.finish()
+
+    assert [(x.name, x.query_ids, x.skipped) for x in report.phases] == [('load', ['q1', 'q2'], False), ('qa', [], True), ('insert', ['q3'], False)]
+    assert (report.phases[0].bytes_scanned, report.phases[0].credits) == (100, 0.85)
+    assert (report.status, report.bytes_scanned, report.credits) == ('success', 150, 1.85)
+    with open(file_path) as f:
+        assert json.loads(f.read())['phases'][0]['rows'] == 10
+
+
+def test_failed_run_is_reported_without_query_history():
+    sf = _FakeSnowflake()
+    sf.get_query_history = lambda query_ids: 1 / 0
+    emitted = []
+    reporter = RunReporter(sf=sf, source='a', target='b', sinks=[type('Sink', (), {'emit': lambda self, x: emitted.append(x)})()])
+
+    report = reporter.finish(error=ValueError('bad file'))
+
+    assert emitted == [report]
+    assert (report.status, report.error, report.credits) == ('failed', 'bad file', None)
+
+
+def test_failing_sink_does_not_stop_the_other_sinks():
+    emitted = []
+    failing = type('FailingSink', (), {'emit': lambda self, x: 1 / 0})()
+    reporter = RunReporter(sf=_FakeSnowflake(), source='a', target='b', sinks=[failing, type('Sink', (), {'emit': lambda self, x: emitted.append(x)})()])
+
+    report = reporter.finish(error=ValueError('bad file'))
+
+    assert emitted == [report]
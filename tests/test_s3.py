@@ -0,0 +1,81 @@
+import gzip
+from datetime import datetime, timezone
+
+from ontelligence.providers.aws.s3 import S3
+
+
+class _FakeClient:
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def head_object(self, Bucket, Key):
+        return {'ContentLength': len(self.data), 'ETag': f'"{hash(self.data)}"'}
+
+
+class _FakeS3(S3):
+
+    def __init__(self, data: bytes):
+        self.bucket = 'bucket'
+        self.prefix = ''
+        self.client = _FakeClient(data)
+        self._schema_cache = {}
+
+    def get_conn(self):
+        return self.client
+
+    def read_range(self, key, start, end, bucket=None):
+        return self.client.data[start:end + 1]
+
+
+def _csv(start, stop, header=True):
+    rows = [f'{i},name {i},{i / 4}' for i in range(start, stop)]
+    return (('id,name,amount\n' if header else '') + '\n'.join(rows) + '\n').encode()
+
+
+def test_sample_key_reads_whole_lines_from_interior_ranges():
+    data = _csv(0, 5000)
+    sample = _FakeS3(data).sample_key(key='a.csv', sample_size=4096, samples=4)
+    lines = sample.splitlines()
+    assert lines[0] == 'id,name,amount'
+    assert all(len(x.split(',')) == 3 for x in lines[1:])
+    assert int(lines[-1].split(',')[0]) > 4000  # Reaches the tail of the key.
+
+
+def test_sample_key_reads_past_the_first_gzip_member():
+    # Same layout as split(compression='GZIP'): the header in its own member, then the rows.
+    data = gzip.compress(b'id,name,amount\n') + gzip.compress(_csv(0, 100, header=False)) + gzip.compress(_csv(100, 200, header=False))
+    sample = _FakeS3(data).sample_key(key='a.csv.gz', sample_size=1024 ** 2, samples=4)
+    assert sample.encode() == _csv(0, 200)
+
+    columns = _FakeS3(data).infer_data_schema(key='a.csv.gz', sample_size=1024 ** 2)
+    assert [(x.name, x.dtype) for x in columns] == [('id', 'INTEGER'), ('name', 'STRING'), ('amount', 'FLOAT')]
+
+
+def test_sample_key_stops_gzip_sample_at_sample_size():
+    data = b''.join(gzip.compress(_csv(i, i + 1000, header=i == 0)) for i in range(0, 10000, 1000))
+    sample = _FakeS3(data).sample_key(key='a.csv.gz', sample_size=10000)
+    assert len(sample) <= 10000
+    assert sample.endswith('\n')
+    assert sample.encode() == _csv(0, 10000)[:len(sample)]
+
+
+class _ListingClient:
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    def get_paginator(self, name):
+        contents = [{'Key': x, 'ETag': '"etag"', 'Size': 1, 'LastModified': datetime(2024, 2, 1, tzinfo=timezone.utc)} for x in self.keys]
+        return type('Paginator', (), {'paginate': lambda self, **kwargs: [{'Contents': contents}]})()
+
+
+def test_file_index_and_latest_key_need_no_date_window():
+    s3 = _FakeS3(b'')
+    s3.client = _ListingClient(['in/', 'in/a_2024-01-02.csv', 'in/a_2024-01-03.csv', 'in/a_2024-01-01.csv', 'in/notes.txt'])
+
+    index = s3.get_file_index(prefix='in/', regex=r'in/a_{DATE}\.csv')
+
+    assert [x.name for x in index.entries] == ['in/a_2024-01-01.csv', 'in/a_2024-01-02.csv', 'in/a_2024-01-03.csv']
+    assert s3.get_latest_key(prefix='in/', regex=r'in/a_{DATE}\.csv') == 'in/a_2024-01-03.csv'
+    assert s3.get_latest_key(prefix='in/', regex=r'in/a_{DATE}\.csv', exact_date='2024-01-02') == 'in/a_2024-01-02.csv'
@@ -0,0 +1,117 @@
+import gzip
+import hashlib
+import io
+import logging
+
+import pytest
+from botocore.exceptions import ClientError
+
+from ontelligence import pipeline
+from ontelligence.providers.aws.s3 import S3
+
+
+class _FakeClient:
+
+    def __init__(self, objects=None, encryption=None, corrupt=False, corrupt_reads=False, overwrite_after_head=False):
+        self.objects = objects or {}
+        self.encryption = encryption
+        self.corrupt = corrupt
+        self.corrupt_reads = corrupt_reads
+        self.overwrite_after_head = overwrite_after_head
+        self.uploads = {}
+
+    def head_object(self, Bucket, Key):
+        data = self.objects[Key]
+        if self.overwrite_after_head:
+            self.objects[Key] = data[::-1]
+        return {'ContentLength': len(data), 'ETag': f'"{hashlib.md5(data).hexdigest()}"'}
+
+    def get_object(self, Bucket, Key, Range, IfMatch=None):
+        if IfMatch and IfMatch != f'"{hashlib.md5(self.objects[Key]).hexdigest()}"':
+            raise ClientError({'Error': {'Code': 'PreconditionFailed'}}, 'GetObject')
+        start, end = [int(x) for x in Range[len('bytes='):].split('-')]
+        data = self.objects[Key][start:end + 1]
+        return {'Body': io.BytesIO(data[::-1] if self.corrupt_reads else data)}
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.uploads['1'] = {}
+        return {'UploadId': '1'}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, ContentMD5):
+        self.uploads[UploadId][PartNumber] = Body
+        return {'ETag': f'"{hashlib.md5(Body).hexdigest()}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        uploaded = self.uploads.pop(UploadId)
+        parts = [uploaded[x['PartNumber']] for x in MultipartUpload['Parts']]
+        self.objects[Key] = b''.join(parts)
+        etag = hashlib.md5(b''.join(hashlib.md5(x).digest() for x in parts)).hexdigest() + f'-{len(parts)}'
+        if self.encryption == 'aws:kms' or self.corrupt:
+            etag = hashlib.md5(etag.encode()).hexdigest()  # Not derived from the parts.
+        return {'ETag': f'"{etag}"', **({'ServerSideEncryption': self.encryption} if self.encryption else {})}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.uploads.pop(UploadId)
+
+    def delete_objects(self, Bucket, Delete):
+        for each_object in Delete['Objects']:
+            self.objects.pop(each_object['Key'])
+        return {'Deleted': Delete['Objects']}
+
+
+class _FakeS3(S3):
+    log = logging.getLogger(__name__)
+
+    def __init__(self, client):
+        self.bucket = 'bucket'
+        self.prefix = ''
+        self.client = client
+
+    def get_conn(self):
+        return self.client
+
+
+DATA = bytes(range(256)) * (40 * 1024 ** 2 // 256)
+
+
+@pytest.mark.parametrize('compression', [None, 'GZIP'])
+def test_s3_to_s3_streams_parts(compression):
+    source, destination = _FakeS3(_FakeClient({'a.bin': DATA})), _FakeS3(_FakeClient())
+
+    obj = pipeline.s3_to_s3(source=source, destination=destination, source_path='s3://bucket/a.bin', destination_path='s3://bucket/b.bin',
+                            part_size=5 * 1024 ** 2, max_concurrency=2, compression=compression)
+
+    data = destination.client.objects['b.bin']
+    assert (gzip.decompress(data) if compression else data) == DATA
+    assert obj.etag.endswith('-8' if not compression else '-1')
+
+
+def test_s3_to_s3_skips_etag_check_for_kms_destination():
+    destination = _FakeS3(_FakeClient(encryption='aws:kms'))
+    pipeline.s3_to_s3(source=_FakeS3(_FakeClient({'a.bin': DATA})), destination=destination, source_path='s3://bucket/a.bin',
+                      destination_path='s3://bucket/b.bin', part_size=5 * 1024 ** 2, max_concurrency=2)
+    assert destination.client.objects['b.bin'] == DATA
+
+
+def test_s3_to_s3_deletes_destination_on_etag_mismatch():
+    destination = _FakeS3(_FakeClient(corrupt=True))
+    with pytest.raises(Exception, match='Checksum mismatch'):
+        pipeline.s3_to_s3(source=_FakeS3(_FakeClient({'a.bin': DATA})), destination=destination, source_path='s3://bucket/a.bin',
+                          destination_path='s3://bucket/b.bin', part_size=5 * 1024 ** 2, max_concurrency=2)
+    assert 'b.bin' not in destination.client.objects
+
+
+def test_s3_to_s3_deletes_destination_on_source_checksum_mismatch():
+    destination = _FakeS3(_FakeClient())
+    with pytest.raises(Exception, match='was modified or corrupted'):
+        pipeline.s3_to_s3(source=_FakeS3(_FakeClient({'a.bin': DATA}, corrupt_reads=True)), destination=destination,
+                          source_path='s3://bucket/a.bin', destination_path='s3://bucket/b.bin', part_size=5 * 1024 ** 2, max_concurrency=2)
+    assert 'b.bin' not in destination.client.objects
+
+
+def test_s3_to_s3_fails_if_source_is_overwritten_while_streaming():
+    destination = _FakeS3(_FakeClient())
+    with pytest.raises(ClientError):
+        pipeline.s3_to_s3(source=_FakeS3(_FakeClient({'a.bin': DATA}, overwrite_after_head=True)), destination=destination,
+                          source_path='s3://bucket/a.bin', destination_path='s3://bucket/b.bin', part_size=5 * 1024 ** 2, max_concurrency=2)
+    assert 'b.bin' not in destination.client.objects and not destination.client.uploads
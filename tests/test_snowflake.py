@@ -0,0 +1,258 @@
+import os
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from ontelligence.core.schemas.snowflake import UnloadedFile
+from ontelligence.providers.snowflake.snowflake import Snowflake
+
+
+class _FakeCursor:
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class _FakeSnowflake(Snowflake):
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.queries = []
+        self._query_id_recorders = []
+
+    def execute(self, query, commit=True, return_cursor=False):
+        self.queries.append(query)
+        return _FakeCursor(self.rows)
+
+
+class _FakeConnection:
+
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+
+class _FakeBatchCursor:
+
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.executed = []
+        self.results = []
+
+    def execute(self, query, num_statements=None):
+        self.executed.append((query, num_statements))
+        statements = query.rstrip(';').split(';\n') if num_statements else [query]
+        self.results = [(f'q{i}', 1) for i in range(len(statements))]
+        if self.fail_at is not None and num_statements:
+            self.results = self.results[:self.fail_at]
+        self._apply()
+
+    def _apply(self):
+        if not self.results:
+            raise RuntimeError('statement failed')
+        self.sfqid, self.rowcount = self.results.pop(0)
+
+    def nextset(self):
+        if not self.results and self.fail_at is not None:
+            raise RuntimeError('statement failed')
+        if not self.results:
+            return None
+        self._apply()
+        return True
+
+
+class _BatchSnowflake(Snowflake):
+
+    def __init__(self, cursor):
+        self._query_id_recorders = []
+        self._batch = None
+        self.last_query_id = self.last_row_count = None
+        self._Snowflake__cursor = cursor
+        self.connection = _FakeConnection()
+
+    def get_conn(self):
+        return self.connection
+
+
+class _FakeS3:
+    parse_s3_url = staticmethod(lambda url: ('bucket', url[len('s3://bucket/'):]))
+
+    def download_file(self, key, bucket=None, local_path=None):
+        local_path = os.path.join(local_path, os.path.basename(key))
+        with open(local_path, 'w') as f:
+            f.write(key)
+        return local_path
+
+
+def test_export_query_rejects_single_partitioned_unload():
+    with pytest.raises(ValueError):
+        _FakeSnowflake().export_query(query='SELECT 1', file_name='data', s3_path='s3://bucket/out/', storage_integration='S3',
+                                      partition_by="'date=' || DT")
+
+
+def test_export_query_manifest_paths_of_unpartitioned_unload(tmp_path):
+    sf = _FakeSnowflake(rows=[('data_0_0_0.csv.gz', 10, 2), ('data_0_1_0.csv.gz', 20, 3)])
+
+    manifest = sf.export_query(query='SELECT 1', file_name='data', s3_path='s3://bucket/out/', storage_integration='S3', single=False)
+
+    assert manifest == [UnloadedFile(path='s3://bucket/out/data_0_0_0.csv.gz', size=10, rows=2),
+                        UnloadedFile(path='s3://bucket/out/data_0_1_0.csv.gz', size=20, rows=3)]
+    sf.download_export(manifest=manifest, s3=_FakeS3(), local_path=str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ['data_0_0_0.csv.gz', 'data_0_1_0.csv.gz']
+
+
+def test_export_query_manifest_paths_of_partitioned_unload(tmp_path):
+    sf = _FakeSnowflake(rows=[('date=2024-01-01/data_0_0_0.snappy.parquet', 10, 2), ('date=2024-01-02/data_0_0_0.snappy.parquet', 20, 3)])
+
+    manifest = sf.export_query(query='SELECT 1', file_name='', s3_path='s3://bucket/out/', storage_integration='S3', file_type='PARQUET',
+                               single=False, partition_by="'date=' || DT")
+
+    assert [x.path for x in manifest] == ['s3://bucket/out/date=2024-01-01/data_0_0_0.snappy.parquet',
+                                          's3://bucket/out/date=2024-01-02/data_0_0_0.snappy.parquet']
+    assert 'PARTITION BY' in sf.queries[0] and 'OVERWRITE' not in sf.queries[0]
+    sf.download_export(manifest=manifest, s3=_FakeS3(), local_path=str(tmp_path))
+    assert os.path.exists(tmp_path / 'date=2024-01-01' / 'data_0_0_0.snappy.parquet')
+    assert os.path.exists(tmp_path / 'date=2024-01-02' / 'data_0_0_0.snappy.parquet')
+
+
+def test_download_export_only_combines_csv_files(tmp_path):
+    manifest = [UnloadedFile(path='s3://bucket/out/data_0_0_0.snappy.parquet', size=10, rows=2)]
+    with pytest.raises(ValueError):
+        _FakeSnowflake().download_export(manifest=manifest, s3=_FakeS3(), local_path=str(tmp_path / 'data.parquet'), combine=True)
+
+    manifest = [UnloadedFile(path=f's3://bucket/out/data_0_{i}_0.csv', size=10, rows=2) for i in range(2)]
+    _FakeSnowflake().download_export(manifest=manifest, s3=_FakeS3(), local_path=str(tmp_path / 'data.csv'), combine=True)
+    with open(tmp_path / 'data.csv') as f:
+        assert f.read() == 'out/data_0_0_0.csv'  # The second file is only a header line.
+
+
+def test_batch_runs_statements_in_one_round_trip():
+    cursor = _FakeBatchCursor()
+    sf = _BatchSnowflake(cursor)
+
+    with sf.record_query_ids() as query_ids, sf.batch():
+        sf.execute('CREATE TABLE a (x INT);')
+        sf.execute('INSERT INTO a VALUES (1)')
+        with pytest.raises(Exception):
+            sf.execute('SELECT 1', return_cursor=True)
+
+    assert cursor.executed == [('BEGIN;\nCREATE TABLE a (x INT);\nINSERT INTO a VALUES (1);\nCOMMIT;', 4)]
+    assert query_ids == ['q0', 'q1', 'q2', 'q3']
+    assert sf._query_id_recorders == []
+    assert sf.connection.commits == 0  # Committed by the COMMIT statement.
+
+
+def test_failed_batch_rolls_back():
+    cursor = _FakeBatchCursor(fail_at=2)
+    sf = _BatchSnowflake(cursor)
+
+    with pytest.raises(RuntimeError):
+        sf.execute_batch(['DELETE FROM a', 'INSERT INTO a VALUES (1)'])
+
+    assert cursor.executed[-1] == ('ROLLBACK;', None)
+    assert sf.last_query_id == 'q1'
+
+
+class _ProfileSnowflake(_FakeSnowflake):
+    operators = {
+        'q1': [{'OPERATOR_TYPE': 'TableScan', 'OPERATOR_STATISTICS': {'pruning': {'partitions_scanned': 95, 'partitions_total': 100}},
+                'OPERATOR_ATTRIBUTES': {'table_name': 'DB.SCH.A'}},
+               {'OPERATOR_TYPE': 'Sort', 'OPERATOR_STATISTICS': {'spilling': {'bytes_spilled_remote_storage': 5}}}],
+        'q2': [{'OPERATOR_TYPE': 'TableScan', 'OPERATOR_STATISTICS': {'pruning': {'partitions_scanned': 5, 'partitions_total': 5}},
+                'OPERATOR_ATTRIBUTES': {'table_name': 'DB.SCH.B'}}],
+    }
+
+    def get_query_history(self, query_ids):
+        return pd.DataFrame([
+            {'QUERY_ID': 'q1', 'QUERY_TYPE': 'SELECT', 'QUERY_TEXT': 'SELECT 1', 'TOTAL_ELAPSED_TIME': 10, 'QUEUED_PROVISIONING_TIME': 1,
+             'QUEUED_OVERLOAD_TIME': None, 'BYTES_SCANNED': 100},
+            {'QUERY_ID': 'q2', 'QUERY_TYPE': 'SELECT', 'QUERY_TEXT': 'SELECT 2', 'TOTAL_ELAPSED_TIME': 10, 'QUEUED_PROVISIONING_TIME': 0,
+             'QUEUED_OVERLOAD_TIME': 0, 'BYTES_SCANNED': 100},
+        ])
+
+    def get_query_operator_stats(self, query_id):
+        return pd.DataFrame(self.operators.get(query_id, []))
+
+
+def test_query_history_selects_only_query_history_by_session_columns():
+    sf = _FakeSnowflake()
+    sf.database = 'DB'
+    sf.query = lambda query: sf.queries.append(query) or pd.DataFrame({'WAREHOUSE_SIZE': ['Small'], 'EXECUTION_TIME': [3600 * 1000]})
+
+    df = sf.get_query_history(query_ids=['q1'])
+
+    assert 'DB.INFORMATION_SCHEMA.QUERY_HISTORY_BY_SESSION' in sf.queries[0]
+    assert "QUERY_ID IN ('q1')" in sf.queries[0]
+    for column in ['PARTITIONS_SCANNED', 'PARTITIONS_TOTAL', 'BYTES_SPILLED']:
+        assert column not in sf.queries[0]
+    assert df['WAREHOUSE_CREDITS'].tolist() == [2]
+
+
+def test_profile_queries_flags_full_scans_and_spills():
+    sf = _ProfileSnowflake()
+
+    with sf.profile() as profiles:
+        for query_id in ['q1', 'q2', None, 'missing']:
+            sf._record_query_id(query_id)
+
+    assert [(x.query_id, x.queued_ms) for x in profiles] == [('q1', 1), ('q2', 0)]
+    assert (profiles[0].partitions_scanned, profiles[0].partitions_total, profiles[0].bytes_spilled_remote) == (95, 100, 5)
+    assert profiles[0].warnings == ['TableScan on DB.SCH.A scanned 95 of 100 partitions', 'Spilled 5 bytes to remote storage']
+    assert profiles[1].warnings == []  # Too few partitions to flag.
+    assert sf.profile_queries(query_ids=['q1'], operator_stats=False)[0].warnings == []
+
+
+def test_profile_keeps_profiles_of_a_failed_block():
+    sf = _ProfileSnowflake()
+
+    with pytest.raises(ValueError):
+        with sf.profile() as profiles:
+            sf._record_query_id('q1')
+            raise ValueError('failed')
+
+    assert [x.query_id for x in profiles] == ['q1']
+    sf._record_query_id('q2')  # Not recorded outside of a profile block.
+    assert sf._query_id_recorders == []
+
+
+class _OverlapSnowflake(_FakeSnowflake):
+    database = 'DB'
+    last_row_count = 3
+
+    def __init__(self, bounds):
+        super().__init__()
+        self.bounds = bounds
+
+    def query(self, query, **kwargs):
+        self.queries.append(query)
+        if query.startswith('SELECT DISTINCT'):
+            return pd.DataFrame({'VALUE': [1, 2]})
+        return pd.DataFrame([self.bounds])
+
+
+def test_delete_overlapping_data_adds_prunable_predicates():
+    sf = _OverlapSnowflake({'ROW_COUNT': 2, 'MIN_0': 1, 'MAX_0': 2, 'DISTINCT_0': 2, 'NULLS_0': 0,
+                            'MIN_1': datetime(2024, 1, 1), 'MAX_1': datetime(2024, 1, 2), 'DISTINCT_1': 2, 'NULLS_1': 0,
+                            'MIN_2': 'EU', 'MAX_2': 'US', 'DISTINCT_2': 5000, 'NULLS_2': 1})
+
+    deleted = sf.delete_overlapping_data(table='T', schema='SCH', match_table='STG_T', match_schema='SCH',
+                                         match_keys=['ID', 'TRUNC(EVENT_DATE)', 'NVL(REGION)'])
+
+    delete = ' '.join(sf.queries[-1].split())
+    assert deleted == 3
+    assert delete.startswith('DELETE FROM DB.SCH.T t WHERE t."ID" IN (1, 2) '
+                             "AND t.\"event_date\" >= '2024-01-01T00:00:00'::TIMESTAMP_NTZ AND t.\"event_date\" < '2024-01-03T00:00:00'::TIMESTAMP_NTZ "
+                             "AND (t.\"region\" BETWEEN 'EU' AND 'US' OR t.\"region\" IS NULL) AND EXISTS")
+    assert "t.\"event_date\" < DATEADD('DAY', 1, s.KEY_1)" in delete and 'EQUAL_NULL(t."region", s.KEY_2)' in delete
+
+
+def test_delete_overlapping_data_skips_empty_staging_table():
+    sf = _OverlapSnowflake({'ROW_COUNT': 0, 'MIN_0': None, 'MAX_0': None, 'DISTINCT_0': 0, 'NULLS_0': 0})
+    assert sf.delete_overlapping_data(table='T', schema='SCH', match_table='STG_T', match_schema='SCH', match_keys=['ID']) == 0
+    assert not any(x.startswith('DELETE') for x in sf.queries)